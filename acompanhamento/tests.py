@@ -1,3 +1,106 @@
+import asyncio
+import time
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
 from django.test import TestCase
+from django.utils import timezone
+
+from authentication.models import Empresa
+from caixa.eventos import obter_canal
+from caixa.models import ItemPedido, Pedido, Produto
+from caixa.sincronizacao import cache_pedidos
+
+
+class StatusPedidoTest(TestCase):
+    """Consultas do celular do cliente: 304 sem mudanças e espera até o pedido mudar."""
+
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome='Cantina', cnpj='00000000000120', endereco='Rua', telefone='0')
+        produto = Produto.objects.create(empresa=self.empresa, nome='Pastel', preco=Decimal('8.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pedido = Pedido.objects.create(empresa=self.empresa, total=Decimal('8.00'))
+            ItemPedido.objects.create(pedido=self.pedido, produto=produto, quantidade=1, preco_unitario=Decimal('8.00'))
+        self.url = f'/acompanhamento/api/{self.pedido.qr_code}/'
+        self.url_resumo = f'{self.url}status/'
+
+    def alterar_status(self, status):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pedido.status = status
+            self.pedido.save()
+
+    def test_pedido_sem_mudancas_responde_304(self):
+        resposta = self.client.get(self.url)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta['Cache-Control'], 'private, no-cache')
+        self.assertEqual(resposta.json()['status'], 'pendente')
+
+        # Validado só pelo cache, sem consultar o pedido
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=resposta['ETag']).status_code, 304)
+
+        self.alterar_status('preparando')
+        resposta = self.client.get(self.url, HTTP_IF_NONE_MATCH=resposta['ETag'])
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['status'], 'preparando')
+
+    def test_resumo_com_versao_atual_responde_304(self):
+        resposta = self.client.get(self.url_resumo)
+        self.assertEqual(resposta.status_code, 200)
+        versao = resposta.json()['versao']
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url_resumo, HTTP_IF_NONE_MATCH=resposta['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(f'{self.url_resumo}?versao={versao}').status_code, 304)
+
+    def test_sem_asgi_nao_espera(self):
+        versao = self.client.get(self.url_resumo).json()['versao']
+
+        inicio = time.monotonic()
+        resposta = self.client.get(f'{self.url_resumo}?versao={versao}&aguardar=5')
+        self.assertEqual(resposta.status_code, 304)
+        self.assertLess(time.monotonic() - inicio, 1)
+
+    async def test_espera_termina_no_prazo_sem_mudancas(self):
+        versao = (await self.async_client.get(self.url_resumo)).json()['versao']
+
+        inicio = time.monotonic()
+        resposta = await self.async_client.get(f'{self.url_resumo}?versao={versao}&aguardar=0.3')
+        self.assertEqual(resposta.status_code, 304)
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.3)
+
+    async def test_versao_antiga_responde_na_hora(self):
+        versao = (await self.async_client.get(self.url_resumo)).json()['versao']
+        await sync_to_async(self.alterar_status)('preparando')
+
+        inicio = time.monotonic()
+        resposta = await self.async_client.get(f'{self.url_resumo}?versao={versao}&aguardar=5')
+        self.assertLess(time.monotonic() - inicio, 1)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['status'], 'preparando')
+
+    async def test_espera_acorda_quando_o_pedido_muda(self):
+        versao = (await self.async_client.get(self.url_resumo)).json()['versao']
+
+        # Alteração gravada por outro processo: o aviso chega depois, pelo cache compartilhado
+        await Pedido.objects.filter(id=self.pedido.id).aupdate(status='pronto', atualizado_em=timezone.now())
+
+        async def outro_processo():
+            await asyncio.sleep(0.3)
+            cache = cache_pedidos()
+            await sync_to_async(cache.delete)(f'pedidos:estado:{self.pedido.qr_code}')
+            await sync_to_async(cache.set)(obter_canal(self.empresa.id).chave_aviso, 'outro-processo', None)
+
+        aviso = asyncio.ensure_future(outro_processo())
+        inicio = time.monotonic()
+        resposta = await self.async_client.get(f'{self.url_resumo}?versao={versao}&aguardar=5')
+        await aviso
+
+        # O aviso de outro processo é conferido a cada segundo
+        self.assertLess(time.monotonic() - inicio, 2)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['status'], 'pronto')
+        self.assertNotEqual(resposta.json()['versao'], versao)
 
-# Create your tests here.
+    def test_pedido_inexistente(self):
+        self.assertEqual(self.client.get('/acompanhamento/api/00000000-0000-0000-0000-000000000000/status/').status_code, 404)
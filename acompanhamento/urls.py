@@ -4,4 +4,5 @@ from . import views
 urlpatterns = [
     path('<uuid:qr_code>/', views.acompanhar_pedido, name='acompanhar_pedido'),
     path('api/<uuid:qr_code>/', views.status_pedido_api, name='status_pedido_api'),
+    path('api/<uuid:qr_code>/status/', views.status_pedido_resumo, name='status_pedido_resumo'),
 ]
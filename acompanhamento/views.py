@@ -1,6 +1,39 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import Http404, HttpResponseNotModified, JsonResponse
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.http import condition
+from caixa.eventos import obter_canal
 from caixa.models import Pedido
+from caixa.previsao import momento_previsao, obter_previsao, previsao_do_pedido
+from caixa.sincronizacao import gerar_cursor, obter_estado_pedido, obter_versao_pedidos
+
+# Espera máxima de uma consulta longa (?aguardar=); o cliente refaz a consulta em seguida
+ESPERA_MAXIMA = 30
+
+
+def etag_acompanhamento(request, qr_code):
+    """
+    Versão do pedido + versão dos pedidos da empresa e intervalo da previsão
+    (a previsão depende da fila e da hora).
+    """
+    estado = obter_estado_pedido(qr_code)
+    if estado is None:
+        return None
+    versao_fila = obter_versao_pedidos(estado['empresa_id'])['versao']
+    return f"{estado['versao']}-{versao_fila}-{gerar_cursor(momento_previsao())}"
+
+
+def _versoes_do_cliente(request):
+    """ETags que o cliente já tem (If-None-Match ou ``?versao=``), sem o prefixo de ETag fraca."""
+    versoes = {etag.removeprefix('W/') for etag in parse_etags(request.headers.get('If-None-Match', ''))}
+    if request.GET.get('versao'):
+        versoes.add(quote_etag(request.GET['versao']))
+    return versoes
+
 
 def acompanhar_pedido(request, qr_code):
     pedido = get_object_or_404(Pedido, qr_code=qr_code)
@@ -9,9 +42,10 @@ def acompanhar_pedido(request, qr_code):
     }
     return render(request, 'acompanhamento/acompanhar.html', context)
 
+@condition(etag_func=etag_acompanhamento)
 def status_pedido_api(request, qr_code):
     pedido = get_object_or_404(Pedido, qr_code=qr_code)
-    
+
     data = {
         'numero_pedido': pedido.numero_pedido,
         'status': pedido.status,
@@ -24,9 +58,66 @@ def status_pedido_api(request, qr_code):
             'quantidade': item.quantidade,
             'preco': str(item.preco_unitario),
             'subtotal': str(item.subtotal)
-        } for item in pedido.itens.all()],
+        } for item in pedido.itens.select_related('produto')],
         'criado_em': pedido.criado_em.strftime('%d/%m/%Y %H:%M'),
-        'atualizado_em': pedido.atualizado_em.strftime('%d/%m/%Y %H:%M')
+        'atualizado_em': pedido.atualizado_em.strftime('%d/%m/%Y %H:%M'),
+        # Previsão de pronto (só enquanto pendente ou em preparo; lida do cache)
+        **previsao_do_pedido(obter_previsao(pedido.empresa_id), pedido.id)
     }
-    
-    return JsonResponse(data)
+
+    response = JsonResponse(data)
+    # O navegador revalida com If-None-Match e reaproveita a resposta no 304
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+async def status_pedido_resumo(request, qr_code):
+    """
+    Só o status do pedido, lido do cache, para o celular do cliente
+    consultar sem parar. Quem já tem a versão atual (If-None-Match ou
+    ``?versao=``) recebe 304. Com ``?aguardar=<segundos>`` a resposta fica
+    em espera até o pedido mudar (consulta longa) e, se nada mudar no prazo,
+    responde 304.
+
+    A espera é acordada pelo canal de eventos da empresa, que confere a cada
+    segundo os avisos gravados por outros processos (ver ``caixa/eventos.py``).
+    Só o ASGI espera: sob WSGI a consulta responde na hora, sem prender uma
+    thread do worker, e o celular repete a consulta no seu intervalo mínimo.
+    """
+    estado = await sync_to_async(obter_estado_pedido)(qr_code)
+    if estado is None:
+        raise Http404
+    conhecidas = _versoes_do_cliente(request)
+
+    try:
+        aguardar = min(max(float(request.GET.get('aguardar', 0)), 0), ESPERA_MAXIMA)
+    except ValueError:
+        aguardar = 0
+
+    if aguardar and isinstance(request, ASGIRequest):
+        canal = obter_canal(estado['empresa_id'])
+        limite = time.monotonic() + aguardar
+        while quote_etag(estado['versao']) in conhecidas:
+            marca = await sync_to_async(canal.marca)()
+            # Reler depois de marcar o aviso do canal: uma alteração publicada
+            # antes dele já descartou o estado do cache
+            estado = await sync_to_async(obter_estado_pedido)(qr_code)
+            if estado is None:
+                raise Http404
+            if quote_etag(estado['versao']) not in conhecidas:
+                break
+            restante = limite - time.monotonic()
+            if restante <= 0 or not await canal.aguardar_async(marca, restante):
+                break
+
+    etag = quote_etag(estado['versao'])
+    if etag in conhecidas:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse({
+            'status': estado['status'],
+            'status_display': estado['status_display'],
+            'versao': estado['versao']
+        })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
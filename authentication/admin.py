@@ -1,12 +1,21 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Empresa, Usuario
+from .models import Empresa, Usuario, gerar_token_painel
 
 @admin.register(Empresa)
 class EmpresaAdmin(admin.ModelAdmin):
     list_display = ['nome', 'cnpj', 'telefone', 'ativo', 'criado_em']
     list_filter = ['ativo', 'criado_em']
     search_fields = ['nome', 'cnpj']
+    readonly_fields = ['token_painel']
+    actions = ['gerar_novo_token_painel']
+
+    @admin.action(description='Gerar novo token do painel de chamada (o link antigo deixa de funcionar)')
+    def gerar_novo_token_painel(self, request, queryset):
+        for empresa in queryset:
+            empresa.token_painel = gerar_token_painel()
+            empresa.save(update_fields=['token_painel'])
+        self.message_user(request, f'{queryset.count()} token(s) gerado(s).')
 
 @admin.register(Usuario)
 class UsuarioAdmin(UserAdmin):
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:40
+
+import authentication.models
+from django.db import migrations, models
+
+
+def gerar_tokens(apps, schema_editor):
+    Empresa = apps.get_model('authentication', 'Empresa')
+    for empresa in Empresa.objects.filter(token_painel__isnull=True):
+        empresa.token_painel = authentication.models.gerar_token_painel()
+        empresa.save(update_fields=['token_painel'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empresa',
+            name='token_painel',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(gerar_tokens, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='empresa',
+            name='token_painel',
+            field=models.CharField(default=authentication.models.gerar_token_painel, editable=False, max_length=64, unique=True),
+        ),
+    ]
@@ -1,12 +1,21 @@
+import secrets
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
+
+def gerar_token_painel():
+    return secrets.token_urlsafe(24)
+
+
 class Empresa(models.Model):
     nome = models.CharField(max_length=200)
     cnpj = models.CharField(max_length=18, unique=True)
     endereco = models.TextField()
     telefone = models.CharField(max_length=20)
     ativo = models.BooleanField(default=True)
+    # Acesso sem login ao painel público de chamada (TVs, balcão de retirada)
+    token_painel = models.CharField(max_length=64, unique=True, default=gerar_token_painel, editable=False)
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
@@ -1,21 +1,26 @@
 from django.shortcuts import render, redirect
 from django.http import JsonResponse
-from caixa.models import Produto, Categoria, Pedido, ItemPedido
+from django.views.decorators.http import condition
+from caixa.catalogo import obter_catalogo, produtos_do_catalogo, etag_catalogo
+from caixa.models import Produto, Pedido, ItemPedido
 from authentication.models import Empresa
 from decimal import Decimal
 import json
 
+@condition(etag_func=etag_catalogo)
 def autoatendimento_home(request, empresa_id):
     empresa = Empresa.objects.get(id=empresa_id)
-    categorias = Categoria.objects.filter(empresa=empresa, ativo=True)
-    produtos = Produto.objects.filter(empresa=empresa, ativo=True)
+    catalogo = obter_catalogo(empresa_id)
     
     context = {
         'empresa': empresa,
-        'categorias': categorias,
-        'produtos': produtos,
+        'categorias': catalogo['categorias'],
+        'produtos': produtos_do_catalogo(catalogo, apenas_ativos=True),
     }
-    return render(request, 'autoatendimento/home.html', context)
+    response = render(request, 'autoatendimento/home.html', context)
+    # Os totens guardam a página e revalidam pelo ETag (304 sem mudanças)
+    response['Cache-Control'] = 'public, no-cache'
+    return response
 
 def criar_pedido_autoatendimento(request, empresa_id):
     if request.method == 'POST':
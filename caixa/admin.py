@@ -3,9 +3,11 @@ from .models import Categoria, Produto, Pedido, ItemPedido
 
 @admin.register(Categoria)
 class CategoriaAdmin(admin.ModelAdmin):
-    list_display = ['nome', 'empresa', 'ativo']
+    list_display = ['nome', 'empresa', 'ordem_exibicao', 'ativo']
+    list_editable = ['ordem_exibicao']
     list_filter = ['empresa', 'ativo']
     search_fields = ['nome']
+    ordering = ['empresa', 'ordem_exibicao', 'nome']
 
 @admin.register(Produto)
 class ProdutoAdmin(admin.ModelAdmin):
@@ -71,3 +73,106 @@ class PedidoComboEscolhaAdmin(admin.ModelAdmin):
     list_filter = ['criado_em']
     search_fields = ['item_pedido__pedido__numero_pedido', 'produto_escolhido__nome']
     readonly_fields = ['criado_em']
+
+
+# ========== ADMIN PARA ESTOQUE ==========
+
+from .models import MovimentacaoEstoque
+
+@admin.register(MovimentacaoEstoque)
+class MovimentacaoEstoqueAdmin(admin.ModelAdmin):
+    list_display = ['produto', 'tipo', 'quantidade', 'numero_pedido', 'usuario', 'criado_em']
+    list_filter = ['tipo', 'empresa', 'criado_em']
+    search_fields = ['produto__nome', 'numero_pedido']
+
+    # Histórico imutável: movimentações só são criadas pelo sistema
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+# ========== ADMIN PARA HISTÓRICO DE STATUS ==========
+
+from .models import TransicaoStatusPedido
+
+@admin.register(TransicaoStatusPedido)
+class TransicaoStatusPedidoAdmin(admin.ModelAdmin):
+    list_display = ['pedido', 'status_anterior', 'status_novo', 'duracao', 'usuario', 'criado_em']
+    list_filter = ['status_novo', 'empresa', 'criado_em']
+    search_fields = ['pedido__numero_pedido']
+
+    # Histórico imutável: transições só são criadas pelo sistema
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+from .models import TempoPreparoProduto
+from .tempos_preparo import percentil
+
+@admin.register(TempoPreparoProduto)
+class TempoPreparoProdutoAdmin(admin.ModelAdmin):
+    list_display = ['produto', 'empresa', 'amostras', 'media_minutos', 'p50_minutos', 'p90_minutos', 'atualizado_em']
+    list_filter = ['empresa']
+    search_fields = ['produto__nome']
+
+    @admin.display(description='Média (min)')
+    def media_minutos(self, obj):
+        return round(obj.media_segundos / 60, 1)
+
+    @admin.display(description='P50 (min)')
+    def p50_minutos(self, obj):
+        valor = percentil(obj.histograma, 0.5)
+        return round(valor / 60, 1) if valor is not None else '-'
+
+    @admin.display(description='P90 (min)')
+    def p90_minutos(self, obj):
+        valor = percentil(obj.histograma, 0.9)
+        return round(valor / 60, 1) if valor is not None else '-'
+
+    # Mantido pelo sistema (aprender_tempos_preparo reconstrói)
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# ========== ADMIN PARA RESUMOS DE VENDAS ==========
+
+from .models import VendaDiaria, VendaDiariaProduto
+
+@admin.register(VendaDiaria)
+class VendaDiariaAdmin(admin.ModelAdmin):
+    list_display = ['data', 'empresa', 'forma_pagamento', 'tipo', 'total_pedidos', 'total_vendas', 'total_itens']
+    list_filter = ['empresa', 'data', 'tipo']
+
+    # Mantido por caixa/consolidacao.py (ou pelo comando consolidar_vendas)
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(VendaDiariaProduto)
+class VendaDiariaProdutoAdmin(admin.ModelAdmin):
+    list_display = ['data', 'empresa', 'produto_nome', 'forma_pagamento', 'tipo', 'quantidade', 'total']
+    list_filter = ['empresa', 'data', 'tipo']
+    search_fields = ['produto_nome']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CaixaConfig(AppConfig):
     name = 'caixa'
+
+    def ready(self):
+        from . import signals  # noqa: F401
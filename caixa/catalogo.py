@@ -0,0 +1,176 @@
+"""
+Catálogo de produtos de cada empresa, compartilhado por caixa, cardápio do
+cliente e autoatendimento.
+
+O catálogo (produtos já ordenados e categorias ativas) e as opções de cada
+combo são montados uma vez por versão e guardados no cache ``pedidos``. A
+versão da empresa é trocada a cada alteração de ``Produto``, ``Categoria``,
+``Combo`` e seus slots e itens, ``Empresa`` (ver ``caixa/signals.py``) e de
+saldo de estoque (``caixa/estoque.py``); as páginas e APIs do catálogo a usam
+como ETag, então quem já tem a versão atual recebe 304 sem consulta aos
+produtos.
+"""
+import uuid
+
+from django.db import transaction
+from django.db.models import F, Prefetch
+
+from .models import Categoria, Produto, Combo, ComboSlot, ComboSlotItem
+from .sincronizacao import cache_pedidos
+
+# Entradas de versões antigas expiram sozinhas
+TIMEOUT_CATALOGO = 3600
+
+# Respostas pedidas com a versão atual (?v=) nunca mudam
+CACHE_CONTROL_VERSIONADO = 'public, max-age=31536000, immutable'
+
+# Ordem do catálogo: posição da categoria, depois nome (produtos sem categoria no fim)
+ORDEM_CATALOGO = [F('categoria__ordem_exibicao').asc(nulls_last=True), 'nome', 'id']
+
+
+def _chave_versao(empresa_id):
+    return f'catalogo:versao:{empresa_id}'
+
+
+def obter_versao_catalogo(empresa_id):
+    cache = cache_pedidos()
+    chave = _chave_versao(empresa_id)
+    versao = cache.get(chave)
+    if versao is None:
+        # Cache vazio (reinício/expiração): nova versão força uma recarga
+        cache.add(chave, uuid.uuid4().hex, None)
+        versao = cache.get(chave)
+    return versao
+
+
+def registrar_alteracao_catalogo(empresa_id):
+    """Troca a versão do catálogo da empresa após o commit da transação."""
+    transaction.on_commit(
+        lambda: cache_pedidos().set(_chave_versao(empresa_id), uuid.uuid4().hex, None)
+    )
+
+
+def consultar_produtos(empresa_id):
+    return (
+        Produto.objects.filter(empresa_id=empresa_id)
+        .select_related('categoria', 'combo')
+        .order_by(*ORDEM_CATALOGO)
+    )
+
+
+def serializar_produto(produto):
+    combo_id = produto.get_combo_id()
+    categoria = produto.categoria
+    return {
+        'id': produto.id,
+        'nome': produto.nome,
+        'descricao': produto.descricao,
+        'preco': str(produto.preco),
+        'imagem': produto.imagem.url if produto.imagem else '',
+        'ativo': produto.ativo,
+        'quantidade_estoque': produto.quantidade_estoque,
+        'categoria_id': produto.categoria_id,
+        'categoria': categoria.nome if categoria else '',
+        'categoria_emoji': categoria.emoji if categoria else '',
+        'is_combo': combo_id is not None,
+        'combo_id': combo_id
+    }
+
+
+def construir_catalogo(empresa_id):
+    return {
+        'produtos': [serializar_produto(produto) for produto in consultar_produtos(empresa_id).iterator(chunk_size=500)],
+        'categorias': list(
+            Categoria.objects.filter(empresa_id=empresa_id, ativo=True)
+            .values('id', 'nome', 'emoji', 'is_sistema', 'ordem_exibicao').order_by('ordem_exibicao', 'nome')
+        )
+    }
+
+
+def obter_catalogo(empresa_id):
+    """
+    Retorna ``{'versao', 'produtos', 'categorias'}`` da empresa, com todos os
+    produtos (ativos e inativos) na ordem de exibição.
+    """
+    versao = obter_versao_catalogo(empresa_id)
+    chave = f'catalogo:{empresa_id}:{versao}'
+    catalogo = cache_pedidos().get(chave)
+    if catalogo is None:
+        catalogo = construir_catalogo(empresa_id)
+        cache_pedidos().set(chave, catalogo, TIMEOUT_CATALOGO)
+    return {'versao': versao, **catalogo}
+
+
+def construir_opcoes_combo(empresa_id, combo_id):
+    """
+    Slots e itens do combo com situação de cada produto (ativo, estoque),
+    em três consultas fixas. Retorna None se o combo não for da empresa.
+    """
+    itens = ComboSlotItem.objects.select_related('produto').order_by('id')
+    slots = ComboSlot.objects.order_by('ordem').prefetch_related(Prefetch('itens', queryset=itens))
+    combo = (
+        Combo.objects.filter(id=combo_id, produto__empresa_id=empresa_id)
+        .select_related('produto')
+        .prefetch_related(Prefetch('slots', queryset=slots))
+        .first()
+    )
+    if combo is None:
+        return None
+
+    slots_data = []
+    erro = None if combo.slots.all() else 'Combo deve ter pelo menos um slot'
+    for slot in combo.slots.all():
+        if not slot.itens.all() and erro is None:
+            erro = f"Slot '{slot.nome}' não possui itens vinculados"
+        slots_data.append({
+            'id': slot.id,
+            'nome': slot.nome,
+            'emoji': slot.emoji,
+            'ordem': slot.ordem,
+            'itens': [
+                {
+                    'produto_id': item.produto.id,
+                    'nome': item.produto.nome,
+                    'quantidade_abate': float(item.quantidade_abate),
+                    'estoque_disponivel': item.produto.quantidade_estoque,
+                    'produto_ativo': item.produto.ativo,
+                    # Estoque só conta para produtos ativos
+                    'tem_estoque_suficiente': item.produto.ativo and item.validar_estoque_disponivel()
+                }
+                for item in slot.itens.all()
+            ]
+        })
+
+    return {
+        'combo_id': combo.id,
+        'nome': combo.produto.nome,
+        'preco': float(combo.produto.preco),
+        'erro': erro,
+        'slots': slots_data
+    }
+
+
+def obter_opcoes_do_combo(empresa_id, combo_id):
+    """Opções do combo na versão atual do catálogo (ver ``construir_opcoes_combo``)."""
+    versao = obter_versao_catalogo(empresa_id)
+    chave = f'catalogo:combo:{empresa_id}:{versao}:{combo_id}'
+    opcoes = cache_pedidos().get(chave)
+    if opcoes is None:
+        opcoes = construir_opcoes_combo(empresa_id, combo_id)
+        if opcoes is None:
+            return None
+        cache_pedidos().set(chave, opcoes, TIMEOUT_CATALOGO)
+    return opcoes
+
+
+def produtos_do_catalogo(catalogo, apenas_ativos=False, categoria_id=None):
+    return [
+        produto for produto in catalogo['produtos']
+        if (produto['ativo'] or not apenas_ativos)
+        and (categoria_id is None or produto['categoria_id'] == categoria_id)
+    ]
+
+
+def etag_catalogo(request, empresa_id=None, *args, **kwargs):
+    """ETag das páginas e APIs do catálogo (empresa da URL ou do usuário)."""
+    return obter_versao_catalogo(empresa_id or request.user.empresa_id)
@@ -0,0 +1,163 @@
+"""
+Validação das escolhas de combos antes de irem para o carrinho.
+
+Todas as seleções de um carrinho (vários combos, cada um com uma escolha por
+slot) são conferidas com uma única consulta, que traz os combos pedidos com
+seus slots e itens. Cada escolha precisa ser de um slot do próprio combo e de
+um produto vinculado a esse slot, ativo e com estoque para o total pedido no
+carrinho; os problemas são devolvidos por slot.
+"""
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from .models import Combo
+from .pedidos import PedidoInvalido, chave, ler_quantidade
+
+
+def _carregar_combos(empresa_id, combo_ids):
+    """Combos da empresa com seus slots (em ordem) e itens, indexados por ID."""
+    linhas = (
+        Combo.objects.filter(id__in=combo_ids, produto__empresa_id=empresa_id)
+        .values(
+            'id', 'produto_id', 'produto__nome', 'produto__preco',
+            'slots__id', 'slots__nome',
+            'slots__itens__produto_id', 'slots__itens__produto__nome', 'slots__itens__produto__ativo',
+            'slots__itens__produto__quantidade_estoque', 'slots__itens__quantidade_abate'
+        )
+        .order_by('id', 'slots__ordem', 'slots__itens__id')
+    )
+
+    combos = {}
+    for linha in linhas:
+        combo = combos.setdefault(linha['id'], {
+            'produto_id': linha['produto_id'],
+            'nome': linha['produto__nome'],
+            'preco': linha['produto__preco'],
+            'slots': {}
+        })
+        if linha['slots__id'] is None:
+            continue
+        slot = combo['slots'].setdefault(linha['slots__id'], {'nome': linha['slots__nome'], 'itens': {}})
+        produto_id = linha['slots__itens__produto_id']
+        if produto_id is not None:
+            # O mesmo produto pode estar mais de uma vez no slot; vale o primeiro
+            slot['itens'].setdefault(produto_id, {
+                'produto_id': produto_id,
+                'nome': linha['slots__itens__produto__nome'],
+                'ativo': linha['slots__itens__produto__ativo'],
+                'estoque': linha['slots__itens__produto__quantidade_estoque'],
+                'quantidade_abate': linha['slots__itens__quantidade_abate']
+            })
+    return combos
+
+
+def _erro_slot(resultado, slot_id, slot_nome, mensagem):
+    resultado['erros_slots'].append({'slot_id': slot_id, 'slot_nome': slot_nome, 'erro': mensagem})
+
+
+def validar_selecoes_combo(empresa_id, selecoes):
+    """
+    Valida uma lista de seleções ``{'combo_id', 'quantidade', 'escolhas'}``
+    (``escolhas``: ``[{'slot_id', 'produto_id'}]``, uma por slot).
+
+    Retorna, na mesma ordem, ``{'combo_id', 'valido', 'erro', 'erros_slots',
+    'combo'}``: ``erro`` é o problema do combo como um todo, ``erros_slots``
+    lista ``{'slot_id', 'slot_nome', 'erro'}`` e ``combo`` (só quando válido)
+    traz os dados para o carrinho. O estoque é conferido pelo total que o
+    carrinho inteiro abate de cada produto.
+    """
+    combo_ids = {chave(selecao.get('combo_id')) for selecao in selecoes}
+    combo_ids.discard(None)
+    combos = _carregar_combos(empresa_id, combo_ids) if combo_ids else {}
+
+    resultados = []
+    demanda = Counter()
+    usos = defaultdict(list)
+    itens_usados = {}
+
+    for selecao in selecoes:
+        resultado = {
+            'combo_id': selecao.get('combo_id'),
+            'valido': False,
+            'erro': None,
+            'erros_slots': [],
+            'combo': None
+        }
+        resultados.append(resultado)
+
+        combo = combos.get(chave(selecao.get('combo_id')))
+        if combo is None:
+            resultado['erro'] = 'Combo não encontrado'
+            continue
+        if not combo['slots']:
+            resultado['erro'] = 'Combo deve ter pelo menos um slot'
+            continue
+        try:
+            quantidade = ler_quantidade(selecao.get('quantidade', 1))
+        except PedidoInvalido as e:
+            resultado['erro'] = str(e)
+            continue
+        escolhas = selecao.get('escolhas')
+        if not isinstance(escolhas, list):
+            resultado['erro'] = 'Escolhas inválidas'
+            continue
+
+        escolhidos = {}
+        conferidos = set()
+        for escolha in escolhas:
+            slot_id = chave(escolha.get('slot_id')) if isinstance(escolha, dict) else None
+            slot = combo['slots'].get(slot_id)
+            if slot is None:
+                _erro_slot(resultado, escolha.get('slot_id') if isinstance(escolha, dict) else None,
+                           '', 'Slot não pertence a este combo')
+                continue
+            if slot_id in conferidos:
+                _erro_slot(resultado, slot_id, slot['nome'], 'Mais de uma escolha para este slot')
+                continue
+            conferidos.add(slot_id)
+
+            item = slot['itens'].get(chave(escolha.get('produto_id')))
+            if item is None:
+                _erro_slot(resultado, slot_id, slot['nome'], 'Produto não disponível neste slot')
+            elif not item['ativo']:
+                _erro_slot(resultado, slot_id, slot['nome'], f"{item['nome']} está inativo")
+            else:
+                escolhidos[slot_id] = item
+
+        for slot_id, slot in combo['slots'].items():
+            if slot_id not in conferidos:
+                _erro_slot(resultado, slot_id, slot['nome'], 'Slot não preenchido')
+
+        for slot_id, item in escolhidos.items():
+            demanda[item['produto_id']] += item['quantidade_abate'] * quantidade
+            usos[item['produto_id']].append((resultado, slot_id, combo['slots'][slot_id]['nome']))
+            itens_usados[item['produto_id']] = item
+
+        resultado['combo'] = {
+            'produto_id': combo['produto_id'],  # ID do produto, não do combo
+            'combo_id': chave(selecao.get('combo_id')),
+            'nome': combo['nome'],
+            'preco': float(combo['preco']),
+            'escolhas': [
+                {
+                    'slot_id': slot_id,
+                    'slot_nome': combo['slots'][slot_id]['nome'],
+                    'produto_id': item['produto_id'],
+                    'produto_nome': item['nome'],
+                    'quantidade_abate': float(item['quantidade_abate'])
+                }
+                for slot_id, item in escolhidos.items()
+            ]
+        }
+
+    for produto_id, total in demanda.items():
+        item = itens_usados[produto_id]
+        if Decimal(item['estoque']) < total:
+            for resultado, slot_id, slot_nome in usos[produto_id]:
+                _erro_slot(resultado, slot_id, slot_nome, f"Estoque insuficiente para {item['nome']}")
+
+    for resultado in resultados:
+        resultado['valido'] = resultado['erro'] is None and not resultado['erros_slots']
+        if not resultado['valido']:
+            resultado['combo'] = None
+    return resultados
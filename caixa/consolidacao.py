@@ -0,0 +1,268 @@
+"""
+Resumos diários de vendas (``VendaDiaria`` e ``VendaDiariaProduto``).
+
+Cada gravação de pedido ou item leva aos resumos só a sua diferença: o
+pedido sai da linha em que somava (valores gravados, ``Pedido.dados_vendas``
+e ``ItemPedido.dados_venda`` lidos do banco) e entra na linha atual. As
+diferenças são aplicadas após o commit com UPDATEs ``F()`` nas linhas do
+dia, sem reler os pedidos (ver ``caixa/signals.py``; os itens gravados por
+``bulk_create``/``bulk_update`` passam por ``registrar_itens``). Os
+relatórios de semana, mês ou período personalizado somam essas linhas em
+vez de varrer pedidos e itens (ver ``caixa/relatorios.py``).
+
+``python manage.py consolidar_vendas`` reconstrói qualquer período do zero
+(carga inicial, correções); rode-o fora do horário de vendas.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .estatisticas import intervalo_dias
+from .models import Pedido, ItemPedido, Produto, VendaDiaria, VendaDiariaProduto
+
+logger = logging.getLogger(__name__)
+
+
+def _montar_resumos(empresa_id, data):
+    """Resumos de um dia. Filtra pelo intervalo do dia, sem converter datas por linha."""
+    inicio, fim = intervalo_dias(data)
+    pedidos = Pedido.objects.filter(
+        empresa_id=empresa_id,
+        criado_em__gte=inicio,
+        criado_em__lt=fim
+    ).exclude(status='cancelado')
+    itens = ItemPedido.objects.filter(pedido__in=pedidos)
+
+    vendas = pedidos.values('forma_pagamento', 'tipo').annotate(
+        pedidos=Count('id'),
+        vendas=Sum('total')
+    ).order_by()
+
+    # Itens somados à parte: o JOIN com itens multiplicaria os totais dos pedidos
+    itens_por_grupo = {
+        (linha['pedido__forma_pagamento'], linha['pedido__tipo']): linha['quantidade_total']
+        for linha in itens.values('pedido__forma_pagamento', 'pedido__tipo').annotate(
+            quantidade_total=Sum('quantidade')
+        ).order_by()
+    }
+
+    resumos = [
+        VendaDiaria(
+            empresa_id=empresa_id,
+            data=data,
+            forma_pagamento=linha['forma_pagamento'],
+            tipo=linha['tipo'],
+            total_pedidos=linha['pedidos'],
+            total_vendas=linha['vendas'] or 0,
+            total_itens=itens_por_grupo.get((linha['forma_pagamento'], linha['tipo'])) or 0
+        )
+        for linha in vendas
+    ]
+
+    produtos = [
+        VendaDiariaProduto(
+            empresa_id=empresa_id,
+            data=data,
+            forma_pagamento=linha['pedido__forma_pagamento'],
+            tipo=linha['pedido__tipo'],
+            produto_id=linha['produto_id'],
+            produto_nome=linha['produto__nome'],
+            quantidade=linha['quantidade_total'],
+            total=linha['valor_total'] or 0
+        )
+        for linha in itens.values('pedido__forma_pagamento', 'pedido__tipo', 'produto_id', 'produto__nome').annotate(
+            quantidade_total=Sum('quantidade'),
+            valor_total=Sum(F('quantidade') * F('preco_unitario'))
+        ).order_by()
+    ]
+
+    return resumos, produtos
+
+
+def consolidar_dia(empresa_id, data):
+    """Recalcula do zero os resumos da empresa em ``data`` (comando ``consolidar_vendas``)."""
+    for tentativa in range(2):
+        resumos, produtos = _montar_resumos(empresa_id, data)
+        try:
+            with transaction.atomic():
+                VendaDiaria.objects.filter(empresa_id=empresa_id, data=data).delete()
+                VendaDiariaProduto.objects.filter(empresa_id=empresa_id, data=data).delete()
+                VendaDiaria.objects.bulk_create(resumos)
+                VendaDiariaProduto.objects.bulk_create(produtos)
+            return
+        except IntegrityError:
+            # Outra consolidação do mesmo dia gravou primeiro; refazer com os dados atuais
+            if tentativa:
+                raise
+
+
+def consolidar_periodo(empresa_id, data_inicio, data_fim=None):
+    """Recalcula os resumos da empresa nos dias de ``data_inicio`` a ``data_fim``."""
+    data = data_inicio
+    while data <= (data_fim or data_inicio):
+        consolidar_dia(empresa_id, data)
+        data += timedelta(days=1)
+
+
+def _linha(vendas):
+    """``(forma_pagamento, tipo)`` em que o pedido soma, ou None se cancelado."""
+    cancelado, tipo, forma_pagamento, _total = vendas
+    return None if cancelado else (forma_pagamento, tipo)
+
+
+def _somar_linha(modelo, chave, valores, **criacao):
+    """
+    Soma ``valores`` na linha ``chave`` do resumo com um UPDATE ``F()``;
+    se a linha ainda não existir, cria com ``valores`` e ``criacao``.
+    """
+    linhas = modelo.objects.filter(**chave)
+    incrementos = {campo: F(campo) + valor for campo, valor in valores.items()}
+    if linhas.update(**incrementos):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**chave, **valores, **criacao)
+    except IntegrityError:
+        # Criada por outra gravação entre o UPDATE e o INSERT
+        if not linhas.update(**incrementos):
+            raise
+
+
+class VariacaoVendas:
+    """Diferença que uma gravação faz nos resumos do dia de um pedido."""
+
+    def __init__(self, empresa_id, criado_em):
+        self.empresa_id = empresa_id
+        self.data = timezone.localdate(criado_em)
+        # (forma_pagamento, tipo) -> [pedidos, valor, itens]
+        self.vendas = defaultdict(lambda: [0, Decimal('0.00'), 0])
+        # (forma_pagamento, tipo, produto_id) -> [quantidade, valor]
+        self.produtos = defaultdict(lambda: [0, Decimal('0.00')])
+
+    def somar_pedido(self, vendas, sinal=1):
+        """Conta (``sinal`` 1) ou desconta (-1) o pedido e o seu total na linha de ``vendas``."""
+        linha = _linha(vendas)
+        if linha is not None:
+            self.vendas[linha][0] += sinal
+            self.vendas[linha][1] += sinal * vendas[3]
+
+    def somar_itens(self, vendas, itens, sinal=1):
+        """Soma ou desconta ``itens`` (``ItemPedido.dados_venda``) na linha de ``vendas``."""
+        linha = _linha(vendas)
+        if linha is None:
+            return
+        for produto_id, quantidade, preco_unitario in itens:
+            self.vendas[linha][2] += sinal * quantidade
+            produto = self.produtos[(*linha, produto_id)]
+            produto[0] += sinal * quantidade
+            produto[1] += sinal * quantidade * preco_unitario
+
+    def aplicar(self):
+        chave = {'empresa_id': self.empresa_id, 'data': self.data}
+        for (forma_pagamento, tipo), (pedidos, valor, itens) in self.vendas.items():
+            if pedidos or valor or itens:
+                _somar_linha(
+                    VendaDiaria, {**chave, 'forma_pagamento': forma_pagamento, 'tipo': tipo},
+                    {'total_pedidos': pedidos, 'total_vendas': valor, 'total_itens': itens}
+                )
+
+        produtos = {linha: valores for linha, valores in self.produtos.items() if any(valores)}
+        nomes = dict(
+            Produto.objects.filter(id__in={produto_id for *_, produto_id in produtos}).values_list('id', 'nome')
+        ) if produtos else {}
+        for (forma_pagamento, tipo, produto_id), (quantidade, valor) in produtos.items():
+            _somar_linha(
+                VendaDiariaProduto,
+                {**chave, 'forma_pagamento': forma_pagamento, 'tipo': tipo, 'produto_id': produto_id},
+                {'quantidade': quantidade, 'total': valor},
+                produto_nome=nomes.get(produto_id, '')
+            )
+
+    def agendar(self):
+        """Aplica a diferença depois do commit (descartada com a transação)."""
+        if not (any(any(valores) for valores in self.vendas.values()) or
+                any(any(valores) for valores in self.produtos.values())):
+            return
+
+        def _aplicar():
+            try:
+                self.aplicar()
+            except Exception:
+                # Relatório desatualizado não deve derrubar a venda; o comando
+                # consolidar_vendas corrige o dia
+                logger.exception('Falha ao consolidar vendas de %s (empresa %s)', self.data, self.empresa_id)
+
+        transaction.on_commit(_aplicar)
+
+
+def vendas_gravadas(pedido_id):
+    """``Pedido.dados_vendas`` como está no banco, ou None se o pedido não existir."""
+    pedido = Pedido.objects.filter(id=pedido_id).only(*Pedido.CAMPOS_VENDAS).first()
+    return pedido.dados_vendas() if pedido else None
+
+
+def itens_gravados(pedido_id):
+    """``ItemPedido.dados_venda`` de cada item do pedido, como estão no banco."""
+    return list(ItemPedido.objects.filter(pedido_id=pedido_id).values_list('produto_id', 'quantidade', 'preco_unitario'))
+
+
+def registrar_pedido(pedido, antes, depois):
+    """
+    Leva aos resumos a gravação do pedido: ``antes`` e ``depois`` são
+    ``dados_vendas`` gravados antes e agora (``antes`` None na criação).
+    Se a linha do pedido mudou (pagamento, tipo, cancelamento), os itens
+    mudam de linha junto com ele.
+    """
+    variacao = VariacaoVendas(pedido.empresa_id, pedido.criado_em)
+    if antes is not None:
+        variacao.somar_pedido(antes, -1)
+    variacao.somar_pedido(depois)
+    if antes is not None and _linha(antes) != _linha(depois):
+        itens = itens_gravados(pedido.pk)
+        variacao.somar_itens(antes, itens, -1)
+        variacao.somar_itens(depois, itens)
+    variacao.agendar()
+
+
+def registrar_exclusao_pedido(pedido, vendas):
+    """Desconta dos resumos o pedido que vai ser excluído, com os itens ainda gravados."""
+    variacao = VariacaoVendas(pedido.empresa_id, pedido.criado_em)
+    variacao.somar_pedido(vendas, -1)
+    variacao.somar_itens(vendas, itens_gravados(pedido.pk), -1)
+    variacao.agendar()
+
+
+def registrar_itens(empresa_id, criado_em, vendas, alteracoes):
+    """
+    Leva aos resumos a gravação de itens de um pedido cuja linha é ``vendas``
+    (``dados_vendas`` gravado). ``alteracoes`` são pares ``(antes, depois)``
+    de ``ItemPedido.dados_venda``: None antes na inclusão e depois na exclusão.
+    """
+    if vendas is None:
+        return
+    variacao = VariacaoVendas(empresa_id, criado_em)
+    for antes, depois in alteracoes:
+        if antes is not None:
+            variacao.somar_itens(vendas, [antes], -1)
+        if depois is not None:
+            variacao.somar_itens(vendas, [depois])
+    variacao.agendar()
+
+
+def registrar_itens_gravados(pedido, itens):
+    """
+    ``registrar_itens`` para itens gravados por ``bulk_create``/``bulk_update``
+    (sem sinais): cada item sai com o que somava e entra com os valores atuais.
+    """
+    vendas = getattr(pedido, '_vendas_gravadas', None) or vendas_gravadas(pedido.pk)
+    alteracoes = []
+    for item in itens:
+        depois = item.dados_venda()
+        alteracoes.append((getattr(item, '_venda_gravada', None), depois))
+        item._venda_gravada = depois
+    registrar_itens(pedido.empresa_id, pedido.criado_em, vendas, alteracoes)
@@ -0,0 +1,92 @@
+"""
+Estatísticas de pedidos em duas consultas.
+
+Usado pelo dashboard do caixa, pelas APIs de pedidos ativos (caixa e
+cozinha) e pelo painel de status. As contagens saem de uma só agregação
+condicional sobre os pedidos e os tempos médios (entrega e cada etapa) de
+outra sobre as transições de status do dia, ambas pelo índice; o custo não
+cresce com o volume de pedidos além da varredura do período.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Avg, Count, Q, Sum
+from django.utils import timezone
+
+from .models import Pedido, TransicaoStatusPedido
+from .sincronizacao import STATUS_ATIVOS
+
+# Etapas medidas pelo histórico de status: tempo em ``status_anterior`` até ``status_novo``
+ETAPAS = {
+    'espera': ('pendente', 'preparando'),
+    'preparo': ('preparando', 'pronto'),
+    'retirada': ('pronto', 'entregue'),
+}
+
+
+def intervalo_dias(data_inicio, data_fim=None):
+    """
+    Intervalo semiaberto [início, fim) em datetimes do fuso local cobrindo os
+    dias de ``data_inicio`` a ``data_fim`` (inclusive). Ao contrário de
+    ``campo__date``, permite usar índices sobre o campo de data/hora.
+    """
+    data_fim = data_fim or data_inicio
+    fuso = timezone.get_current_timezone()
+    inicio = datetime.combine(data_inicio, time.min, tzinfo=fuso)
+    fim = datetime.combine(data_fim + timedelta(days=1), time.min, tzinfo=fuso)
+    return inicio, fim
+
+
+def _segundos(duracao):
+    return int(duracao.total_seconds()) if duracao else 0
+
+
+def calcular_tempos_medios(empresa, inicio, fim):
+    """
+    Tempo médio de entrega (criação até entregue) e de cada etapa de
+    ``ETAPAS``, em segundos, das transições de status em [início, fim).
+    """
+    tempos = TransicaoStatusPedido.objects.filter(
+        empresa=empresa,
+        status_anterior__in=STATUS_ATIVOS,
+        criado_em__gte=inicio,
+        criado_em__lt=fim
+    ).aggregate(
+        entrega=Avg('desde_criacao', filter=Q(status_novo='entregue')),
+        **{
+            etapa: Avg('duracao', filter=Q(status_anterior=anterior, status_novo=novo))
+            for etapa, (anterior, novo) in ETAPAS.items()
+        }
+    )
+    return {
+        'tempo_medio_segundos': _segundos(tempos['entrega']),
+        **{f'tempo_medio_{etapa}_segundos': _segundos(tempos[etapa]) for etapa in ETAPAS}
+    }
+
+
+def calcular_estatisticas_pedidos(empresa):
+    """
+    Contagens dos pedidos ativos, tempos médios de entrega e por etapa de
+    hoje e resumo dos pedidos criados hoje. Aceita a empresa ou o seu ID.
+    """
+    inicio, fim = intervalo_dias(timezone.localdate())
+
+    criado_hoje = Q(criado_em__gte=inicio, criado_em__lt=fim)
+
+    dados = Pedido.objects.filter(
+        Q(status__in=STATUS_ATIVOS) | criado_hoje,
+        empresa=empresa
+    ).aggregate(
+        total_pendente=Count('id', filter=Q(status='pendente')),
+        total_preparando=Count('id', filter=Q(status='preparando')),
+        total_pronto=Count('id', filter=Q(status='pronto')),
+        pedidos_hoje=Count('id', filter=criado_hoje),
+        vendas_hoje=Sum('total', filter=criado_hoje),
+        pendentes_hoje=Count('id', filter=criado_hoje & Q(status='pendente')),
+        preparando_hoje=Count('id', filter=criado_hoje & Q(status='preparando')),
+        prontos_hoje=Count('id', filter=criado_hoje & Q(status='pronto')),
+        entregues_hoje=Count('id', filter=criado_hoje & Q(status='entregue')),
+    )
+
+    dados['vendas_hoje'] = dados['vendas_hoje'] or 0
+    dados.update(calcular_tempos_medios(empresa, inicio, fim))
+    return dados
@@ -0,0 +1,151 @@
+"""
+Controle de estoque.
+
+Toda alteração de ``Produto.quantidade_estoque`` passa por aqui: os saldos
+mudam por expressões ``F()`` (sem ler e regravar o produto), as saídas só
+acontecem se houver saldo (``quantidade_estoque >= n`` na própria cláusula
+WHERE) e cada movimento é registrado em ``MovimentacaoEstoque``. Como os
+saldos não passam por ``save()``, a versão do catálogo é trocada aqui.
+"""
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from .catalogo import registrar_alteracao_catalogo
+from .models import Produto, MovimentacaoEstoque
+
+
+class EstoqueInsuficiente(Exception):
+    """
+    Saída recusada por falta de saldo. ``itens`` lista, para cada produto,
+    ``produto_id``, ``nome``, ``disponivel`` e ``solicitado``.
+    """
+
+    def __init__(self, itens):
+        self.itens = itens
+        if itens:
+            detalhes = ', '.join(
+                f"{item['nome']} (disponível: {item['disponivel']}, solicitado: {item['solicitado']})"
+                for item in itens
+            )
+            mensagem = f'Estoque insuficiente: {detalhes}'
+        else:
+            mensagem = 'Estoque insuficiente. Tente novamente.'
+        super().__init__(mensagem)
+
+
+class _SaidaRecusada(Exception):
+    pass
+
+
+def permitir_estoque_negativo():
+    return getattr(settings, 'CANTINA_PERMITIR_ESTOQUE_NEGATIVO', False)
+
+
+def _por_produto(quantidades):
+    return Case(
+        *[When(id=produto_id, then=Value(qtd)) for produto_id, qtd in quantidades.items()],
+        default=Value(0),
+        output_field=IntegerField()
+    )
+
+
+def movimentar_estoque(empresa, quantidades, tipo, pedido=None, usuario=None, observacao=''):
+    """
+    Aplica ``{produto_id: quantidade}`` ao estoque em um único UPDATE e
+    registra as movimentações. Quantidades negativas são saídas.
+    ``empresa`` pode ser a instância ou o ID.
+
+    Se alguma saída deixaria o saldo negativo nada é alterado e
+    ``EstoqueInsuficiente`` é lançada (a menos que
+    ``CANTINA_PERMITIR_ESTOQUE_NEGATIVO`` esteja ativo).
+    """
+    quantidades = {produto_id: qtd for produto_id, qtd in quantidades.items() if qtd}
+    if not quantidades:
+        return
+
+    empresa_id = getattr(empresa, 'pk', empresa)
+    saidas = {produto_id: -qtd for produto_id, qtd in quantidades.items() if qtd < 0}
+    produtos = Produto.objects.filter(empresa_id=empresa_id, id__in=quantidades)
+
+    try:
+        with transaction.atomic():
+            if saidas and not permitir_estoque_negativo():
+                # Só atualiza as linhas com saldo; se faltar alguma, desfaz tudo
+                produtos = produtos.filter(
+                    ~Q(id__in=saidas) | Q(quantidade_estoque__gte=_por_produto(saidas))
+                )
+            atualizados = produtos.update(
+                quantidade_estoque=F('quantidade_estoque') + _por_produto(quantidades)
+            )
+            if atualizados != len(quantidades):
+                raise _SaidaRecusada()
+
+            MovimentacaoEstoque.objects.bulk_create([
+                MovimentacaoEstoque(
+                    empresa_id=empresa_id,
+                    produto_id=produto_id,
+                    tipo=tipo,
+                    quantidade=qtd,
+                    pedido=pedido,
+                    numero_pedido=pedido.numero_pedido if pedido else '',
+                    usuario=usuario,
+                    observacao=observacao
+                )
+                for produto_id, qtd in quantidades.items()
+            ])
+            registrar_alteracao_catalogo(empresa_id)
+    except _SaidaRecusada:
+        faltantes = [
+            {
+                'produto_id': produto.id,
+                'nome': produto.nome,
+                'disponivel': produto.quantidade_estoque,
+                'solicitado': saidas[produto.id],
+            }
+            for produto in Produto.objects.filter(empresa_id=empresa_id, id__in=saidas).only('id', 'nome', 'quantidade_estoque')
+            if produto.quantidade_estoque < saidas[produto.id]
+        ]
+        raise EstoqueInsuficiente(faltantes)
+
+
+def ajustar_estoque(produto, nova_quantidade, usuario=None):
+    """
+    Define o saldo de um produto (ajuste manual na tela de estoque),
+    registrando a diferença como movimentação.
+    """
+    with transaction.atomic():
+        atual = Produto.objects.select_for_update().values_list(
+            'quantidade_estoque', flat=True
+        ).get(id=produto.id)
+        diferenca = nova_quantidade - atual
+        if diferenca:
+            Produto.objects.filter(id=produto.id).update(quantidade_estoque=nova_quantidade)
+            MovimentacaoEstoque.objects.create(
+                empresa_id=produto.empresa_id,
+                produto_id=produto.id,
+                tipo='ajuste',
+                quantidade=diferenca,
+                usuario=usuario
+            )
+            registrar_alteracao_catalogo(produto.empresa_id)
+    produto.quantidade_estoque = nova_quantidade
+
+
+def consumo_do_pedido(pedido):
+    """
+    Quantidade abatida do estoque por produto para os itens gravados do pedido:
+    combos consomem os produtos escolhidos, os demais itens o próprio produto.
+    """
+    consumo = Counter()
+    for item in pedido.itens.prefetch_related('escolhas_combo'):
+        escolhas = item.escolhas_combo.all()
+        if escolhas:
+            for escolha in escolhas:
+                consumo[escolha.produto_escolhido_id] += int(Decimal(escolha.quantidade_abatida)) * item.quantidade
+        else:
+            consumo[item.produto_id] += item.quantidade
+    return consumo
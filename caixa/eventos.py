@@ -0,0 +1,270 @@
+"""
+Canal de eventos de pedidos (server-sent events).
+
+Os sinais de ``Pedido`` e ``ItemPedido`` (``caixa/signals.py``) publicam
+aqui um delta por pedido alterado em cada transação, venha a escrita do
+caixa, da cozinha, do autoatendimento ou do admin, e o endpoint
+``api_eventos_pedidos`` entrega esses deltas aos terminais conectados
+(caixa, cozinha), que só precisam buscar o snapshot completo uma vez.
+
+Os eventos ficam no banco (``EventoCanal``), então a escrita pode acontecer
+no gunicorn e a entrega no uvicorn. O processo que publica grava no cache
+``pedidos`` o ID do último evento do canal; as conexões em espera conferem
+esse aviso a cada ``INTERVALO_CONSULTA`` segundos (no mesmo processo, são
+acordadas na hora). Com mais de um processo, o cache precisa ser
+compartilhado (``CANTINA_CACHE_PEDIDOS`` = ``arquivo`` ou ``banco``).
+"""
+import asyncio
+import json
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import EventoCanal
+from .sincronizacao import cache_pedidos, on_commit_unico
+
+# Máximo de eventos reenviados numa reconexão (Last-Event-ID); acima disso o
+# terminal recebe ``resync`` e recarrega o snapshot
+TAMANHO_BUFFER = 200
+
+# Comentário enviado periodicamente para manter a conexão aberta em proxies
+INTERVALO_HEARTBEAT = 15
+
+# Tempo máximo de uma conexão; o EventSource reconecta sozinho com Last-Event-ID
+DURACAO_MAXIMA_STREAM = 300
+
+# Intervalo (segundos) entre as conferências do aviso de eventos de outros processos
+INTERVALO_CONSULTA = 1
+
+# Eventos mais antigos são apagados; reconexões anteriores recebem ``resync``
+RETENCAO_EVENTOS = timedelta(hours=1)
+
+# A cada quantos eventos publicados o processo apaga os expirados
+INTERVALO_LIMPEZA = 500
+
+# IDs reservados por transações concorrentes podem ficar visíveis fora de
+# ordem: a leitura volta esta quantidade de IDs e ignora os já entregues
+SOBREPOSICAO_IDS = 50
+
+
+class CanalEventos:
+    """Eventos de um canal (empresa ou terminal) e a espera por eventos novos."""
+
+    def __init__(self, nome):
+        self.nome = nome
+        self._lock = threading.Lock()
+        self._assinantes = set()
+
+    @property
+    def chave_aviso(self):
+        return f'eventos:aviso:{self.nome}'
+
+    def marca(self):
+        """Aviso do último evento publicado (muda a cada publicação, em qualquer processo)."""
+        return cache_pedidos().get(self.chave_aviso)
+
+    @property
+    def ultimo_id(self):
+        # Do banco, não do aviso: o cache pode sobreviver a uma troca de banco
+        return EventoCanal.objects.filter(canal=self.nome).aggregate(maior=Max('id'))['maior'] or 0
+
+    def publicar(self, tipo, dados):
+        evento = EventoCanal.objects.create(canal=self.nome, tipo=tipo, dados=dados)
+        if evento.id % INTERVALO_LIMPEZA == 0:
+            EventoCanal.objects.filter(criado_em__lt=timezone.now() - RETENCAO_EVENTOS).delete()
+
+        def _avisar():
+            cache_pedidos().set(self.chave_aviso, evento.id, None)
+            with self._lock:
+                assinantes = list(self._assinantes)
+            # Acordar conexões assíncronas (cada uma no seu event loop)
+            for loop, sinal in assinantes:
+                loop.call_soon_threadsafe(sinal.set)
+
+        transaction.on_commit(_avisar)
+        return {'id': evento.id, 'tipo': tipo, 'dados': dados}
+
+    def eventos_desde(self, ultimo_id, entregues=()):
+        """
+        Retorna os eventos posteriores a ``ultimo_id``, menos os ``entregues``.
+        Retorna None se o cliente perdeu eventos (apagados por antigos ou em
+        excesso) e precisa buscar um novo snapshot.
+        """
+        limites = EventoCanal.objects.aggregate(menor=Min('id'), maior=Max('id'))
+        if ultimo_id > (limites['maior'] or 0):
+            return None
+        if limites['menor'] is not None and ultimo_id < limites['menor'] - 1:
+            return None
+
+        desde = ultimo_id - SOBREPOSICAO_IDS if entregues else ultimo_id
+        eventos = [
+            {'id': evento.id, 'tipo': evento.tipo, 'dados': evento.dados}
+            for evento in EventoCanal.objects.filter(canal=self.nome, id__gt=desde).order_by('id')[:TAMANHO_BUFFER + 1]
+            if evento.id not in entregues
+        ]
+        if len(eventos) > TAMANHO_BUFFER:
+            return None
+        return eventos
+
+    async def aguardar_async(self, marca, timeout):
+        """
+        Espera até o aviso do canal mudar (evento novo) ou expirar o timeout.
+        Publicações do próprio processo acordam a espera na hora.
+        """
+        sinal = asyncio.Event()
+        assinante = (asyncio.get_running_loop(), sinal)
+        limite = time.monotonic() + timeout
+
+        with self._lock:
+            self._assinantes.add(assinante)
+        try:
+            while True:
+                # O cache pode ser o do banco: a leitura roda fora do event loop
+                if await sync_to_async(self.marca)() != marca:
+                    return True
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return False
+                sinal.clear()
+                try:
+                    await asyncio.wait_for(sinal.wait(), min(INTERVALO_CONSULTA, restante))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                self._assinantes.discard(assinante)
+
+
+_canais = {}
+_canais_lock = threading.Lock()
+
+
+def _obter_canal(nome):
+    # Um objeto por canal no processo, para acordar as esperas locais na hora
+    with _canais_lock:
+        canal = _canais.get(nome)
+        if canal is None:
+            canal = _canais[nome] = CanalEventos(nome)
+        return canal
+
+
+def obter_canal(empresa_id):
+    return _obter_canal(f'empresa:{empresa_id}')
+
+
+def obter_canal_terminal(empresa_id, terminal):
+    """Canal da tela do cliente pareada a um terminal de caixa (ver ``caixa/telas_cliente.py``)."""
+    return _obter_canal(f'terminal:{empresa_id}:{terminal}')
+
+
+def publicar_evento_pedido(empresa_id, tipo, chave=None, **dados):
+    """
+    Publica um evento de pedido após o commit da transação atual.
+
+    Tipos usados: ``pedido_criado``, ``pedido_alterado`` e ``pedido_excluido``.
+    ``dados`` pode conter callables, avaliados só no momento da publicação
+    (ex.: serialização do pedido já com os itens gravados); se algum devolver
+    None, o evento é descartado. Com ``chave``, eventos repetidos na mesma
+    transação viram um só (vale o primeiro agendado).
+    """
+    def _publicar():
+        resolvidos = {}
+        for nome, valor in dados.items():
+            resolvidos[nome] = valor() if callable(valor) else valor
+            if resolvidos[nome] is None:
+                return
+        obter_canal(empresa_id).publicar(tipo, resolvidos)
+
+    if chave is None:
+        transaction.on_commit(_publicar)
+    else:
+        on_commit_unico(chave, _publicar)
+
+
+def notificar_pedido(tipo, empresa_id, pedido_id):
+    """
+    Publica o estado atual do pedido no canal de eventos da empresa, uma vez
+    por transação. Chamado pelos sinais de ``Pedido`` e ``ItemPedido``, então
+    todo caminho de escrita (caixa, cozinha, autoatendimento, admin) avisa os
+    terminais. A serialização acontece depois do commit, já com os itens
+    gravados.
+    """
+    from .models import Pedido
+    from .pedidos_ativos import com_itens_serializaveis, obter_estatisticas_pedidos, serializar_pedido_ativo
+    from .previsao import obter_previsao, serializar_previsao
+
+    def _dados_pedido():
+        pedido_atual = com_itens_serializaveis(Pedido.objects.all()).filter(id=pedido_id).first()
+        # Excluído na mesma transação: o evento de exclusão já avisa os terminais
+        return serializar_pedido_ativo(pedido_atual) if pedido_atual else None
+
+    publicar_evento_pedido(
+        empresa_id, tipo,
+        chave=('pedido', pedido_id),
+        pedido=_dados_pedido,
+        estatisticas=lambda: obter_estatisticas_pedidos(empresa_id),
+        # Uma mudança de status desloca a previsão de toda a fila
+        previsao=lambda: serializar_previsao(obter_previsao(empresa_id))
+    )
+
+
+def notificar_exclusao(empresa_id, pedido_id):
+    """Avisa os terminais, após o commit, que o pedido foi excluído."""
+    from .pedidos_ativos import obter_estatisticas_pedidos
+    from .previsao import obter_previsao, serializar_previsao
+
+    publicar_evento_pedido(
+        empresa_id, 'pedido_excluido',
+        id=pedido_id,
+        estatisticas=lambda: obter_estatisticas_pedidos(empresa_id),
+        previsao=lambda: serializar_previsao(obter_previsao(empresa_id))
+    )
+
+
+def formatar_sse(evento):
+    """Formata um evento no protocolo text/event-stream."""
+    return (
+        f"id: {evento['id']}\n"
+        f"event: {evento['tipo']}\n"
+        f"data: {json.dumps(evento['dados'], cls=DjangoJSONEncoder, ensure_ascii=False)}\n\n"
+    )
+
+
+def _coletar_eventos(canal, ultimo_id, entregues):
+    eventos = canal.eventos_desde(ultimo_id, entregues)
+    if eventos is None:
+        # Cliente perdeu eventos: pedir que recarregue o snapshot
+        entregues.clear()
+        ultimo_id = canal.ultimo_id
+        return ultimo_id, formatar_sse({'id': ultimo_id, 'tipo': 'resync', 'dados': {}})
+    if not eventos:
+        return ultimo_id, ''
+    entregues.update(evento['id'] for evento in eventos)
+    # Só os IDs da janela de sobreposição ainda podem reaparecer
+    maior = max(ultimo_id, eventos[-1]['id'])
+    entregues.difference_update([i for i in entregues if i <= maior - SOBREPOSICAO_IDS])
+    return maior, ''.join(formatar_sse(evento) for evento in eventos)
+
+
+async def stream_eventos_async(canal, ultimo_id):
+    """
+    Gerador assíncrono do stream (servidor ASGI). Sob WSGI as views de
+    eventos respondem 204 em vez de prender uma thread do worker.
+    """
+    yield 'retry: 3000\n\n'
+    entregues = set()
+    inicio = time.monotonic()
+    while time.monotonic() - inicio < DURACAO_MAXIMA_STREAM:
+        # Marcar antes de ler: um evento publicado durante a leitura troca o aviso
+        marca = await sync_to_async(canal.marca)()
+        ultimo_id, bloco = await sync_to_async(_coletar_eventos)(canal, ultimo_id, entregues)
+        if bloco:
+            yield bloco
+        elif not await canal.aguardar_async(marca, INTERVALO_HEARTBEAT):
+            yield ': ping\n\n'
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.models import Empresa
+from caixa.tempos_preparo import reconstruir_tempos
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói os tempos de preparo aprendidos a partir do histórico de status dos pedidos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='ID da empresa (padrão: todas)')
+        parser.add_argument(
+            '--aplicar', action='store_true',
+            help='Grava a média aprendida em Produto.tempo_preparo (produtos com amostras suficientes)'
+        )
+
+    def handle(self, *args, **options):
+        empresas = Empresa.objects.order_by('id')
+        if options['empresa']:
+            empresas = empresas.filter(id=options['empresa'])
+            if not empresas.exists():
+                raise CommandError(f"Empresa {options['empresa']} não encontrada")
+
+        for empresa in empresas:
+            total = reconstruir_tempos(empresa.id, aplicar=options['aplicar'])
+            self.stdout.write(self.style.SUCCESS(f'{empresa.nome}: {total} produtos com tempo aprendido'))
@@ -0,0 +1,150 @@
+"""
+Planos de execução e tempos das consultas mais frequentes de pedidos e
+produtos, com e sem os índices de ``Pedido``/``Produto`` (migração 0014).
+
+Use um banco descartável (SQLite ou PostgreSQL): ``--popular`` grava uma
+empresa "Benchmark" com a quantidade pedida de pedidos, e a comparação
+"sem índices" remove os índices dentro de uma transação desfeita no final.
+
+    python manage.py benchmark_indices --popular --pedidos 1000000
+    python manage.py benchmark_indices
+"""
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from authentication.models import Empresa
+from caixa.estatisticas import intervalo_dias
+from caixa.models import Pedido, Produto
+from caixa.sincronizacao import STATUS_ATIVOS, STATUS_FINALIZADOS
+
+CNPJ_BENCHMARK = '00.000.000/0000-00'
+DIAS = 365
+LOTE = 5000
+EXECUCOES = 5
+
+
+class _Desfazer(Exception):
+    pass
+
+
+def _indices():
+    return [indice.name for modelo in (Pedido, Produto) for indice in modelo._meta.indexes]
+
+
+class Command(BaseCommand):
+    help = 'Compara planos e tempos das consultas de pedidos com e sem os índices compostos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--popular', action='store_true', help='Gera os dados da empresa Benchmark')
+        parser.add_argument('--pedidos', type=int, default=1_000_000, help='Pedidos gerados com --popular')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError('Suportado apenas em SQLite e PostgreSQL (DDL transacional).')
+
+        empresa, _ = Empresa.objects.get_or_create(
+            cnpj=CNPJ_BENCHMARK,
+            defaults={'nome': 'Benchmark', 'endereco': '-', 'telefone': '-'}
+        )
+        if options['popular']:
+            self._popular(empresa, options['pedidos'])
+
+        total = Pedido.objects.filter(empresa=empresa).count()
+        if not total:
+            raise CommandError('Sem pedidos na empresa Benchmark; rode com --popular.')
+        self.stdout.write(f'{total} pedidos na empresa Benchmark ({connection.vendor})\n')
+
+        consultas = self._consultas(empresa)
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for nome in _indices():
+                        cursor.execute(f'DROP INDEX {connection.ops.quote_name(nome)}')
+                self._medir('SEM ÍNDICES', consultas)
+                raise _Desfazer()
+        except _Desfazer:
+            pass
+        self._medir('COM ÍNDICES', consultas)
+
+    def _popular(self, empresa, quantidade):
+        if not Produto.objects.filter(empresa=empresa).exists():
+            Produto.objects.bulk_create([
+                Produto(empresa=empresa, nome=f'Produto {n}', preco=10, ativo=n % 5 != 0)
+                for n in range(200)
+            ])
+
+        por_dia = max(quantidade // DIAS, 1)
+        ultimo = Pedido.objects.filter(empresa=empresa).count()
+        gerados = 0
+        for dia in range(DIAS - 1, -1, -1):
+            if gerados >= quantidade:
+                break
+            recentes = dia == 0
+            for inicio in range(0, min(por_dia, quantidade - gerados), LOTE):
+                lote = min(LOTE, por_dia - inicio, quantidade - gerados)
+                criados = Pedido.objects.bulk_create([
+                    Pedido(
+                        empresa=empresa,
+                        numero_pedido=str(ultimo + gerados + n + 1),
+                        status=self._status(n, recentes),
+                        total=10
+                    )
+                    for n in range(lote)
+                ])
+                # criado_em/atualizado_em são automáticos; recuar o lote para o dia
+                Pedido.objects.filter(id__in=[pedido.id for pedido in criados]).update(
+                    criado_em=F('criado_em') - timedelta(days=dia),
+                    atualizado_em=F('criado_em') - timedelta(days=dia) + timedelta(minutes=15)
+                )
+                gerados += lote
+            if dia % 30 == 0:
+                self.stdout.write(f'{gerados}/{quantidade} pedidos')
+
+        # Estatísticas atualizadas para o otimizador escolher entre os índices
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    @staticmethod
+    def _status(n, recentes):
+        # Só os pedidos de hoje têm ativos; 5% dos demais são cancelados
+        if recentes and n % 10 == 0:
+            return STATUS_ATIVOS[n % 3]
+        return 'cancelado' if n % 20 == 0 else 'entregue'
+
+    def _consultas(self, empresa):
+        hoje = timezone.localdate()
+        inicio_hoje, fim_hoje = intervalo_dias(hoje)
+        inicio_mes, fim_mes = intervalo_dias(hoje.replace(day=1), hoje)
+        pedidos = Pedido.objects.filter(empresa=empresa)
+        return [
+            ('Pedidos ativos (caixa/cozinha/painel)',
+             pedidos.filter(status__in=STATUS_ATIVOS).order_by('criado_em')),
+            ('Entregues hoje (estatísticas)',
+             pedidos.filter(status='entregue', atualizado_em__gte=inicio_hoje, atualizado_em__lt=fim_hoje).order_by()),
+            ('Finalizados desde o cursor (sincronização)',
+             pedidos.filter(status__in=STATUS_FINALIZADOS, atualizado_em__gte=timezone.now() - timedelta(minutes=5)).order_by()),
+            ('Vendas do mês (relatórios)',
+             pedidos.filter(criado_em__gte=inicio_mes, criado_em__lt=fim_mes).exclude(status='cancelado')
+             .values('forma_pagamento').annotate(total_pedidos=Count('id'), vendas=Sum('total')).order_by()),
+            ('Primeira página do histórico',
+             pedidos.filter(criado_em__gte=inicio_mes, criado_em__lt=fim_mes).order_by('-criado_em', '-id')[:50]),
+            ('Produtos ativos (cardápio)',
+             Produto.objects.filter(empresa=empresa, ativo=True)),
+        ]
+
+    def _medir(self, titulo, consultas):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n===== {titulo} ====='))
+        for nome, queryset in consultas:
+            tempos = []
+            for _ in range(EXECUCOES):
+                inicio = time.perf_counter()
+                list(queryset.all())
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            self.stdout.write(self.style.SUCCESS(f'\n{nome}: {statistics.median(tempos):.2f} ms (mediana de {EXECUCOES})'))
+            self.stdout.write(queryset.explain())
@@ -0,0 +1,99 @@
+"""
+Teste de carga de gravação: vários terminais criando pedidos ao mesmo tempo
+pelo mesmo caminho do caixa (``criar_pedido_completo``), contra o banco
+configurado em ``DB_ENGINE``. Grava em uma empresa "Carga"; use um banco
+descartável.
+
+    python manage.py carga_pedidos --terminais 8 --pedidos 200
+    DB_ENGINE=postgresql python manage.py carga_pedidos --terminais 8 --pedidos 200
+"""
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, DatabaseError
+
+from authentication.models import Empresa
+from caixa.models import Produto
+from caixa.pedidos import criar_pedido_completo
+
+CNPJ_CARGA = '00.000.000/0000-01'
+
+
+class Command(BaseCommand):
+    help = 'Mede a vazão de criação de pedidos com vários terminais simultâneos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--terminais', type=int, default=8, help='Threads gravando em paralelo')
+        parser.add_argument('--pedidos', type=int, default=200, help='Pedidos por terminal')
+        parser.add_argument('--itens', type=int, default=3, help='Itens por pedido')
+
+    def handle(self, *args, **options):
+        empresa, _ = Empresa.objects.get_or_create(
+            cnpj=CNPJ_CARGA,
+            defaults={'nome': 'Carga', 'endereco': '-', 'telefone': '-'}
+        )
+        produtos = list(Produto.objects.filter(empresa=empresa).values_list('id', flat=True))
+        if not produtos:
+            Produto.objects.bulk_create([
+                Produto(empresa=empresa, nome=f'Produto {n}', preco=10, quantidade_estoque=10 ** 9)
+                for n in range(20)
+            ])
+            produtos = list(Produto.objects.filter(empresa=empresa).values_list('id', flat=True))
+
+        latencias = []
+        erros = []
+        trava = threading.Lock()
+
+        def terminal(numero):
+            try:
+                for n in range(options['pedidos']):
+                    itens = [
+                        {'produto_id': produtos[(numero + n + i) % len(produtos)], 'quantidade': 1}
+                        for i in range(options['itens'])
+                    ]
+                    inicio = time.perf_counter()
+                    try:
+                        criar_pedido_completo(empresa, itens, tipo='balcao', forma_pagamento='pix')
+                    except DatabaseError as erro:
+                        with trava:
+                            erros.append(str(erro))
+                        continue
+                    with trava:
+                        latencias.append((time.perf_counter() - inicio) * 1000)
+            finally:
+                connection.close()
+
+        self.stdout.write(self._descricao_banco())
+        threads = [threading.Thread(target=terminal, args=(n,)) for n in range(options['terminais'])]
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duracao = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(latencias)} pedidos em {duracao:.1f} s: {len(latencias) / duracao:.1f} pedidos/s "
+            f"({options['terminais']} terminais, {options['itens']} itens por pedido)"
+        ))
+        if latencias:
+            latencias.sort()
+            self.stdout.write(
+                f'Latência: mediana {statistics.median(latencias):.1f} ms, '
+                f'p95 {latencias[int(len(latencias) * 0.95) - 1]:.1f} ms, '
+                f'máxima {latencias[-1]:.1f} ms'
+            )
+        if erros:
+            self.stdout.write(self.style.ERROR(f'{len(erros)} pedidos falharam; primeiro erro: {erros[0]}'))
+
+    def _descricao_banco(self):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                modo = cursor.fetchone()[0]
+            return f"SQLite (journal_mode={modo}, transaction_mode={connection.transaction_mode})"
+        configuracao = connection.settings_dict
+        pool = 'pool' in configuracao['OPTIONS']
+        return f"{connection.vendor} ({'pool' if pool else 'CONN_MAX_AGE=%s' % configuracao['CONN_MAX_AGE']})"
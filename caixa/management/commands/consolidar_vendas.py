@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from authentication.models import Empresa
+from caixa.consolidacao import consolidar_periodo
+from caixa.models import Pedido
+
+
+def _data(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Data inválida: {valor} (use AAAA-MM-DD)')
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói os resumos diários de vendas usados pelos relatórios.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresa', type=int, help='ID da empresa (padrão: todas)')
+        parser.add_argument('--inicio', type=_data, help='Primeiro dia, AAAA-MM-DD (padrão: primeiro pedido)')
+        parser.add_argument('--fim', type=_data, help='Último dia, AAAA-MM-DD (padrão: hoje)')
+
+    def handle(self, *args, **options):
+        empresas = Empresa.objects.order_by('id')
+        if options['empresa']:
+            empresas = empresas.filter(id=options['empresa'])
+            if not empresas.exists():
+                raise CommandError(f"Empresa {options['empresa']} não encontrada")
+
+        for empresa in empresas:
+            inicio, fim = options['inicio'], options['fim']
+            if inicio is None or fim is None:
+                limites = Pedido.objects.filter(empresa=empresa).aggregate(
+                    primeiro=Min('criado_em'), ultimo=Max('criado_em')
+                )
+                if limites['primeiro'] is None:
+                    continue
+                inicio = inicio or timezone.localdate(limites['primeiro'])
+                fim = fim or max(timezone.localdate(limites['ultimo']), timezone.localdate())
+
+            consolidar_periodo(empresa.id, inicio, fim)
+            self.stdout.write(self.style.SUCCESS(f'{empresa.nome}: {inicio} a {fim} consolidado'))
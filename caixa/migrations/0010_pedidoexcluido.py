@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('caixa', '0009_comboslot_emoji'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PedidoExcluido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pedido_id', models.IntegerField()),
+                ('numero_pedido', models.CharField(blank=True, max_length=10)),
+                ('excluido_em', models.DateTimeField(auto_now_add=True)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='authentication.empresa')),
+            ],
+            options={
+                'verbose_name': 'Pedido Excluído',
+                'verbose_name_plural': 'Pedidos Excluídos',
+                'indexes': [models.Index(fields=['empresa', 'excluido_em'], name='pedidoexcluido_empresa_data')],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def criar_sequencias(apps, schema_editor):
+    """Inicia a sequência de cada empresa a partir do maior número já emitido"""
+    Empresa = apps.get_model('authentication', 'Empresa')
+    Pedido = apps.get_model('caixa', 'Pedido')
+    SequenciaPedido = apps.get_model('caixa', 'SequenciaPedido')
+
+    for empresa in Empresa.objects.all():
+        numeros = Pedido.objects.filter(empresa=empresa).values_list('numero_pedido', flat=True)
+        ultimo = max((int(n) for n in numeros if n and n.isdigit()), default=0)
+        SequenciaPedido.objects.create(empresa=empresa, ultimo_numero=ultimo)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('caixa', '0010_pedidoexcluido'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenciaPedido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultimo_numero', models.PositiveIntegerField(default=0)),
+                ('data_referencia', models.DateField(blank=True, help_text='Dia do último número (numeração diária)', null=True)),
+            ],
+            options={
+                'verbose_name': 'Sequência de Pedidos',
+                'verbose_name_plural': 'Sequências de Pedidos',
+            },
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='data_numeracao',
+            field=models.DateField(blank=True, editable=False, help_text='Dia da numeração (apenas com numeração diária)', null=True),
+        ),
+        migrations.AlterField(
+            model_name='pedido',
+            name='numero_pedido',
+            field=models.CharField(editable=False, max_length=10),
+        ),
+        migrations.AddConstraint(
+            model_name='pedido',
+            constraint=models.UniqueConstraint(condition=models.Q(('data_numeracao__isnull', True)), fields=('empresa', 'numero_pedido'), name='pedido_numero_unico_empresa'),
+        ),
+        migrations.AddConstraint(
+            model_name='pedido',
+            constraint=models.UniqueConstraint(condition=models.Q(('data_numeracao__isnull', False)), fields=('empresa', 'data_numeracao', 'numero_pedido'), name='pedido_numero_unico_empresa_dia'),
+        ),
+        migrations.AddField(
+            model_name='sequenciapedido',
+            name='empresa',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sequencia_pedido', to='authentication.empresa'),
+        ),
+        migrations.RunPython(criar_sequencias, migrations.RunPython.noop),
+    ]
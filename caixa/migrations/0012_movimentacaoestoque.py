@@ -0,0 +1,38 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('caixa', '0011_sequenciapedido'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimentacaoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('venda', 'Venda'), ('cancelamento', 'Cancelamento'), ('edicao', 'Edição de Pedido'), ('ajuste', 'Ajuste Manual')], max_length=20)),
+                ('quantidade', models.IntegerField()),
+                ('numero_pedido', models.CharField(blank=True, max_length=10)),
+                ('observacao', models.CharField(blank=True, max_length=200)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='authentication.empresa')),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimentacoes_estoque', to='caixa.pedido')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimentacoes', to='caixa.produto')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Movimentação de Estoque',
+                'verbose_name_plural': 'Movimentações de Estoque',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['produto', 'criado_em'], name='movestoque_produto_data')],
+            },
+        ),
+    ]
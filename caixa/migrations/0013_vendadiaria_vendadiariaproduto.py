@@ -0,0 +1,50 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('caixa', '0012_movimentacaoestoque'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('forma_pagamento', models.CharField(blank=True, max_length=20)),
+                ('tipo', models.CharField(max_length=20)),
+                ('total_pedidos', models.PositiveIntegerField(default=0)),
+                ('total_vendas', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_itens', models.PositiveIntegerField(default=0)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='authentication.empresa')),
+            ],
+            options={
+                'verbose_name': 'Venda Diária',
+                'verbose_name_plural': 'Vendas Diárias',
+                'constraints': [models.UniqueConstraint(fields=('empresa', 'data', 'forma_pagamento', 'tipo'), name='vendadiaria_unica')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VendaDiariaProduto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('produto_nome', models.CharField(max_length=200)),
+                ('quantidade', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='authentication.empresa')),
+                ('produto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='caixa.produto')),
+            ],
+            options={
+                'verbose_name': 'Venda Diária por Produto',
+                'verbose_name_plural': 'Vendas Diárias por Produto',
+                'indexes': [models.Index(fields=['empresa', 'data'], name='vendadiariaprod_empresa_data')],
+            },
+        ),
+    ]
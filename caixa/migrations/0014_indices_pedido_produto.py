@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('caixa', '0013_vendadiaria_vendadiariaproduto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['empresa', 'status', 'criado_em'], name='pedido_empresa_status_criado'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['empresa', 'status', 'atualizado_em'], name='pedido_empresa_status_atualiz'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['empresa', 'criado_em'], name='pedido_empresa_criado'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['empresa', 'ativo'], name='produto_empresa_ativo'),
+        ),
+    ]
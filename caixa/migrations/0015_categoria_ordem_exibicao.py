@@ -0,0 +1,42 @@
+# Generated by Django 6.0.2 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+def preencher_ordem_exibicao(apps, schema_editor):
+    """Grava a ordem que o cardápio usava: combos, demais, bebidas e sobremesas"""
+    Categoria = apps.get_model('caixa', 'Categoria')
+
+    categorias = list(Categoria.objects.all())
+    for categoria in categorias:
+        nome = categoria.nome.lower()
+        if categoria.is_sistema:
+            categoria.ordem_exibicao = 0
+        elif 'sobremesa' in nome:
+            categoria.ordem_exibicao = 30
+        elif 'bebida' in nome:
+            categoria.ordem_exibicao = 20
+        else:
+            categoria.ordem_exibicao = 10
+    Categoria.objects.bulk_update(categorias, ['ordem_exibicao'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caixa', '0014_indices_pedido_produto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='ordem_exibicao',
+            field=models.PositiveSmallIntegerField(blank=True, default=10, help_text='Posição no cardápio (menor aparece antes). Vazio: definida pelo nome'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(preencher_ordem_exibicao, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='categoria',
+            index=models.Index(fields=['empresa', 'ordem_exibicao', 'nome'], name='categoria_empresa_ordem'),
+        ),
+    ]
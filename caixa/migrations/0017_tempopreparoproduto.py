@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('caixa', '0016_transicaostatuspedido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TempoPreparoProduto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amostras', models.PositiveIntegerField(default=0)),
+                ('media_segundos', models.FloatField(default=0)),
+                ('histograma', models.JSONField(default=list)),
+                ('atualizado_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='authentication.empresa')),
+                ('produto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='tempo_medido', to='caixa.produto')),
+            ],
+            options={
+                'verbose_name': 'Tempo de Preparo Medido',
+                'verbose_name_plural': 'Tempos de Preparo Medidos',
+            },
+        ),
+    ]
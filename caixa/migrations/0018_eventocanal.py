@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-18 18:09
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caixa', '0017_tempopreparoproduto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoCanal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('canal', models.CharField(max_length=100)),
+                ('tipo', models.CharField(max_length=30)),
+                ('dados', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Evento de Canal',
+                'verbose_name_plural': 'Eventos de Canal',
+                'indexes': [models.Index(fields=['canal', 'id'], name='eventocanal_canal_id'), models.Index(fields=['criado_em'], name='eventocanal_criado_em')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_empresa_token_painel'),
+        ('caixa', '0018_eventocanal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vendadiariaproduto',
+            name='forma_pagamento',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='vendadiariaproduto',
+            name='tipo',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddConstraint(
+            model_name='vendadiariaproduto',
+            constraint=models.UniqueConstraint(fields=('empresa', 'data', 'forma_pagamento', 'tipo', 'produto'), name='vendadiariaproduto_unica'),
+        ),
+    ]
@@ -1,7 +1,31 @@
-from django.db import models
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction, IntegrityError
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
 from authentication.models import Empresa, Usuario
 import uuid
 
+# Posição das categorias no cardápio (menor aparece antes). Os intervalos
+# deixam espaço para encaixar categorias entre os grupos padrão
+ORDEM_COMBOS = 0
+ORDEM_PADRAO = 10
+ORDEM_BEBIDAS = 20
+ORDEM_SOBREMESAS = 30
+
+
+def ordem_exibicao_padrao(nome, is_sistema=False):
+    """Posição inicial de uma categoria: combos, demais, bebidas e sobremesas."""
+    nome = nome.lower()
+    if is_sistema:
+        return ORDEM_COMBOS
+    if 'sobremesa' in nome:
+        return ORDEM_SOBREMESAS
+    if 'bebida' in nome:
+        return ORDEM_BEBIDAS
+    return ORDEM_PADRAO
+
+
 class Categoria(models.Model):
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
     nome = models.CharField(max_length=100)
@@ -9,14 +33,26 @@ class Categoria(models.Model):
     descricao = models.TextField(blank=True)
     ativo = models.BooleanField(default=True)
     is_sistema = models.BooleanField(default=False, help_text='Categoria do sistema, não pode ser editada ou excluída')
+    ordem_exibicao = models.PositiveSmallIntegerField(
+        blank=True,
+        help_text='Posição no cardápio (menor aparece antes). Vazio: definida pelo nome'
+    )
 
     class Meta:
         verbose_name = 'Categoria'
         verbose_name_plural = 'Categorias'
+        indexes = [
+            models.Index(fields=['empresa', 'ordem_exibicao', 'nome'], name='categoria_empresa_ordem'),
+        ]
 
     def __str__(self):
         return self.nome
 
+    def save(self, *args, **kwargs):
+        if self.ordem_exibicao is None:
+            self.ordem_exibicao = ordem_exibicao_padrao(self.nome, self.is_sistema)
+        super().save(*args, **kwargs)
+
 
 class Produto(models.Model):
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
@@ -32,6 +68,10 @@ class Produto(models.Model):
     class Meta:
         verbose_name = 'Produto'
         verbose_name_plural = 'Produtos'
+        indexes = [
+            # Cardápios e catálogo: produtos ativos da empresa
+            models.Index(fields=['empresa', 'ativo'], name='produto_empresa_ativo'),
+        ]
 
     def __str__(self):
         return self.nome
@@ -75,7 +115,8 @@ class Pedido(models.Model):
     ]
 
     empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
-    numero_pedido = models.CharField(max_length=10, unique=True, editable=False)
+    numero_pedido = models.CharField(max_length=10, editable=False)
+    data_numeracao = models.DateField(null=True, blank=True, editable=False, help_text='Dia da numeração (apenas com numeração diária)')
     qr_code = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     tipo = models.CharField(max_length=20, choices=TIPO_PEDIDO, default='balcao')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
@@ -93,21 +134,111 @@ class Pedido(models.Model):
         verbose_name = 'Pedido'
         verbose_name_plural = 'Pedidos'
         ordering = ['-criado_em']
+        indexes = [
+            # Pedidos ativos por status em ordem de chegada (caixa, cozinha, painel)
+            models.Index(fields=['empresa', 'status', 'criado_em'], name='pedido_empresa_status_criado'),
+            # Entregues/cancelados do dia e alterações desde o cursor de sincronização
+            models.Index(fields=['empresa', 'status', 'atualizado_em'], name='pedido_empresa_status_atualiz'),
+            # Relatórios e histórico por período
+            models.Index(fields=['empresa', 'criado_em'], name='pedido_empresa_criado'),
+        ]
+        constraints = [
+            # Numeração por empresa (sequencial) ou por empresa e dia (numeração diária)
+            models.UniqueConstraint(
+                fields=['empresa', 'numero_pedido'],
+                condition=models.Q(data_numeracao__isnull=True),
+                name='pedido_numero_unico_empresa'
+            ),
+            models.UniqueConstraint(
+                fields=['empresa', 'data_numeracao', 'numero_pedido'],
+                condition=models.Q(data_numeracao__isnull=False),
+                name='pedido_numero_unico_empresa_dia'
+            ),
+        ]
 
     def __str__(self):
         return f"Pedido #{self.numero_pedido}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        pedido = super().from_db(db, field_names, values)
+        # Permite ao sinal de gravação saber se os resumos de vendas mudam
+        pedido._vendas_gravadas = pedido.dados_vendas()
+        return pedido
+
+    # Campos de ``dados_vendas``, na mesma ordem
+    CAMPOS_VENDAS = ('status', 'tipo', 'forma_pagamento', 'total')
+
+    def dados_vendas(self):
+        """
+        O que do pedido entra nos resumos de vendas (``caixa/consolidacao.py``),
+        ou None se algum desses campos não foi carregado.
+        """
+        if self.get_deferred_fields() & set(self.CAMPOS_VENDAS):
+            return None
+        return (self.status == 'cancelado', self.tipo, self.forma_pagamento, self.total)
+
     def save(self, *args, **kwargs):
         if not self.numero_pedido:
-            ultimo = Pedido.objects.filter(empresa=self.empresa).order_by('-id').first()
-            if ultimo and ultimo.numero_pedido:
-                numero = int(ultimo.numero_pedido) + 1
-            else:
-                numero = 1
+            numero, self.data_numeracao = SequenciaPedido.proximo_numero(self.empresa_id)
             self.numero_pedido = str(numero).zfill(4)
         super().save(*args, **kwargs)
 
 
+class SequenciaPedido(models.Model):
+    """
+    Último número de pedido emitido por empresa.
+    O incremento é um único UPDATE na linha da empresa, que fica travada até
+    o fim da transação: pedidos simultâneos (caixa, autoatendimento) recebem
+    números distintos sem consultar o último pedido.
+    """
+    empresa = models.OneToOneField(Empresa, on_delete=models.CASCADE, related_name='sequencia_pedido')
+    ultimo_numero = models.PositiveIntegerField(default=0)
+    data_referencia = models.DateField(null=True, blank=True, help_text='Dia do último número (numeração diária)')
+
+    class Meta:
+        verbose_name = 'Sequência de Pedidos'
+        verbose_name_plural = 'Sequências de Pedidos'
+
+    def __str__(self):
+        return f"{self.empresa} - {self.ultimo_numero}"
+
+    @classmethod
+    def proximo_numero(cls, empresa_id):
+        """
+        Reserva o próximo número da empresa.
+        Retorna ``(numero, data_numeracao)``; ``data_numeracao`` é o dia do
+        número com ``CANTINA_NUMERACAO_DIARIA`` ativo e None caso contrário.
+        """
+        diaria = getattr(settings, 'CANTINA_NUMERACAO_DIARIA', False)
+        hoje = timezone.localdate() if diaria else None
+
+        if diaria:
+            # Primeiro pedido do dia volta para 1
+            atualizacao = {
+                'ultimo_numero': Case(
+                    When(data_referencia=hoje, then=F('ultimo_numero') + 1),
+                    default=Value(1)
+                ),
+                'data_referencia': hoje,
+            }
+        else:
+            atualizacao = {'ultimo_numero': F('ultimo_numero') + 1}
+
+        with transaction.atomic():
+            if not cls.objects.filter(empresa_id=empresa_id).update(**atualizacao):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(empresa_id=empresa_id, ultimo_numero=1, data_referencia=hoje)
+                    return 1, hoje
+                except IntegrityError:
+                    # Outro pedido criou a sequência ao mesmo tempo
+                    cls.objects.filter(empresa_id=empresa_id).update(**atualizacao)
+            numero = cls.objects.filter(empresa_id=empresa_id).values_list('ultimo_numero', flat=True).get()
+
+        return numero, hoje
+
+
 class ItemPedido(models.Model):
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='itens')
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
@@ -123,6 +254,22 @@ class ItemPedido(models.Model):
     def __str__(self):
         return f"{self.quantidade}x {self.produto.nome}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        item = super().from_db(db, field_names, values)
+        # Permite descontar dos resumos de vendas o que o item somava
+        item._venda_gravada = item.dados_venda()
+        return item
+
+    def dados_venda(self):
+        """
+        O que do item entra nos resumos de vendas (``caixa/consolidacao.py``),
+        ou None se algum desses campos não foi carregado.
+        """
+        if self.get_deferred_fields() & {'produto_id', 'quantidade', 'preco_unitario'}:
+            return None
+        return (self.produto_id, self.quantidade, self.preco_unitario)
+
     def save(self, *args, **kwargs):
         self.subtotal = self.quantidade * self.preco_unitario
         super().save(*args, **kwargs)
@@ -234,3 +381,196 @@ class PedidoComboEscolha(models.Model):
     
     def __str__(self):
         return f"{self.slot.nome}: {self.produto_escolhido.nome}"
+
+
+class PedidoExcluido(models.Model):
+    """
+    Registro (tombstone) de pedidos excluídos.
+    Permite que as APIs incrementais (parâmetro ``since``) informem aos
+    terminais quais pedidos sumiram desde a última consulta.
+    """
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
+    pedido_id = models.IntegerField()
+    numero_pedido = models.CharField(max_length=10, blank=True)
+    excluido_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Pedido Excluído'
+        verbose_name_plural = 'Pedidos Excluídos'
+        indexes = [
+            models.Index(fields=['empresa', 'excluido_em'], name='pedidoexcluido_empresa_data'),
+        ]
+
+    def __str__(self):
+        return f"Pedido #{self.numero_pedido} (excluído)"
+
+
+class EventoCanal(models.Model):
+    """
+    Evento publicado em um canal de tempo real (ver ``caixa/eventos.py``).
+    Fica no banco para que todos os processos (gunicorn e uvicorn) leiam os
+    mesmos eventos; o ID serve de Last-Event-ID para as reconexões.
+    """
+    canal = models.CharField(max_length=100)
+    tipo = models.CharField(max_length=30)
+    dados = models.JSONField(encoder=DjangoJSONEncoder)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Evento de Canal'
+        verbose_name_plural = 'Eventos de Canal'
+        indexes = [
+            models.Index(fields=['canal', 'id'], name='eventocanal_canal_id'),
+            models.Index(fields=['criado_em'], name='eventocanal_criado_em'),
+        ]
+
+    def __str__(self):
+        return f"{self.canal} #{self.id} ({self.tipo})"
+
+
+class MovimentacaoEstoque(models.Model):
+    """
+    Registro imutável de cada entrada e saída de estoque.
+    ``quantidade`` é negativa nas saídas (vendas) e positiva nas devoluções.
+    """
+    TIPO_CHOICES = [
+        ('venda', 'Venda'),
+        ('cancelamento', 'Cancelamento'),
+        ('edicao', 'Edição de Pedido'),
+        ('ajuste', 'Ajuste Manual'),
+    ]
+
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='movimentacoes')
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    quantidade = models.IntegerField()
+    pedido = models.ForeignKey(Pedido, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimentacoes_estoque')
+    numero_pedido = models.CharField(max_length=10, blank=True)
+    usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
+    observacao = models.CharField(max_length=200, blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Movimentação de Estoque'
+        verbose_name_plural = 'Movimentações de Estoque'
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['produto', 'criado_em'], name='movestoque_produto_data'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()}: {self.quantidade:+d} {self.produto.nome}"
+
+
+# ========== HISTÓRICO DE STATUS ==========
+
+class TransicaoStatusPedido(models.Model):
+    """
+    Registro imutável de cada mudança de status de um pedido, gravado por
+    ``caixa.pedidos.alterar_status``. ``duracao`` é o tempo que o pedido
+    ficou em ``status_anterior`` (espera, preparo, retirada) e
+    ``desde_criacao`` o tempo desde a criação do pedido até a mudança.
+    """
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
+    pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='transicoes')
+    status_anterior = models.CharField(max_length=20, choices=Pedido.STATUS_CHOICES)
+    status_novo = models.CharField(max_length=20, choices=Pedido.STATUS_CHOICES)
+    usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
+    duracao = models.DurationField()
+    desde_criacao = models.DurationField()
+    criado_em = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        verbose_name = 'Transição de Status'
+        verbose_name_plural = 'Transições de Status'
+        ordering = ['criado_em']
+        indexes = [
+            # Tempos médios por etapa em um período (estatísticas do dia)
+            models.Index(fields=['empresa', 'status_anterior', 'criado_em'], name='transicao_empresa_etapa_data'),
+        ]
+
+    def __str__(self):
+        return f"Pedido #{self.pedido_id}: {self.status_anterior} → {self.status_novo}"
+
+
+class TempoPreparoProduto(models.Model):
+    """
+    Tempo real de preparo de um produto, aprendido das transições
+    preparando → pronto dos pedidos que o contêm (ver
+    ``caixa/tempos_preparo.py``). ``media_segundos`` é uma média móvel
+    exponencial e ``histograma`` conta as amostras (com decaimento) em faixas
+    fixas de duração, de onde saem os percentis.
+    """
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
+    produto = models.OneToOneField(Produto, on_delete=models.CASCADE, related_name='tempo_medido')
+    amostras = models.PositiveIntegerField(default=0)
+    media_segundos = models.FloatField(default=0)
+    histograma = models.JSONField(default=list)
+    atualizado_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Tempo de Preparo Medido'
+        verbose_name_plural = 'Tempos de Preparo Medidos'
+
+    def __str__(self):
+        return f"{self.produto.nome}: {self.media_segundos / 60:.1f} min ({self.amostras} amostras)"
+
+
+# ========== RESUMOS DIÁRIOS DE VENDAS ==========
+
+class VendaDiaria(models.Model):
+    """
+    Vendas consolidadas por empresa, dia, forma de pagamento e tipo de pedido
+    (pedidos cancelados não entram). Mantido por ``caixa/consolidacao.py``.
+    """
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
+    data = models.DateField()
+    forma_pagamento = models.CharField(max_length=20, blank=True)
+    tipo = models.CharField(max_length=20)
+    total_pedidos = models.PositiveIntegerField(default=0)
+    total_vendas = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_itens = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Venda Diária'
+        verbose_name_plural = 'Vendas Diárias'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['empresa', 'data', 'forma_pagamento', 'tipo'],
+                name='vendadiaria_unica'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.data} - {self.total_pedidos} pedidos"
+
+
+class VendaDiariaProduto(models.Model):
+    """
+    Quantidade e valor vendidos de cada produto por empresa, dia, forma de
+    pagamento e tipo de pedido (pedidos cancelados não entram).
+    """
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE)
+    data = models.DateField()
+    forma_pagamento = models.CharField(max_length=20, blank=True)
+    tipo = models.CharField(max_length=20, blank=True)
+    produto = models.ForeignKey(Produto, on_delete=models.SET_NULL, null=True, blank=True)
+    produto_nome = models.CharField(max_length=200)
+    quantidade = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Venda Diária por Produto'
+        verbose_name_plural = 'Vendas Diárias por Produto'
+        indexes = [
+            models.Index(fields=['empresa', 'data'], name='vendadiariaprod_empresa_data'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['empresa', 'data', 'forma_pagamento', 'tipo', 'produto'],
+                name='vendadiariaproduto_unica'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.data} - {self.produto_nome}: {self.quantidade}"
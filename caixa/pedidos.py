@@ -0,0 +1,294 @@
+"""
+Criação e edição de pedidos.
+
+Todo o pedido (cabeçalho, itens, escolhas de combo e baixa de estoque) é
+gravado em uma única transação com um número fixo de consultas, seja qual
+for a quantidade de itens: os produtos e slots referenciados são lidos de
+uma vez, os itens e escolhas entram por ``bulk_create`` e o estoque é
+abatido por um único UPDATE (ver ``caixa/estoque.py``).
+
+Mudanças de status passam por ``alterar_status``, que registra cada
+transição com o tempo gasto no status anterior (``TransicaoStatusPedido``)
+e, ao fim do preparo, alimenta os tempos aprendidos (``caixa/tempos_preparo.py``).
+"""
+from collections import Counter
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .consolidacao import registrar_itens_gravados
+from .estoque import movimentar_estoque
+from .tempos_preparo import agendar_aprendizado
+from .models import Pedido, ItemPedido, Produto, Combo, ComboSlot, PedidoComboEscolha, TransicaoStatusPedido
+
+
+class PedidoInvalido(Exception):
+    """Dados do pedido recusados; a mensagem é exibida ao operador."""
+
+
+def chave(valor):
+    """IDs chegam do JSON como int ou str; ``in_bulk`` indexa por int."""
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def ler_quantidade(valor):
+    """Quantidade de um item do payload: inteiro positivo ou ``PedidoInvalido``."""
+    try:
+        quantidade = int(valor)
+    except (TypeError, ValueError):
+        raise PedidoInvalido('Quantidade inválida')
+    if quantidade < 1:
+        raise PedidoInvalido('Quantidade inválida')
+    return quantidade
+
+
+def _montar_itens(empresa, itens):
+    """
+    Valida os itens do payload e monta (sem gravar) os ``ItemPedido`` e as
+    escolhas de combo. Retorna ``(itens_pedido, escolhas_por_item, abates)``,
+    onde ``abates`` é o consumo de estoque por produto.
+    """
+    produto_ids = set()
+    slot_ids = set()
+    for item in itens:
+        produto_ids.add(chave(item['produto_id']))
+        if item.get('is_combo'):
+            for escolha in item.get('escolhas') or []:
+                produto_ids.add(chave(escolha['produto_id']))
+                slot_ids.add(chave(escolha['slot_id']))
+    produto_ids.discard(None)
+    slot_ids.discard(None)
+
+    produtos = Produto.objects.filter(empresa=empresa).in_bulk(produto_ids) if produto_ids else {}
+    slots = ComboSlot.objects.filter(combo__produto__empresa=empresa).in_bulk(slot_ids) if slot_ids else {}
+
+    itens_pedido = []
+    escolhas_por_item = []
+    abates = Counter()
+
+    for item in itens:
+        produto = produtos.get(chave(item['produto_id']))
+        if produto is None:
+            raise PedidoInvalido(
+                f'Produto com ID {item["produto_id"]} não encontrado. Por favor, atualize a página.'
+            )
+
+        quantidade = ler_quantidade(item['quantidade'])
+        itens_pedido.append(ItemPedido(
+            produto=produto,
+            quantidade=quantidade,
+            preco_unitario=produto.preco,
+            subtotal=quantidade * produto.preco,
+            observacoes=item.get('observacoes', '')
+        ))
+
+        escolhas = []
+        if item.get('is_combo') and item.get('escolhas'):
+            # Combo: o estoque abatido é o dos produtos escolhidos
+            for escolha in item['escolhas']:
+                slot = slots.get(chave(escolha['slot_id']))
+                produto_escolhido = produtos.get(chave(escolha['produto_id']))
+                if slot is None or produto_escolhido is None:
+                    raise PedidoInvalido(
+                        f'Item do combo não encontrado (Slot ID: {escolha.get("slot_id")}, '
+                        f'Produto ID: {escolha.get("produto_id")}). Por favor, atualize a página.'
+                    )
+
+                quantidade_abate = escolha.get('quantidade_abate', 1)
+                escolhas.append(PedidoComboEscolha(
+                    slot=slot,
+                    produto_escolhido=produto_escolhido,
+                    quantidade_abatida=quantidade_abate
+                ))
+                abates[produto_escolhido.id] += int(Decimal(str(quantidade_abate))) * quantidade
+        else:
+            abates[produto.id] += quantidade
+
+        escolhas_por_item.append(escolhas)
+
+    return itens_pedido, escolhas_por_item, abates
+
+
+def _gravar_itens(pedido, itens_pedido, escolhas_por_item):
+    for item_pedido in itens_pedido:
+        item_pedido.pedido = pedido
+    ItemPedido.objects.bulk_create(itens_pedido)
+    # bulk_create não dispara os sinais: os resumos de vendas recebem os itens aqui
+    registrar_itens_gravados(pedido, itens_pedido)
+
+    escolhas_combo = []
+    for item_pedido, escolhas in zip(itens_pedido, escolhas_por_item):
+        for escolha in escolhas:
+            escolha.item_pedido = item_pedido
+            escolhas_combo.append(escolha)
+    if escolhas_combo:
+        PedidoComboEscolha.objects.bulk_create(escolhas_combo)
+
+
+def criar_pedido_completo(empresa, itens, **dados_pedido):
+    """
+    Cria o pedido com seus itens e escolhas de combo e abate o estoque.
+
+    ``itens`` segue o formato enviado pelo caixa: ``produto_id``,
+    ``quantidade``, ``observacoes`` e, para combos, ``is_combo`` e
+    ``escolhas`` (``slot_id``, ``produto_id``, ``quantidade_abate``).
+    Lança ``PedidoInvalido`` sem gravar nada se algum produto ou slot não
+    existir na empresa, e ``EstoqueInsuficiente`` se faltar saldo.
+    """
+    if not itens:
+        raise PedidoInvalido('O pedido deve conter pelo menos um item')
+
+    itens_pedido, escolhas_por_item, abates = _montar_itens(empresa, itens)
+    total = sum((item.subtotal for item in itens_pedido), Decimal('0.00'))
+
+    with transaction.atomic():
+        pedido = Pedido.objects.create(empresa=empresa, total=total, **dados_pedido)
+        _gravar_itens(pedido, itens_pedido, escolhas_por_item)
+        movimentar_estoque(
+            empresa, {produto_id: -qtd for produto_id, qtd in abates.items()}, 'venda',
+            pedido=pedido, usuario=dados_pedido.get('operador')
+        )
+
+    return pedido
+
+
+def _consumo_unitario(item):
+    """Estoque consumido por uma unidade do item gravado."""
+    escolhas = item.escolhas_combo.all()
+    if escolhas:
+        consumo = Counter()
+        for escolha in escolhas:
+            consumo[escolha.produto_escolhido_id] += int(Decimal(escolha.quantidade_abatida))
+        return consumo
+    return Counter({item.produto_id: 1})
+
+
+def editar_itens_pedido(pedido, itens, usuario=None):
+    """
+    Aplica a nova lista de itens ao pedido alterando só o que mudou.
+
+    Itens com ``id`` de um item existente têm quantidade e observações
+    atualizadas (preço e escolhas de combo são mantidos) e não podem trocar
+    de produto; itens sem ``id`` são incluídos e os existentes ausentes da
+    lista são removidos. O estoque
+    recebe apenas a diferença. Grava também os demais campos já alterados
+    em ``pedido``.
+
+    Combos não podem ser incluídos na edição: sem as escolhas de cada slot o
+    estoque sairia do próprio produto do combo.
+    """
+    if not itens:
+        raise PedidoInvalido('O pedido deve conter pelo menos um item')
+
+    existentes = {item.id: item for item in pedido.itens.prefetch_related('escolhas_combo')}
+
+    alterados = []
+    novos = []
+    mantidos = set()
+    delta_estoque = Counter()
+
+    for item in itens:
+        item_id = chave(item.get('id'))
+        atual = existentes.get(item_id)
+        if atual is None or item_id in mantidos:
+            novos.append(item)
+            continue
+
+        if 'produto_id' in item and chave(item['produto_id']) != atual.produto_id:
+            raise PedidoInvalido(
+                f'O item {item_id} é de outro produto ({atual.produto.nome}). '
+                'Remova o item e inclua o novo produto.'
+            )
+        mantidos.add(item_id)
+        quantidade = ler_quantidade(item['quantidade'])
+        observacoes = item.get('observacoes', '')
+        if quantidade == atual.quantidade and observacoes == atual.observacoes:
+            continue
+
+        if quantidade != atual.quantidade:
+            for produto_id, qtd in _consumo_unitario(atual).items():
+                delta_estoque[produto_id] += qtd * (atual.quantidade - quantidade)
+
+        atual.quantidade = quantidade
+        atual.observacoes = observacoes
+        atual.subtotal = quantidade * atual.preco_unitario
+        alterados.append(atual)
+
+    removidos = [item for item_id, item in existentes.items() if item_id not in mantidos]
+    for item in removidos:
+        for produto_id, qtd in _consumo_unitario(item).items():
+            delta_estoque[produto_id] += qtd * item.quantidade
+
+    if novos:
+        combos = list(Combo.objects.filter(
+            produto__empresa_id=pedido.empresa_id,
+            produto_id__in={chave(item['produto_id']) for item in novos}
+        ).values_list('produto__nome', flat=True))
+        if combos:
+            raise PedidoInvalido(
+                f'Combos não podem ser incluídos na edição do pedido ({", ".join(combos)}). '
+                'Faça um novo pedido para o combo.'
+            )
+
+    itens_novos, escolhas_por_item, abates = _montar_itens(pedido.empresa_id, novos) if novos else ([], [], Counter())
+    for produto_id, qtd in abates.items():
+        delta_estoque[produto_id] -= qtd
+
+    pedido.total = sum(
+        (item.subtotal for item_id, item in existentes.items() if item_id in mantidos),
+        Decimal('0.00')
+    ) + sum((item.subtotal for item in itens_novos), Decimal('0.00'))
+
+    with transaction.atomic():
+        if alterados:
+            ItemPedido.objects.bulk_update(alterados, ['quantidade', 'observacoes', 'subtotal'])
+            registrar_itens_gravados(pedido, alterados)
+        if removidos:
+            ItemPedido.objects.filter(id__in=[item.id for item in removidos]).delete()
+        if itens_novos:
+            _gravar_itens(pedido, itens_novos, escolhas_por_item)
+
+        pedido.save()
+
+        movimentar_estoque(pedido.empresa_id, delta_estoque, 'edicao', pedido=pedido, usuario=usuario)
+
+    return pedido
+
+
+def alterar_status(pedido, novo_status, usuario=None):
+    """
+    Muda o status do pedido e registra a transição, com o tempo que o pedido
+    ficou no status anterior e desde a criação. Lança ``PedidoInvalido`` para
+    status desconhecido; retorna False (sem gravar) se o status já era esse.
+    """
+    if novo_status not in dict(Pedido.STATUS_CHOICES):
+        raise PedidoInvalido('Status inválido')
+
+    with transaction.atomic():
+        # Trava o pedido: duas mudanças simultâneas não registram o mesmo status anterior
+        status_anterior = Pedido.objects.select_for_update().values_list('status', flat=True).get(pk=pedido.pk)
+        if status_anterior == novo_status:
+            pedido.status = novo_status
+            return False
+
+        agora = timezone.now()
+        ultima_transicao = pedido.transicoes.order_by('-criado_em').values_list('criado_em', flat=True).first()
+        pedido.status = novo_status
+        # Só o status: a instância pode estar desatualizada nos demais campos
+        pedido.save(update_fields=['status', 'atualizado_em'])
+        transicao = TransicaoStatusPedido.objects.create(
+            empresa_id=pedido.empresa_id,
+            pedido=pedido,
+            status_anterior=status_anterior,
+            status_novo=novo_status,
+            usuario=usuario,
+            duracao=agora - (ultima_transicao or pedido.criado_em),
+            desde_criacao=agora - pedido.criado_em,
+            criado_em=agora
+        )
+        agendar_aprendizado(transicao)
+    return True
@@ -0,0 +1,103 @@
+"""
+Pedidos ativos (pendente, preparando, pronto) prontos para os terminais.
+
+O snapshot serializado e as estatísticas de cada empresa são montados uma
+vez por versão dos pedidos e compartilhados via cache entre todos os
+terminais (caixa, cozinha, painel) que consultam as APIs.
+"""
+from django.db.models import Prefetch
+
+from .estatisticas import calcular_estatisticas_pedidos
+from .models import Pedido, ItemPedido, PedidoComboEscolha
+from .sincronizacao import STATUS_ATIVOS, obter_ou_construir
+
+
+def com_itens_serializaveis(pedidos):
+    """
+    Carrega junto com ``pedidos`` tudo o que ``serializar_pedido_ativo`` usa:
+    itens com produto e combo (JOIN) e escolhas com o produto escolhido.
+    São sempre três consultas, qualquer que seja a quantidade de pedidos.
+    """
+    escolhas = PedidoComboEscolha.objects.select_related('produto_escolhido')
+    itens = ItemPedido.objects.select_related('produto__combo').prefetch_related(
+        Prefetch('escolhas_combo', queryset=escolhas)
+    )
+    return pedidos.prefetch_related(Prefetch('itens', queryset=itens))
+
+
+def consultar_pedidos_ativos(empresa):
+    return com_itens_serializaveis(Pedido.objects.filter(
+        empresa=empresa,
+        status__in=STATUS_ATIVOS
+    ).order_by('criado_em'))
+
+
+def serializar_pedido_ativo(pedido):
+    """
+    Monta o JSON de um pedido ativo (usado pelas APIs e pelo canal de eventos).
+    Espera o pedido carregado por ``com_itens_serializaveis``.
+    """
+    # Itens do pedido (já carregados por com_itens_serializaveis)
+    itens_data = []
+    total_itens = 0
+    for item in pedido.itens.all():
+        is_combo = item.produto.is_combo()
+        item_dict = {
+            'quantidade': item.quantidade,
+            'produto_nome': item.produto.nome,
+            'preco_unitario': str(item.preco_unitario),
+            'subtotal': str(item.subtotal),
+            'observacoes': item.observacoes or '',
+            'is_combo': is_combo
+        }
+
+        # Se for combo, adicionar escolhas
+        if is_combo:
+            item_dict['escolhas'] = [
+                {'produto_nome': escolha.produto_escolhido.nome}
+                for escolha in item.escolhas_combo.all()
+            ]
+
+        itens_data.append(item_dict)
+        total_itens += item.quantidade
+
+    return {
+        'id': pedido.id,
+        'numero_pedido': pedido.numero_pedido,
+        'qr_code': str(pedido.qr_code),
+        'cliente_nome': pedido.cliente_nome or 'Cliente',
+        'tipo': pedido.tipo,
+        'tipo_display': pedido.get_tipo_display(),
+        'mesa': pedido.mesa,
+        'status': pedido.status,
+        'status_display': pedido.get_status_display(),
+        'forma_pagamento': pedido.get_forma_pagamento_display() if pedido.forma_pagamento else 'Não informado',
+        'total': str(pedido.total),
+        'total_itens': total_itens,
+        'criado_em': pedido.criado_em.isoformat(),
+        'itens': itens_data
+    }
+
+
+def obter_snapshot_pedidos(empresa_id):
+    """
+    Snapshot ``{'pedidos', 'estatisticas'}`` da empresa, reconstruído apenas
+    quando a versão dos pedidos muda. Só traz horários absolutos
+    (``criado_em``): a resposta é validada pela versão, então um valor
+    relativo ao momento ficaria parado em quem recebe 304.
+    """
+    def _montar():
+        return {
+            'pedidos': [serializar_pedido_ativo(p) for p in consultar_pedidos_ativos(empresa_id)],
+            'estatisticas': obter_estatisticas_pedidos(empresa_id),
+        }
+
+    return obter_ou_construir(empresa_id, 'snapshot', _montar)
+
+
+def obter_estatisticas_pedidos(empresa_id):
+    """Estatísticas da empresa, recalculadas apenas quando os pedidos mudam."""
+    return obter_ou_construir(
+        empresa_id, 'estatisticas',
+        lambda: calcular_estatisticas_pedidos(empresa_id)
+    )
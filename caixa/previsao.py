@@ -0,0 +1,209 @@
+"""
+Previsão de quando cada pedido da fila da cozinha fica pronto.
+
+O preparo de um pedido vem do tempo de cada produto (nos combos, dos
+produtos escolhidos), aprendido pela cozinha (``caixa/tempos_preparo.py``)
+ou, sem amostras suficientes, o ``tempo_preparo`` cadastrado: o item mais
+demorado ou, se for maior, a soma dos itens dividida entre as estações da
+cozinha. A fila (quem já está
+em preparo, depois os pendentes em ordem de chegada) é distribuída entre as
+estações em uso, estimadas pela vazão recente da cozinha (pedidos que
+ficaram prontos na última hora, pelo histórico de status).
+
+O que vem do banco (a fila, o preparo de cada pedido, o início dos que
+estão em preparo e as estações) é lido uma vez por versão dos pedidos (toda
+mudança de status troca a versão) e fica no cache. A distribuição na fila,
+que depende da hora atual, é refeita a cada ``INTERVALO_PREVISAO`` a partir
+desse cache, sem consultas: numa cozinha parada a previsão dos pendentes
+avança com o relógio em vez de ficar no passado. As respostas trazem só os
+horários absolutos e o ETag delas inclui o intervalo (``etag_previsao``).
+"""
+import heapq
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Avg, Count, Max
+from django.utils import timezone
+
+from .models import ItemPedido, Pedido, TransicaoStatusPedido
+from .sincronizacao import etag_pedidos, gerar_cursor, obter_ou_construir, ultima_modificacao_pedidos
+from .tempos_preparo import segundos_estimados
+
+STATUS_FILA = ['pendente', 'preparando']
+
+# Período usado para medir a vazão da cozinha
+JANELA_VAZAO = timedelta(hours=1)
+
+# A fila é redistribuída com a hora atual a cada intervalo (segundos)
+INTERVALO_PREVISAO = 60
+
+
+def estacoes_cozinha():
+    """Pedidos que a cozinha prepara ao mesmo tempo quando não há histórico recente."""
+    return getattr(settings, 'CANTINA_ESTACOES_COZINHA', 2)
+
+
+def _minutos_preparo(pedido_ids, estacoes):
+    """Minutos de preparo de cada pedido, em uma consulta (tempos aprendidos quando houver)."""
+    maior = {}
+    soma = {}
+    linhas = ItemPedido.objects.filter(pedido_id__in=pedido_ids).values_list(
+        'pedido_id', 'quantidade',
+        'produto__tempo_preparo', 'produto__tempo_medido__media_segundos', 'produto__tempo_medido__amostras',
+        'escolhas_combo__produto_escolhido__tempo_preparo',
+        'escolhas_combo__produto_escolhido__tempo_medido__media_segundos',
+        'escolhas_combo__produto_escolhido__tempo_medido__amostras'
+    )
+    for pedido_id, quantidade, *tempo_produto, tempo_escolha, media_escolha, amostras_escolha in linhas:
+        if tempo_escolha is not None:
+            tempo = segundos_estimados(tempo_escolha, media_escolha, amostras_escolha) / 60
+        else:
+            tempo = segundos_estimados(*tempo_produto) / 60
+        maior[pedido_id] = max(maior.get(pedido_id, 0), tempo)
+        soma[pedido_id] = soma.get(pedido_id, 0) + tempo * quantidade
+    return {pedido_id: max(maior[pedido_id], soma[pedido_id] / estacoes) for pedido_id in maior}
+
+
+def _montar_base(empresa_id):
+    """
+    Dados da fila lidos do banco: ``fila`` (``(id, status, inicio)`` em ordem
+    de chegada; ``inicio`` só para quem está em preparo), ``minutos`` de
+    preparo de cada pedido, ``estacoes`` e ``prontos_ultima_hora``.
+    """
+    fila = list(
+        Pedido.objects.filter(empresa_id=empresa_id, status__in=STATUS_FILA)
+        .order_by('criado_em').values_list('id', 'status', 'atualizado_em')
+    )
+    em_preparo = [pedido_id for pedido_id, status, _ in fila if status == 'preparando']
+
+    vazao = TransicaoStatusPedido.objects.filter(
+        empresa_id=empresa_id,
+        status_anterior='preparando',
+        status_novo='pronto',
+        criado_em__gte=timezone.now() - JANELA_VAZAO
+    ).aggregate(prontos=Count('id'), preparo_medio=Avg('duracao'))
+
+    # Lei de Little: pedidos em preparo ao mesmo tempo = vazão x tempo de preparo
+    em_uso = 0
+    if vazao['prontos'] and vazao['preparo_medio']:
+        em_uso = math.ceil(vazao['prontos'] * (vazao['preparo_medio'] / JANELA_VAZAO))
+
+    minutos = {}
+    inicios = {}
+    if fila:
+        minutos = _minutos_preparo([pedido_id for pedido_id, _, _ in fila], estacoes_cozinha())
+        inicios = dict(
+            TransicaoStatusPedido.objects.filter(pedido_id__in=em_preparo, status_novo='preparando')
+            .values('pedido_id').annotate(inicio=Max('criado_em')).values_list('pedido_id', 'inicio')
+        ) if em_preparo else {}
+
+    return {
+        # Sem transição registrada, a última alteração marca o início do preparo
+        'fila': [
+            (pedido_id, status, inicios.get(pedido_id, atualizado_em) if status == 'preparando' else None)
+            for pedido_id, status, atualizado_em in fila
+        ],
+        'minutos': minutos,
+        'estacoes': max(estacoes_cozinha(), em_uso, len(em_preparo)),
+        'prontos_ultima_hora': vazao['prontos']
+    }
+
+
+def programar_fila(base, agora):
+    """
+    Distribui a fila de ``_montar_base`` entre as estações a partir de
+    ``agora``. Retorna ``{'pedidos': {id: {'pronto_em', 'posicao'}}, 'fila': {...}}``.
+    """
+    minutos = base['minutos']
+    pedidos = {}
+
+    # Quem já está em preparo ocupa uma estação até terminar
+    for pedido_id, status, inicio in base['fila']:
+        if status == 'preparando':
+            pronto_em = max(agora, inicio + timedelta(minutes=minutos.get(pedido_id, 0)))
+            pedidos[pedido_id] = {'pronto_em': pronto_em, 'posicao': len(pedidos) + 1}
+
+    # Os pendentes, em ordem de chegada, vão para a estação que liberar primeiro
+    livres = [pedido['pronto_em'] for pedido in pedidos.values()]
+    livres += [agora] * (base['estacoes'] - len(livres))
+    heapq.heapify(livres)
+    for pedido_id, status, _ in base['fila']:
+        if status == 'pendente':
+            pronto_em = heapq.heappop(livres) + timedelta(minutes=minutos.get(pedido_id, 0))
+            heapq.heappush(livres, pronto_em)
+            pedidos[pedido_id] = {'pronto_em': pronto_em, 'posicao': len(pedidos) + 1}
+
+    return {
+        'pedidos': pedidos,
+        'fila': {
+            'pedidos': len(base['fila']),
+            'estacoes': base['estacoes'],
+            'prontos_ultima_hora': base['prontos_ultima_hora'],
+            'livre_em': max((p['pronto_em'] for p in pedidos.values()), default=None)
+        }
+    }
+
+
+def calcular_previsao(empresa_id):
+    """Previsão da fila da empresa calculada agora, sem cache."""
+    return programar_fila(_montar_base(empresa_id), timezone.now())
+
+
+def momento_previsao():
+    """Início do intervalo atual, a partir do qual a fila é distribuída."""
+    segundos = int(timezone.now().timestamp())
+    return datetime.fromtimestamp(segundos - segundos % INTERVALO_PREVISAO, tz=dt_timezone.utc)
+
+
+def obter_previsao(empresa_id):
+    """
+    Previsão da empresa: a base vem do cache (refeita só quando os pedidos
+    mudam) e a fila é distribuída a partir do intervalo atual.
+    """
+    base = obter_ou_construir(empresa_id, 'previsao', lambda: _montar_base(empresa_id))
+    return programar_fila(base, momento_previsao())
+
+
+def etag_previsao(request, *args, **kwargs):
+    """ETag das APIs de pedidos que trazem a previsão: muda também a cada intervalo."""
+    return f'{etag_pedidos(request)}-{gerar_cursor(momento_previsao())}'
+
+
+def ultima_modificacao_previsao(request, *args, **kwargs):
+    return max(ultima_modificacao_pedidos(request), momento_previsao())
+
+
+def previsao_do_pedido(previsao, pedido_id):
+    """
+    ``{'previsao_pronto', 'posicao_fila'}`` do pedido (None fora da fila:
+    já pronto, finalizado ou desconhecido). Só horários absolutos: as
+    respostas são validadas pela versão dos pedidos e o cliente calcula o
+    tempo restante.
+    """
+    dados = previsao['pedidos'].get(pedido_id)
+    if dados is None:
+        return {'previsao_pronto': None, 'posicao_fila': None}
+    return {
+        'previsao_pronto': dados['pronto_em'].isoformat(),
+        'posicao_fila': dados['posicao']
+    }
+
+
+def resumo_fila(previsao):
+    """Pressão da fila para os terminais: tamanho, estações e quando deve esvaziar."""
+    fila = previsao['fila']
+    return {
+        'pedidos': fila['pedidos'],
+        'estacoes': fila['estacoes'],
+        'prontos_ultima_hora': fila['prontos_ultima_hora'],
+        'livre_em': fila['livre_em'].isoformat() if fila['livre_em'] else None
+    }
+
+
+def serializar_previsao(previsao):
+    """Previsão de todos os pedidos da fila e resumo, para os eventos da cozinha."""
+    return {
+        'pedidos': {pedido_id: dados['pronto_em'].isoformat() for pedido_id, dados in previsao['pedidos'].items()},
+        'fila': resumo_fila(previsao)
+    }
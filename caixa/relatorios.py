@@ -0,0 +1,214 @@
+"""
+Relatórios de vendas (aba Relatórios do caixa).
+
+Resumo e produtos mais vendidos somam os resumos diários
+(``VendaDiaria`` e ``VendaDiariaProduto``, ver ``caixa/consolidacao.py``):
+algumas centenas de linhas mesmo para um mês inteiro.
+
+O histórico é paginado por cursor (keyset) sobre ``(criado_em, id)``: cada
+página custa uma consulta com a soma de itens por pedido já anotada, seja
+qual for o tamanho do período. A exportação completa do período é gerada
+em streaming (CSV ou JSON), sem montar a lista inteira em memória.
+"""
+import csv
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .estatisticas import intervalo_dias
+from .models import Pedido, VendaDiaria, VendaDiariaProduto
+
+TAMANHO_PAGINA_HISTORICO = 50
+TAMANHO_MAXIMO_PAGINA = 200
+
+# Pedidos lidos do banco por vez durante a exportação
+LOTE_EXPORTACAO = 500
+
+COLUNAS_EXPORTACAO = [
+    ('numero_pedido', 'Pedido'),
+    ('criado_em', 'Data/Hora'),
+    ('cliente_nome', 'Cliente'),
+    ('tipo_display', 'Tipo'),
+    ('forma_pagamento_display', 'Pagamento'),
+    ('total_itens', 'Itens'),
+    ('total', 'Total'),
+]
+
+
+def periodo_do_filtro(request):
+    """Datas inicial e final (inclusive) do filtro da aba Relatórios."""
+    filtro = request.GET.get('filtro', 'hoje')
+    hoje = timezone.localdate()
+
+    if filtro == 'ontem':
+        return hoje - timedelta(days=1), hoje - timedelta(days=1)
+    if filtro == 'semana':
+        return hoje - timedelta(days=hoje.weekday()), hoje
+    if filtro == 'mes':
+        return hoje.replace(day=1), hoje
+    if filtro == 'personalizado':
+        return (
+            datetime.strptime(request.GET.get('data_inicio'), '%Y-%m-%d').date(),
+            datetime.strptime(request.GET.get('data_fim'), '%Y-%m-%d').date()
+        )
+    return hoje, hoje
+
+
+def filtros_do_relatorio(request):
+    """
+    Forma de pagamento (``?forma_pagamento=``) e tipo de pedido (``?tipo=``)
+    escolhidos na aba Relatórios; valores desconhecidos são ignorados.
+    """
+    opcoes = {'forma_pagamento': dict(Pedido.FORMA_PAGAMENTO), 'tipo': dict(Pedido.TIPO_PEDIDO)}
+    return {
+        campo: request.GET[campo]
+        for campo, valores in opcoes.items()
+        if request.GET.get(campo) in valores
+    }
+
+
+def pedidos_do_periodo(empresa, data_inicio, data_fim, filtros=None):
+    """Pedidos do período, exceto cancelados."""
+    inicio, fim = intervalo_dias(data_inicio, data_fim)
+    return Pedido.objects.filter(
+        empresa=empresa,
+        criado_em__gte=inicio,
+        criado_em__lt=fim,
+        **(filtros or {})
+    ).exclude(status='cancelado')
+
+
+def calcular_resumo(empresa, data_inicio, data_fim, filtros=None):
+    """Cards do período, somados a partir dos resumos diários."""
+    dados = VendaDiaria.objects.filter(
+        empresa=empresa, data__gte=data_inicio, data__lte=data_fim, **(filtros or {})
+    ).aggregate(
+        total_vendas=Sum('total_vendas'),
+        total_pedidos=Sum('total_pedidos'),
+        total_itens=Sum('total_itens')
+    )
+    total_vendas = dados['total_vendas'] or 0
+    total_pedidos = dados['total_pedidos'] or 0
+
+    return {
+        'total_vendas': float(total_vendas),
+        'total_pedidos': total_pedidos,
+        'ticket_medio': float(total_vendas / total_pedidos) if total_pedidos > 0 else 0.0,
+        'total_itens': int(dados['total_itens'] or 0)
+    }
+
+
+def calcular_top_itens(empresa, data_inicio, data_fim, filtros=None, limite=10):
+    """Produtos mais vendidos do período, a partir dos resumos diários."""
+    top_itens = VendaDiariaProduto.objects.filter(
+        empresa=empresa, data__gte=data_inicio, data__lte=data_fim, **(filtros or {})
+    ).values(
+        'produto_nome'
+    ).annotate(
+        quantidade_vendida=Sum('quantidade'),
+        total_vendido=Sum('total')
+    ).filter(quantidade_vendida__gt=0).order_by('-quantidade_vendida')[:limite]
+
+    return [
+        {
+            'nome': item['produto_nome'],
+            'quantidade': item['quantidade_vendida'],
+            'total': float(item['total_vendido'])
+        }
+        for item in top_itens
+    ]
+
+
+def _historico(pedidos):
+    """Pedidos mais recentes primeiro, com a soma de itens de cada um."""
+    return pedidos.annotate(
+        total_itens=Coalesce(Sum('itens__quantidade'), 0)
+    ).order_by('-criado_em', '-id')
+
+
+def _linha_historico(pedido):
+    return {
+        'numero_pedido': pedido.numero_pedido,
+        'criado_em': pedido.criado_em.isoformat(),
+        'cliente_nome': pedido.cliente_nome or '',
+        'tipo_display': pedido.get_tipo_display(),
+        'forma_pagamento_display': pedido.get_forma_pagamento_display() if pedido.forma_pagamento else '',
+        'total_itens': pedido.total_itens,
+        'total': str(pedido.total)
+    }
+
+
+_EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _gerar_cursor(pedido):
+    microssegundos = (pedido.criado_em - _EPOCA) // timedelta(microseconds=1)
+    return f"{microssegundos}_{pedido.id}"
+
+
+def _ler_cursor(cursor):
+    try:
+        microssegundos, pedido_id = cursor.split('_')
+        momento = _EPOCA + timedelta(microseconds=int(microssegundos))
+        return momento, int(pedido_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def pagina_historico(pedidos, cursor=None, limite=TAMANHO_PAGINA_HISTORICO):
+    """
+    Uma página do histórico. Retorna ``(linhas, proximo_cursor)``;
+    ``proximo_cursor`` é None na última página.
+    """
+    historico = _historico(pedidos)
+
+    posicao = _ler_cursor(cursor) if cursor else None
+    if posicao:
+        criado_em, pedido_id = posicao
+        historico = historico.filter(
+            Q(criado_em__lt=criado_em) | Q(criado_em=criado_em, id__lt=pedido_id)
+        )
+
+    # Um registro a mais indica se existe próxima página
+    pagina = list(historico[:limite + 1])
+    proximo_cursor = _gerar_cursor(pagina[limite - 1]) if len(pagina) > limite else None
+
+    return [_linha_historico(pedido) for pedido in pagina[:limite]], proximo_cursor
+
+
+def _pedidos_exportacao(pedidos):
+    return _historico(pedidos).iterator(chunk_size=LOTE_EXPORTACAO)
+
+
+class _Eco:
+    """Buffer que só devolve o que recebe (csv.writer sem acumular texto)."""
+
+    def write(self, valor):
+        return valor
+
+
+def exportar_csv(pedidos):
+    """Linhas CSV do histórico (separador ';' e BOM para o Excel em pt-BR)."""
+    escritor = csv.writer(_Eco(), delimiter=';')
+    yield '\ufeff'
+    yield escritor.writerow([titulo for _, titulo in COLUNAS_EXPORTACAO])
+    for pedido in _pedidos_exportacao(pedidos):
+        linha = _linha_historico(pedido)
+        linha['criado_em'] = timezone.localtime(pedido.criado_em).strftime('%d/%m/%Y %H:%M')
+        linha['total'] = linha['total'].replace('.', ',')
+        yield escritor.writerow([linha[campo] for campo, _ in COLUNAS_EXPORTACAO])
+
+
+def exportar_json(pedidos, periodo):
+    """Histórico como um único documento JSON, gerado pedido a pedido."""
+    data_inicio, data_fim = periodo
+    yield '{"data_inicio": "%s", "data_fim": "%s", "historico": [' % (data_inicio, data_fim)
+    separador = ''
+    for pedido in _pedidos_exportacao(pedidos):
+        yield separador + json.dumps(_linha_historico(pedido), cls=DjangoJSONEncoder, ensure_ascii=False)
+        separador = ','
+    yield ']}'
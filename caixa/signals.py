@@ -0,0 +1,165 @@
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from authentication.models import Empresa
+from .catalogo import registrar_alteracao_catalogo
+from .consolidacao import (
+    registrar_exclusao_pedido, registrar_itens, registrar_pedido, vendas_gravadas
+)
+from .eventos import notificar_exclusao, notificar_pedido
+from .models import Pedido, ItemPedido, PedidoComboEscolha, Produto, Categoria, Combo, ComboSlot, ComboSlotItem
+from .sincronizacao import registrar_alteracao_estado_pedido, registrar_alteracao_pedidos, registrar_exclusao
+
+
+def _exclusao_em_cascata(origin, *modelos):
+    """Exclusões disparadas pelo pedido ou pela empresa já trocam a versão."""
+    modelo = getattr(origin, 'model', type(origin))
+    return modelo in (Pedido, Empresa, *modelos)
+
+
+def _dados_do_pedido(pedido_id):
+    """Empresa, criação e ``dados_vendas`` gravados do pedido, ou None se não existir."""
+    pedido = Pedido.objects.filter(id=pedido_id).only('empresa_id', 'criado_em', *Pedido.CAMPOS_VENDAS).first()
+    return (pedido.empresa_id, pedido.criado_em, pedido.dados_vendas()) if pedido else None
+
+
+@receiver(pre_save, sender=Pedido)
+def pedido_sera_salvo(sender, instance, update_fields=None, **kwargs):
+    # Pedido que não veio do banco (ou com campos adiados), ou gravação parcial de
+    # uma instância possivelmente desatualizada: o que ele somava nas vendas
+    parcial = update_fields is not None and not update_fields.isdisjoint(Pedido.CAMPOS_VENDAS)
+    if instance.pk and (parcial or getattr(instance, '_vendas_gravadas', None) is None):
+        instance._vendas_gravadas = vendas_gravadas(instance.pk)
+
+
+@receiver(post_save, sender=Pedido)
+def pedido_salvo(sender, instance, created, update_fields=None, **kwargs):
+    registrar_alteracao_pedidos(instance.empresa_id)
+    registrar_alteracao_estado_pedido(instance.qr_code)
+    notificar_pedido('pedido_criado' if created else 'pedido_alterado', instance.empresa_id, instance.id)
+    # Mudanças de status (exceto cancelamento), observações, mesa etc. não alteram as vendas
+    vendas = instance.dados_vendas() or vendas_gravadas(instance.pk)
+    antes = None if created else instance._vendas_gravadas
+    if update_fields is not None and antes is not None:
+        # Gravação parcial: no banco só mudaram os campos gravados
+        vendas = tuple(
+            novo if campo in update_fields else gravado
+            for campo, gravado, novo in zip(Pedido.CAMPOS_VENDAS, antes, vendas)
+        )
+    if vendas != antes:
+        registrar_pedido(instance, antes, vendas)
+    instance._vendas_gravadas = vendas
+
+
+@receiver(pre_delete, sender=Pedido)
+def pedido_sera_excluido(sender, instance, origin=None, **kwargs):
+    # Os resumos da empresa excluída saem junto com ela
+    if getattr(origin, 'model', type(origin)) is not Empresa:
+        vendas = getattr(instance, '_vendas_gravadas', None) or vendas_gravadas(instance.pk)
+        if vendas is not None:
+            registrar_exclusao_pedido(instance, vendas)
+
+
+@receiver(post_delete, sender=Pedido)
+def pedido_excluido(sender, instance, origin=None, **kwargs):
+    # Na exclusão da própria empresa não há terminal para avisar
+    if isinstance(origin, Pedido) or getattr(origin, 'model', None) is Pedido:
+        registrar_exclusao(instance)
+        notificar_exclusao(instance.empresa_id, instance.id)
+    registrar_alteracao_pedidos(instance.empresa_id)
+    registrar_alteracao_estado_pedido(instance.qr_code)
+
+
+@receiver(pre_save, sender=ItemPedido)
+def item_pedido_sera_salvo(sender, instance, **kwargs):
+    # Item que não veio do banco (ou com campos adiados): o que ele somava nas vendas
+    if instance.pk and getattr(instance, '_venda_gravada', None) is None:
+        instance._venda_gravada = ItemPedido.objects.filter(id=instance.pk).values_list(
+            'produto_id', 'quantidade', 'preco_unitario'
+        ).first()
+
+
+@receiver(post_save, sender=ItemPedido)
+@receiver(post_delete, sender=ItemPedido)
+def item_pedido_alterado(sender, instance, signal, origin=None, created=False, **kwargs):
+    # Itens excluídos com o pedido saem dos resumos junto com ele (pedido_sera_excluido)
+    if origin is not None and _exclusao_em_cascata(origin):
+        return
+    pedido = instance.pedido if ItemPedido.pedido.is_cached(instance) else None
+    if pedido is not None and getattr(pedido, '_vendas_gravadas', None) is not None:
+        empresa_id, criado_em, vendas = pedido.empresa_id, pedido.criado_em, pedido._vendas_gravadas
+    else:
+        empresa_id, criado_em, vendas = _dados_do_pedido(instance.pedido_id) or (None, None, None)
+    if empresa_id:
+        registrar_alteracao_pedidos(empresa_id)
+        notificar_pedido('pedido_alterado', empresa_id, instance.pedido_id)
+        antes = None if created else getattr(instance, '_venda_gravada', None) or instance.dados_venda()
+        depois = None if signal is post_delete else instance.dados_venda()
+        registrar_itens(empresa_id, criado_em, vendas, [(antes, depois)])
+    instance._venda_gravada = instance.dados_venda()
+
+
+@receiver(post_save, sender=PedidoComboEscolha)
+@receiver(post_delete, sender=PedidoComboEscolha)
+def escolha_combo_alterada(sender, instance, origin=None, **kwargs):
+    if origin is not None and _exclusao_em_cascata(origin, ItemPedido):
+        return
+    empresa_id = ItemPedido.objects.filter(
+        id=instance.item_pedido_id
+    ).values_list('pedido__empresa_id', flat=True).first()
+    if empresa_id:
+        registrar_alteracao_pedidos(empresa_id)
+
+
+@receiver(post_save, sender=Produto)
+def produto_salvo(sender, instance, **kwargs):
+    # Nome do produto aparece no snapshot dos pedidos ativos
+    registrar_alteracao_pedidos(instance.empresa_id)
+    registrar_alteracao_catalogo(instance.empresa_id)
+
+
+@receiver(post_delete, sender=Produto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def catalogo_alterado(sender, instance, origin=None, **kwargs):
+    # Na exclusão da própria empresa não há catálogo para atualizar
+    if getattr(origin, 'model', type(origin)) is Empresa:
+        return
+    registrar_alteracao_catalogo(instance.empresa_id)
+
+
+@receiver(post_save, sender=Combo)
+@receiver(post_delete, sender=Combo)
+def combo_alterado(sender, instance, origin=None, **kwargs):
+    if origin is not None and _exclusao_em_cascata(origin, Produto):
+        return
+    empresa_id = Produto.objects.filter(id=instance.produto_id).values_list('empresa_id', flat=True).first()
+    if empresa_id:
+        registrar_alteracao_catalogo(empresa_id)
+
+
+@receiver(post_save, sender=ComboSlot)
+@receiver(post_delete, sender=ComboSlot)
+def slot_combo_alterado(sender, instance, origin=None, **kwargs):
+    if origin is not None and _exclusao_em_cascata(origin, Produto, Combo):
+        return
+    empresa_id = Combo.objects.filter(id=instance.combo_id).values_list('produto__empresa_id', flat=True).first()
+    if empresa_id:
+        registrar_alteracao_catalogo(empresa_id)
+
+
+@receiver(post_save, sender=ComboSlotItem)
+@receiver(post_delete, sender=ComboSlotItem)
+def item_slot_combo_alterado(sender, instance, origin=None, **kwargs):
+    if origin is not None and _exclusao_em_cascata(origin, Produto, Combo, ComboSlot):
+        return
+    empresa_id = ComboSlot.objects.filter(id=instance.slot_id).values_list('combo__produto__empresa_id', flat=True).first()
+    if empresa_id:
+        registrar_alteracao_catalogo(empresa_id)
+
+
+@receiver(post_save, sender=Empresa)
+def empresa_salva(sender, instance, created, **kwargs):
+    # Nome da empresa aparece no cardápio e no autoatendimento
+    if not created:
+        registrar_alteracao_catalogo(instance.id)
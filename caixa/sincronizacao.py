@@ -0,0 +1,220 @@
+"""
+Sincronização incremental dos pedidos ativos.
+
+Cada empresa tem uma versão dos seus pedidos guardada no cache ``pedidos``,
+trocada a cada alteração (ver ``caixa/signals.py``). As APIs de pedidos usam
+essa versão como ETag: uma consulta sem mudanças responde 304 sem tocar nos
+pedidos. Com o parâmetro ``since`` (cursor devolvido pela consulta
+anterior) as APIs devolvem apenas os pedidos alterados e os removidos.
+
+Dados derivados dos pedidos (snapshot, estatísticas) são guardados com a
+versão na chave: uma alteração invalida todos de uma vez.
+
+Para o acompanhamento do cliente, o estado de cada pedido (status e versão)
+também fica no cache, pelo QR code, e é descartado só quando aquele pedido
+muda: as consultas do celular do cliente não dependem das demais vendas.
+"""
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Pedido, PedidoExcluido
+
+STATUS_ATIVOS = ['pendente', 'preparando', 'pronto']
+STATUS_FINALIZADOS = ['entregue', 'cancelado']
+
+# Alterações gravadas pouco antes do cursor mas commitadas depois da consulta
+# são reenviadas; o cliente aplica os pedidos de forma idempotente
+MARGEM_CURSOR = timedelta(seconds=2)
+
+# Tombstones mais antigos são apagados; cursores anteriores recebem o snapshot completo
+RETENCAO_EXCLUSOES = timedelta(days=1)
+
+# Validade das entradas derivadas (chaves de versões antigas expiram sozinhas)
+TIMEOUT_DERIVADOS = 300
+
+# Chaves de on_commit_unico com callback pendente, por conexão (as conexões do Django são por thread)
+_chaves_pendentes = threading.local()
+
+
+def cache_pedidos():
+    return caches['pedidos']
+
+
+def _chave_versao(empresa_id):
+    return f'pedidos:versao:{empresa_id}'
+
+
+def obter_versao_pedidos(empresa_id):
+    """Retorna ``{'versao', 'modificado_em'}`` dos pedidos da empresa."""
+    cache = cache_pedidos()
+    chave = _chave_versao(empresa_id)
+    versao = cache.get(chave)
+    if versao is None:
+        # Cache vazio (reinício/expiração): nova versão força uma recarga
+        versao = {'versao': uuid.uuid4().hex, 'modificado_em': timezone.now()}
+        cache.add(chave, versao, None)
+        versao = cache.get(chave, versao)
+    return versao
+
+
+def registrar_alteracao_pedidos(empresa_id):
+    """Troca a versão dos pedidos da empresa após o commit da transação."""
+    def _trocar_versao():
+        cache_pedidos().set(
+            _chave_versao(empresa_id),
+            {'versao': uuid.uuid4().hex, 'modificado_em': timezone.now()},
+            None
+        )
+
+    transaction.on_commit(_trocar_versao)
+
+
+def _chave_estado(qr_code):
+    return f'pedidos:estado:{qr_code}'
+
+
+def obter_estado_pedido(qr_code):
+    """
+    Retorna ``{'pedido_id', 'empresa_id', 'status', 'status_display',
+    'versao'}`` do pedido com o QR code, ou None se não existir. A versão
+    (cursor de ``atualizado_em``) muda a cada alteração do pedido.
+    """
+    cache = cache_pedidos()
+    chave = _chave_estado(qr_code)
+    estado = cache.get(chave)
+    if estado is None:
+        pedido = Pedido.objects.filter(qr_code=qr_code).values('id', 'empresa_id', 'status', 'atualizado_em').first()
+        if pedido is None:
+            return None
+        estado = {
+            'pedido_id': pedido['id'],
+            'empresa_id': pedido['empresa_id'],
+            'status': pedido['status'],
+            'status_display': dict(Pedido.STATUS_CHOICES).get(pedido['status'], pedido['status']),
+            'versao': gerar_cursor(pedido['atualizado_em'])
+        }
+        cache.set(chave, estado, TIMEOUT_DERIVADOS)
+    return estado
+
+
+def registrar_alteracao_estado_pedido(qr_code):
+    """Descarta o estado do pedido no cache após o commit da transação."""
+    transaction.on_commit(lambda: cache_pedidos().delete(_chave_estado(qr_code)))
+
+
+def on_commit_unico(chave, funcao):
+    """
+    ``transaction.on_commit`` que executa uma só função por ``chave`` em cada
+    transação: a primeira agendada que chegar ao commit (as de savepoints
+    desfeitos saem da fila pelo próprio Django); as demais são descartadas
+    na execução.
+    """
+    conexao = transaction.get_connection()
+    pendentes = getattr(_chaves_pendentes, conexao.alias, None)
+    if pendentes is None or not conexao.in_atomic_block:
+        # Fora de transação nada fica pendente (chaves de transações desfeitas são descartadas)
+        pendentes = {}
+        setattr(_chaves_pendentes, conexao.alias, pendentes)
+    estado = pendentes.setdefault(chave, {'executado': False})
+
+    def _executar():
+        if estado['executado']:
+            return
+        estado['executado'] = True
+        if pendentes.get(chave) is estado:
+            del pendentes[chave]
+        funcao()
+
+    transaction.on_commit(_executar)
+
+
+def obter_ou_construir(empresa_id, nome, construir):
+    """
+    Retorna o dado derivado ``nome`` da versão atual dos pedidos da empresa,
+    chamando ``construir()`` só se ainda não estiver no cache: uma construção
+    por alteração, lida depois por todos os terminais. Consultas que chegam
+    durante a construção constroem também em vez de esperar (a construção
+    custa poucas consultas; a espera prenderia a thread do worker).
+    """
+    cache = cache_pedidos()
+    versao = obter_versao_pedidos(empresa_id)['versao']
+    chave = f'pedidos:{nome}:{empresa_id}:{versao}:{timezone.localdate().isoformat()}'
+
+    valor = cache.get(chave)
+    if valor is None:
+        valor = construir()
+        cache.set(chave, valor, TIMEOUT_DERIVADOS)
+    return valor
+
+
+def etag_pedidos(request, *args, **kwargs):
+    """ETag das APIs de pedidos (versão da empresa + dia das estatísticas)."""
+    versao = obter_versao_pedidos(request.user.empresa_id)
+    return f"{versao['versao']}-{timezone.localdate().isoformat()}"
+
+
+def ultima_modificacao_pedidos(request, *args, **kwargs):
+    return obter_versao_pedidos(request.user.empresa_id)['modificado_em']
+
+
+def gerar_cursor(momento):
+    """Cursor opaco (microssegundos desde a época) seguro para query string."""
+    return str(int(momento.timestamp() * 1_000_000))
+
+
+def ler_cursor(request):
+    """
+    Lê o parâmetro ``since``. Retorna None (snapshot completo) se ausente,
+    inválido ou mais antigo que a retenção dos tombstones.
+    """
+    try:
+        microssegundos = int(request.GET.get('since', ''))
+    except ValueError:
+        return None
+
+    desde = datetime.fromtimestamp(microssegundos / 1_000_000, tz=dt_timezone.utc)
+    if desde < timezone.now() - RETENCAO_EXCLUSOES:
+        return None
+    return desde
+
+
+def filtrar_alterados(pedidos_ativos, empresa_id, desde):
+    """
+    Restringe ``pedidos_ativos`` aos alterados desde o cursor e retorna
+    também os IDs que deixaram a lista (finalizados, cancelados ou excluídos).
+    """
+    limite = desde - MARGEM_CURSOR
+
+    removidos = list(
+        Pedido.objects.filter(
+            empresa_id=empresa_id,
+            status__in=STATUS_FINALIZADOS,
+            atualizado_em__gte=limite
+        ).order_by().values_list('id', flat=True)
+    )
+    removidos += list(
+        PedidoExcluido.objects.filter(
+            empresa_id=empresa_id,
+            excluido_em__gte=limite
+        ).values_list('pedido_id', flat=True)
+    )
+
+    return pedidos_ativos.filter(atualizado_em__gte=limite), removidos
+
+
+def registrar_exclusao(pedido):
+    """Grava o tombstone do pedido e descarta os que passaram da retenção."""
+    PedidoExcluido.objects.create(
+        empresa_id=pedido.empresa_id,
+        pedido_id=pedido.id,
+        numero_pedido=pedido.numero_pedido
+    )
+    PedidoExcluido.objects.filter(
+        empresa_id=pedido.empresa_id,
+        excluido_em__lt=timezone.now() - RETENCAO_EXCLUSOES
+    ).delete()
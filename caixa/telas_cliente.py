@@ -0,0 +1,104 @@
+"""
+Tela do cliente pareada a um terminal de caixa.
+
+Cada navegador de caixa gera um identificador de terminal (guardado no
+localStorage) e publica aqui o que a sua tela do cliente deve mostrar: o
+carrinho em montagem, o pedido recém-criado e o QR code de acompanhamento.
+O último estado de cada terminal fica no cache ``pedidos`` (a tela que
+conecta o recebe na hora) e cada mudança é empurrada pelo canal de eventos
+do terminal, que a tela acompanha por server-sent events. Com vários caixas,
+cada tela mostra o carrinho do seu terminal, e nenhuma atualização consulta
+os pedidos.
+
+O identificador é longo e aleatório: quem não o tem não encontra a tela.
+Os eventos do terminal passam pelo mesmo canal entre processos dos pedidos
+(ver ``caixa/eventos.py``): o caixa publica pelo Gunicorn e a tela recebe
+pelo ASGI. Sem o ASGI, a tela relê o estado a cada poucos segundos.
+"""
+import json
+import re
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .eventos import obter_canal_terminal
+from .sincronizacao import cache_pedidos
+
+TIPOS_EVENTO = ['carrinho', 'pedido', 'qrcode']
+
+# Terminais sem uso saem do cache depois disto
+TIMEOUT_ESTADO = 12 * 3600
+
+# Tamanho máximo dos dados de um evento (um carrinho grande tem poucos KB)
+TAMANHO_MAXIMO = 32 * 1024
+
+FORMATO_TERMINAL = re.compile(r'[A-Za-z0-9_-]{16,64}')
+
+TIPOS_EXIBICAO = {
+    'balcao': '⛪ Local',
+    'delivery': '🚗 Viagem',
+    'mesa': '🪑 Mesa',
+    'autoatendimento': '🖥️ Autoatendimento'
+}
+
+
+class TelaInvalida(Exception):
+    """Publicação recusada; a mensagem volta para o caixa."""
+
+
+def terminal_valido(terminal):
+    return bool(terminal) and FORMATO_TERMINAL.fullmatch(terminal) is not None
+
+
+def _chave(empresa_id, terminal):
+    return f'tela_cliente:{empresa_id}:{terminal}'
+
+
+def obter_estado_tela(empresa_id, terminal):
+    """Último dado publicado de cada tipo pelo terminal, ou None se ele nunca publicou."""
+    return cache_pedidos().get(_chave(empresa_id, terminal))
+
+
+def publicar_tela(empresa_id, terminal, tipo, dados):
+    """Guarda o estado da tela do terminal e o envia às telas conectadas."""
+    if not terminal_valido(terminal):
+        raise TelaInvalida('Terminal inválido')
+    if tipo not in TIPOS_EVENTO:
+        raise TelaInvalida('Tipo de evento inválido')
+    if len(json.dumps(dados, cls=DjangoJSONEncoder)) > TAMANHO_MAXIMO:
+        raise TelaInvalida('Dados grandes demais para a tela do cliente')
+
+    cache = cache_pedidos()
+    chave = _chave(empresa_id, terminal)
+    estado = cache.get(chave) or {}
+    estado[tipo] = dados
+    cache.set(chave, estado, TIMEOUT_ESTADO)
+    obter_canal_terminal(empresa_id, terminal).publicar(tipo, dados)
+
+
+def serializar_pedido_tela(pedido):
+    """Resumo do pedido para a tela do cliente (uma consulta para os itens)."""
+    return {
+        'id': pedido.id,
+        'numero_pedido': pedido.numero_pedido,
+        'cliente_nome': pedido.cliente_nome or 'Cliente',
+        'tipo_display': TIPOS_EXIBICAO.get(pedido.tipo, pedido.tipo),
+        'pagamento': pedido.get_forma_pagamento_display() if pedido.forma_pagamento else 'Não informado',
+        'itens': [{
+            'produto_nome': item.produto.nome,
+            'quantidade': item.quantidade,
+            'preco_unitario': str(item.preco_unitario),
+            'subtotal': str(item.subtotal)
+        } for item in pedido.itens.select_related('produto')],
+        'total': str(pedido.total),
+        'atualizado': pedido.atualizado_em.isoformat()
+    }
+
+
+def publicar_pedido_na_tela(empresa_id, terminal, pedido):
+    """Mostra o pedido recém-criado na tela do terminal, após o commit."""
+    if not terminal_valido(terminal):
+        return
+    transaction.on_commit(
+        lambda: publicar_tela(empresa_id, terminal, 'pedido', serializar_pedido_tela(pedido))
+    )
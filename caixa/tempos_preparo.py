@@ -0,0 +1,248 @@
+"""
+Tempo real de preparo de cada produto, aprendido com o uso da cozinha.
+
+Cada pedido que passa de "preparando" para "pronto" vira uma amostra para os
+produtos que contém (nos combos, os produtos escolhidos). O tempo observado
+é repartido pelas estimativas atuais: se o pedido levou ``razao`` vezes o
+previsto para o seu item mais demorado, cada produto recebe como amostra
+``razao`` vezes a própria estimativa (num pedido de um só produto, a amostra
+é o próprio tempo observado).
+
+Por produto ficam uma média móvel exponencial e um histograma com
+decaimento (``TempoPreparoProduto``), atualizados após o commit da
+transição, sem consultar o histórico; os percentis saem do histograma. A
+previsão da cozinha (``caixa/previsao.py``) usa a média aprendida a partir
+de ``MINIMO_AMOSTRAS`` amostras e, com ``CANTINA_APLICAR_TEMPO_PREPARO``,
+ela também substitui ``Produto.tempo_preparo``.
+``python manage.py aprender_tempos_preparo`` reconstrói tudo a partir do
+histórico de status.
+"""
+import bisect
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import ItemPedido, Produto, TempoPreparoProduto, TransicaoStatusPedido
+
+logger = logging.getLogger(__name__)
+
+# Peso de cada nova amostra na média móvel
+ALFA_MEDIA = 0.2
+
+# Fator aplicado ao histograma a cada amostra: as antigas perdem peso aos poucos
+DECAIMENTO_HISTOGRAMA = 0.98
+
+# Limites superiores das faixas do histograma, em segundos (a última faixa é aberta)
+FAIXAS_SEGUNDOS = [60, 120, 180, 240, 300, 420, 600, 900, 1200, 1800, 2700, 3600]
+
+# Amostras necessárias para a média aprendida valer no lugar do tempo cadastrado
+MINIMO_AMOSTRAS = 5
+
+# Preparos mais longos que isso são pedidos esquecidos, não amostras
+DURACAO_MAXIMA_AMOSTRA = timedelta(hours=2)
+
+
+def aplicar_automaticamente():
+    return getattr(settings, 'CANTINA_APLICAR_TEMPO_PREPARO', False)
+
+
+def segundos_estimados(tempo_preparo, media_segundos=None, amostras=None):
+    """Estimativa de preparo: a média aprendida, se houver amostras, senão o tempo cadastrado."""
+    if amostras and amostras >= MINIMO_AMOSTRAS:
+        return media_segundos
+    return tempo_preparo * 60
+
+
+def registrar_amostra(registro, segundos):
+    """Atualiza média, histograma e contagem de ``registro`` (sem gravar)."""
+    if registro.amostras:
+        registro.media_segundos += ALFA_MEDIA * (segundos - registro.media_segundos)
+    else:
+        registro.media_segundos = float(segundos)
+    registro.amostras += 1
+
+    histograma = registro.histograma
+    if len(histograma) != len(FAIXAS_SEGUNDOS) + 1:
+        histograma = [0.0] * (len(FAIXAS_SEGUNDOS) + 1)
+    histograma = [contagem * DECAIMENTO_HISTOGRAMA for contagem in histograma]
+    histograma[bisect.bisect_left(FAIXAS_SEGUNDOS, segundos)] += 1
+    registro.histograma = [round(contagem, 4) for contagem in histograma]
+    registro.atualizado_em = timezone.now()
+
+
+def percentil(histograma, fracao):
+    """Percentil (0 a 1) em segundos, interpolado dentro da faixa; None sem amostras."""
+    total = sum(histograma)
+    if not total:
+        return None
+    alvo = total * fracao
+    acumulado = 0
+    for indice, contagem in enumerate(histograma):
+        if contagem and acumulado + contagem >= alvo:
+            if indice == len(FAIXAS_SEGUNDOS):
+                return FAIXAS_SEGUNDOS[-1]
+            inicio = FAIXAS_SEGUNDOS[indice - 1] if indice else 0
+            return inicio + (FAIXAS_SEGUNDOS[indice] - inicio) * (alvo - acumulado) / contagem
+        acumulado += contagem
+    return FAIXAS_SEGUNDOS[-1]
+
+
+def resumo_tempo_medido(registro):
+    """Dados aprendidos de um produto para as telas (minutos); None sem amostras."""
+    if registro is None or not registro.amostras:
+        return None
+    p50 = percentil(registro.histograma, 0.5)
+    p90 = percentil(registro.histograma, 0.9)
+    return {
+        'amostras': registro.amostras,
+        'media_minutos': round(registro.media_segundos / 60, 1),
+        'p50_minutos': round(p50 / 60, 1) if p50 is not None else None,
+        'p90_minutos': round(p90 / 60, 1) if p90 is not None else None,
+        'em_uso': registro.amostras >= MINIMO_AMOSTRAS
+    }
+
+
+def _produtos_dos_pedidos(pedido_ids):
+    """``{pedido_id: {produto_id: tempo_preparo}}`` dos produtos preparados em cada pedido."""
+    produtos = {}
+    linhas = ItemPedido.objects.filter(pedido_id__in=pedido_ids).values_list(
+        'pedido_id', 'produto_id', 'produto__tempo_preparo',
+        'escolhas_combo__produto_escolhido_id', 'escolhas_combo__produto_escolhido__tempo_preparo'
+    )
+    for pedido_id, produto_id, tempo_preparo, escolhido_id, tempo_escolhido in linhas:
+        # Combos: quem vai para a cozinha são os produtos escolhidos
+        if escolhido_id is not None:
+            produto_id, tempo_preparo = escolhido_id, tempo_escolhido
+        produtos.setdefault(pedido_id, {})[produto_id] = tempo_preparo
+    return produtos
+
+
+def _repartir(estimativas, segundos_observados):
+    """Amostra de cada produto, na proporção da estimativa ao item mais demorado."""
+    maior = max(estimativas.values())
+    if not maior:
+        return {produto_id: segundos_observados for produto_id in estimativas}
+    razao = segundos_observados / maior
+    return {produto_id: estimativa * razao for produto_id, estimativa in estimativas.items()}
+
+
+def _amostras_do_pedido(produtos, registros, segundos_observados):
+    estimativas = {}
+    for produto_id, tempo_preparo in produtos.items():
+        registro = registros.get(produto_id)
+        estimativas[produto_id] = segundos_estimados(
+            tempo_preparo,
+            registro.media_segundos if registro else None,
+            registro.amostras if registro else None
+        )
+    return _repartir(estimativas, segundos_observados)
+
+
+def _aplicar_em_produtos(registros):
+    """Copia a média aprendida para ``Produto.tempo_preparo`` (UPDATE sem sinais: o catálogo não muda)."""
+    for registro in registros:
+        if registro.amostras >= MINIMO_AMOSTRAS:
+            minutos = max(1, round(registro.media_segundos / 60))
+            Produto.objects.filter(id=registro.produto_id).exclude(tempo_preparo=minutos).update(tempo_preparo=minutos)
+
+
+def aprender_com_pedido(empresa_id, pedido_id, duracao):
+    """Registra o preparo observado de um pedido nos seus produtos."""
+    if not timedelta(0) < duracao <= DURACAO_MAXIMA_AMOSTRA:
+        return
+    produtos = _produtos_dos_pedidos([pedido_id]).get(pedido_id)
+    if not produtos:
+        return
+
+    for tentativa in range(2):
+        try:
+            with transaction.atomic():
+                registros = {
+                    registro.produto_id: registro
+                    for registro in TempoPreparoProduto.objects.select_for_update().filter(produto_id__in=produtos)
+                }
+                amostras = _amostras_do_pedido(produtos, registros, duracao.total_seconds())
+                novos = []
+                for produto_id, segundos in amostras.items():
+                    registro = registros.get(produto_id)
+                    if registro is None:
+                        registro = TempoPreparoProduto(empresa_id=empresa_id, produto_id=produto_id)
+                        novos.append(registro)
+                    registrar_amostra(registro, segundos)
+
+                TempoPreparoProduto.objects.bulk_create(novos)
+                existentes = [registro for registro in registros.values() if registro.produto_id in amostras]
+                if existentes:
+                    TempoPreparoProduto.objects.bulk_update(
+                        existentes, ['amostras', 'media_segundos', 'histograma', 'atualizado_em']
+                    )
+                if aplicar_automaticamente():
+                    _aplicar_em_produtos([*novos, *existentes])
+            return
+        except IntegrityError:
+            # Outro pedido com o mesmo produto novo gravou primeiro; refazer com o registro dele
+            if tentativa:
+                raise
+
+
+def agendar_aprendizado(transicao):
+    """Aprende com uma transição preparando → pronto depois do commit."""
+    if (transicao.status_anterior, transicao.status_novo) != ('preparando', 'pronto'):
+        return
+
+    def _aprender():
+        try:
+            aprender_com_pedido(transicao.empresa_id, transicao.pedido_id, transicao.duracao)
+        except Exception:
+            # Estatística desatualizada não deve afetar a cozinha; o comando
+            # aprender_tempos_preparo reconstrói os tempos
+            logger.exception('Falha ao aprender tempo de preparo do pedido %s', transicao.pedido_id)
+
+    transaction.on_commit(_aprender)
+
+
+def reconstruir_tempos(empresa_id, aplicar=False, tamanho_lote=500):
+    """
+    Refaz os tempos aprendidos da empresa percorrendo, em ordem, todas as
+    transições preparando → pronto. Retorna a quantidade de produtos.
+    """
+    transicoes = TransicaoStatusPedido.objects.filter(
+        empresa_id=empresa_id,
+        status_anterior='preparando',
+        status_novo='pronto',
+        duracao__gt=timedelta(0),
+        duracao__lte=DURACAO_MAXIMA_AMOSTRA
+    ).order_by('criado_em', 'id').values_list('pedido_id', 'duracao')
+
+    registros = {}
+    lote = []
+
+    def _processar(lote):
+        produtos_por_pedido = _produtos_dos_pedidos({pedido_id for pedido_id, _ in lote})
+        for pedido_id, duracao in lote:
+            produtos = produtos_por_pedido.get(pedido_id)
+            if not produtos:
+                continue
+            for produto_id, segundos in _amostras_do_pedido(produtos, registros, duracao.total_seconds()).items():
+                registro = registros.get(produto_id)
+                if registro is None:
+                    registro = registros[produto_id] = TempoPreparoProduto(empresa_id=empresa_id, produto_id=produto_id)
+                registrar_amostra(registro, segundos)
+
+    for transicao in transicoes.iterator(chunk_size=tamanho_lote):
+        lote.append(transicao)
+        if len(lote) == tamanho_lote:
+            _processar(lote)
+            lote = []
+    if lote:
+        _processar(lote)
+
+    with transaction.atomic():
+        TempoPreparoProduto.objects.filter(empresa_id=empresa_id).delete()
+        TempoPreparoProduto.objects.bulk_create(registros.values(), batch_size=tamanho_lote)
+        if aplicar:
+            _aplicar_em_produtos(registros.values())
+    return len(registros)
@@ -1,3 +1,677 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from authentication.models import Empresa, Usuario
+from .combos import validar_selecoes_combo
+from .estoque import EstoqueInsuficiente, movimentar_estoque
+from .eventos import obter_canal
+from .models import (
+    Categoria, Produto, Pedido, ItemPedido, Combo, ComboSlot, ComboSlotItem, PedidoComboEscolha, SequenciaPedido,
+    MovimentacaoEstoque, EventoCanal, VendaDiaria, VendaDiariaProduto
+)
+from .consolidacao import VariacaoVendas, consolidar_dia
+from .pedidos import PedidoInvalido, alterar_status, criar_pedido_completo, editar_itens_pedido
+from .previsao import obter_previsao
+from .relatorios import calcular_resumo, calcular_top_itens
+from .sincronizacao import cache_pedidos, on_commit_unico
+from .pedidos_ativos import consultar_pedidos_ativos, serializar_pedido_ativo
+
+
+class PedidosAtivosConsultasTest(TestCase):
+    """A serialização dos pedidos ativos não pode voltar a ter N+1 consultas."""
+
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome='Cantina', cnpj='00000000000100', endereco='Rua', telefone='0')
+        categoria = Categoria.objects.create(empresa=self.empresa, nome='Lanches')
+        self.lanche = Produto.objects.create(empresa=self.empresa, categoria=categoria, nome='Pastel', preco=Decimal('8.00'))
+        self.bebida = Produto.objects.create(empresa=self.empresa, categoria=categoria, nome='Suco', preco=Decimal('5.00'))
+        produto_combo = Produto.objects.create(empresa=self.empresa, categoria=categoria, nome='Combo', preco=Decimal('12.00'))
+        self.slot = ComboSlot.objects.create(combo=Combo.objects.create(produto=produto_combo), nome='Bebida')
+        self.produto_combo = produto_combo
+
+    def criar_pedido(self):
+        pedido = Pedido.objects.create(empresa=self.empresa, total=Decimal('20.00'))
+        ItemPedido.objects.create(pedido=pedido, produto=self.lanche, quantidade=1, preco_unitario=Decimal('8.00'))
+        item_combo = ItemPedido.objects.create(pedido=pedido, produto=self.produto_combo, quantidade=1, preco_unitario=Decimal('12.00'))
+        PedidoComboEscolha.objects.create(item_pedido=item_combo, slot=self.slot, produto_escolhido=self.bebida, quantidade_abatida=1)
+
+    def serializar(self):
+        return [serializar_pedido_ativo(pedido) for pedido in consultar_pedidos_ativos(self.empresa)]
+
+    def test_consultas_nao_crescem_com_os_pedidos(self):
+        self.criar_pedido()
+        with self.assertNumQueries(3):
+            dados = self.serializar()
+
+        combo = dados[0]['itens'][1]
+        self.assertTrue(combo['is_combo'])
+        self.assertEqual(combo['escolhas'], [{'produto_nome': 'Suco'}])
+        self.assertEqual(dados[0]['total_itens'], 2)
+
+        for _ in range(5):
+            self.criar_pedido()
+        with self.assertNumQueries(3):
+            self.assertEqual(len(self.serializar()), 6)
+
+
+class EventosPedidoTest(TestCase):
+    """Todo caminho de escrita de pedidos avisa os terminais, uma vez por transação."""
+
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome='Cantina', cnpj='00000000000101', endereco='Rua', telefone='0')
+        self.produto = Produto.objects.create(empresa=self.empresa, nome='Pastel', preco=Decimal('8.00'), quantidade_estoque=10)
+        self.canal = obter_canal(self.empresa.id)
+
+    def eventos(self, desde):
+        return [(evento['tipo'], evento['dados']) for evento in self.canal.eventos_desde(desde)]
+
+    def test_pedido_do_autoatendimento_publica_um_evento(self):
+        desde = self.canal.ultimo_id
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.post(
+                f'/autoatendimento/{self.empresa.id}/criar-pedido/',
+                json.dumps({'itens': [{'produto_id': self.produto.id, 'quantidade': 2}]}),
+                content_type='application/json'
+            )
+
+        eventos = self.eventos(desde)
+        self.assertEqual([tipo for tipo, _ in eventos], ['pedido_criado'])
+        dados = eventos[0][1]
+        self.assertEqual(dados['pedido']['id'], resposta.json()['pedido_id'])
+        self.assertEqual(dados['pedido']['total_itens'], 2)
+        self.assertIn('estatisticas', dados)
+
+    def test_alteracao_e_exclusao_pelo_orm(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido = Pedido.objects.create(empresa=self.empresa, total=Decimal('8.00'))
+
+        desde = self.canal.ultimo_id
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                ItemPedido.objects.create(pedido=pedido, produto=self.produto, quantidade=1, preco_unitario=Decimal('8.00'))
+                pedido.status = 'preparando'
+                pedido.save()
+        self.assertEqual([tipo for tipo, _ in self.eventos(desde)], ['pedido_alterado'])
+
+        desde = self.canal.ultimo_id
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido_id = pedido.id
+            pedido.delete()
+        eventos = self.eventos(desde)
+        self.assertEqual([tipo for tipo, _ in eventos], ['pedido_excluido'])
+        self.assertEqual(eventos[0][1]['id'], pedido_id)
+
+    def test_stream_sob_wsgi_responde_204(self):
+        self.client.force_login(Usuario.objects.create_user('eva', password='senha', empresa=self.empresa, tipo='caixa'))
+        self.assertEqual(self.client.get('/caixa/api/pedidos-eventos/').status_code, 204)
+
+    async def test_evento_de_outro_processo_chega_pelo_aviso(self):
+        usuario = await sync_to_async(Usuario.objects.create_user)('eva', password='senha', empresa=self.empresa, tipo='caixa')
+        await self.async_client.aforce_login(usuario)
+        desde = await sync_to_async(lambda: self.canal.ultimo_id)()
+        resposta = await self.async_client.get(f'/caixa/api/pedidos-eventos/?desde={desde}')
+        stream = aiter(resposta.streaming_content)
+        await anext(stream)
+
+        async def outro_processo():
+            # Grava o evento e troca o aviso no cache, sem acordar as esperas deste processo
+            await asyncio.sleep(0.3)
+            evento = await EventoCanal.objects.acreate(canal=self.canal.nome, tipo='pedido_alterado', dados={'id': 1})
+            await sync_to_async(cache_pedidos().set)(self.canal.chave_aviso, evento.id, None)
+            return evento
+
+        publicacao = asyncio.ensure_future(outro_processo())
+        bloco = await asyncio.wait_for(anext(stream), 3)
+        evento = await publicacao
+        self.assertIn(f'id: {evento.id}\nevent: pedido_alterado'.encode(), bloco)
+
+
+class OnCommitUnicoTest(TestCase):
+    """Uma execução por chave e transação, inclusive com savepoints desfeitos."""
+
+    def test_uma_execucao_por_chave(self):
+        chamadas = []
+        with self.captureOnCommitCallbacks(execute=True):
+            on_commit_unico('a', lambda: chamadas.append(1))
+            on_commit_unico('a', lambda: chamadas.append(2))
+            on_commit_unico('b', lambda: chamadas.append(3))
+        self.assertEqual(chamadas, [1, 3])
+
+        # Depois do commit a chave volta a agendar
+        with self.captureOnCommitCallbacks(execute=True):
+            on_commit_unico('a', lambda: chamadas.append(4))
+        self.assertEqual(chamadas, [1, 3, 4])
+
+    def test_savepoint_desfeito_nao_bloqueia_a_chave(self):
+        chamadas = []
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    on_commit_unico('a', lambda: chamadas.append(1))
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+            on_commit_unico('a', lambda: chamadas.append(2))
+        self.assertEqual(chamadas, [2])
+
+
+class SequenciaPedidoTest(TestCase):
+    """Numeração dos pedidos pela sequência da empresa."""
+
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome='Cantina', cnpj='00000000000102', endereco='Rua', telefone='0')
+
+    def test_numeros_seguidos_sem_consultar_os_pedidos(self):
+        numeros = [Pedido.objects.create(empresa=self.empresa).numero_pedido for _ in range(3)]
+        self.assertEqual(numeros, ['0001', '0002', '0003'])
+
+        with CaptureQueriesContext(connection) as consultas:
+            numero, data = SequenciaPedido.proximo_numero(self.empresa.id)
+        self.assertEqual((numero, data), (4, None))
+        self.assertFalse([c for c in consultas.captured_queries if 'caixa_pedido"' in c['sql']])
+
+    def test_numero_reservado_e_descartado_com_a_transacao(self):
+        Pedido.objects.create(empresa=self.empresa)
+        try:
+            with transaction.atomic():
+                Pedido.objects.create(empresa=self.empresa)
+                raise IntegrityError
+        except IntegrityError:
+            pass
+        self.assertEqual(Pedido.objects.create(empresa=self.empresa).numero_pedido, '0002')
+
+    def test_empresas_tem_sequencias_proprias(self):
+        outra = Empresa.objects.create(nome='Outra', cnpj='00000000000103', endereco='Rua', telefone='0')
+        Pedido.objects.create(empresa=self.empresa)
+        self.assertEqual(Pedido.objects.create(empresa=outra).numero_pedido, '0001')
+
+    def test_migracao_parte_do_maior_numero_existente(self):
+        criar_sequencias = import_module('caixa.migrations.0011_sequenciapedido').criar_sequencias
+        for numero in ['0007', '0012', 'A3', '']:
+            Pedido.objects.create(empresa=self.empresa, numero_pedido=numero)
+        SequenciaPedido.objects.all().delete()
+
+        criar_sequencias(apps, None)
+
+        self.assertEqual(SequenciaPedido.objects.get(empresa=self.empresa).ultimo_numero, 12)
+        self.assertEqual(Pedido.objects.create(empresa=self.empresa).numero_pedido, '0013')
+
+    @override_settings(CANTINA_NUMERACAO_DIARIA=True)
+    def test_numeracao_diaria_recomeca_a_cada_dia(self):
+        hoje = timezone.localdate()
+        primeiro = Pedido.objects.create(empresa=self.empresa)
+        self.assertEqual((primeiro.numero_pedido, primeiro.data_numeracao), ('0001', hoje))
+        self.assertEqual(Pedido.objects.create(empresa=self.empresa).numero_pedido, '0002')
+
+        # Virada do dia: os pedidos acima passam a ser de ontem
+        ontem = hoje - timedelta(days=1)
+        Pedido.objects.filter(empresa=self.empresa).update(data_numeracao=ontem)
+        SequenciaPedido.objects.filter(empresa=self.empresa).update(data_referencia=ontem)
+        self.assertEqual(Pedido.objects.create(empresa=self.empresa).numero_pedido, '0001')
+
+    def test_numero_unico_por_empresa_sem_numeracao_diaria(self):
+        Pedido.objects.create(empresa=self.empresa, numero_pedido='0001')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Pedido.objects.create(empresa=self.empresa, numero_pedido='0001')
+
+    def test_numero_unico_por_dia_com_numeracao_diaria(self):
+        hoje = timezone.localdate()
+        Pedido.objects.create(empresa=self.empresa, numero_pedido='0001', data_numeracao=hoje)
+        # O mesmo número em outro dia, ou fora da numeração diária, é permitido
+        Pedido.objects.create(empresa=self.empresa, numero_pedido='0001', data_numeracao=hoje - timedelta(days=1))
+        Pedido.objects.create(empresa=self.empresa, numero_pedido='0001')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Pedido.objects.create(empresa=self.empresa, numero_pedido='0001', data_numeracao=hoje)
+
+
+class MovimentarEstoqueTest(TestCase):
+    """Saídas só com saldo, tudo ou nada, e cada movimento no histórico."""
+
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome='Cantina', cnpj='00000000000104', endereco='Rua', telefone='0')
+        self.pastel = Produto.objects.create(empresa=self.empresa, nome='Pastel', preco=Decimal('8.00'), quantidade_estoque=5)
+        self.suco = Produto.objects.create(empresa=self.empresa, nome='Suco', preco=Decimal('5.00'), quantidade_estoque=2)
+
+    def saldos(self):
+        return dict(Produto.objects.filter(empresa=self.empresa).values_list('nome', 'quantidade_estoque'))
+
+    def test_saida_e_entrada_registram_movimentacoes(self):
+        pedido = Pedido.objects.create(empresa=self.empresa)
+        movimentar_estoque(self.empresa, {self.pastel.id: -3, self.suco.id: -2}, 'venda', pedido=pedido)
+        movimentar_estoque(self.empresa.id, {self.pastel.id: 1, self.suco.id: 0}, 'cancelamento', pedido=pedido)
+
+        self.assertEqual(self.saldos(), {'Pastel': 3, 'Suco': 0})
+        movimentos = MovimentacaoEstoque.objects.filter(empresa=self.empresa).values_list(
+            'produto__nome', 'tipo', 'quantidade', 'numero_pedido'
+        )
+        self.assertCountEqual(movimentos, [
+            ('Pastel', 'venda', -3, pedido.numero_pedido),
+            ('Suco', 'venda', -2, pedido.numero_pedido),
+            ('Pastel', 'cancelamento', 1, pedido.numero_pedido),
+        ])
+
+    def test_saida_sem_saldo_nao_altera_nada(self):
+        with self.assertRaises(EstoqueInsuficiente) as erro:
+            movimentar_estoque(self.empresa, {self.pastel.id: -4, self.suco.id: -3}, 'venda')
+
+        self.assertEqual(erro.exception.itens, [
+            {'produto_id': self.suco.id, 'nome': 'Suco', 'disponivel': 2, 'solicitado': 3}
+        ])
+        self.assertIn('Suco (disponível: 2, solicitado: 3)', str(erro.exception))
+        # O pastel tinha saldo, mas a saída dele também foi desfeita
+        self.assertEqual(self.saldos(), {'Pastel': 5, 'Suco': 2})
+        self.assertFalse(MovimentacaoEstoque.objects.exists())
+
+    def test_pedido_sem_estoque_nao_e_gravado(self):
+        itens = [
+            {'produto_id': self.pastel.id, 'quantidade': 2},
+            {'produto_id': self.suco.id, 'quantidade': 3}
+        ]
+        with self.assertRaises(EstoqueInsuficiente):
+            criar_pedido_completo(self.empresa, itens, cliente_nome='Ana')
+
+        self.assertFalse(Pedido.objects.exists())
+        self.assertEqual(self.saldos(), {'Pastel': 5, 'Suco': 2})
+        self.assertFalse(MovimentacaoEstoque.objects.exists())
+
+    def test_produto_de_outra_empresa_e_recusado(self):
+        outra = Empresa.objects.create(nome='Outra', cnpj='00000000000105', endereco='Rua', telefone='0')
+        with self.assertRaises(EstoqueInsuficiente):
+            movimentar_estoque(outra, {self.pastel.id: -1}, 'venda')
+        self.assertEqual(self.saldos(), {'Pastel': 5, 'Suco': 2})
+
+    @override_settings(CANTINA_PERMITIR_ESTOQUE_NEGATIVO=True)
+    def test_estoque_negativo_permitido(self):
+        movimentar_estoque(self.empresa, {self.suco.id: -3}, 'venda')
+
+        self.assertEqual(self.saldos(), {'Pastel': 5, 'Suco': -1})
+        self.assertEqual(MovimentacaoEstoque.objects.get().quantidade, -3)
+
+
+class EditarItensPedidoTest(TestCase):
+    """A edição grava só os itens alterados e o estoque recebe a diferença."""
+
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome='Cantina', cnpj='00000000000106', endereco='Rua', telefone='0')
+        self.pastel = Produto.objects.create(empresa=self.empresa, nome='Pastel', preco=Decimal('8.00'), quantidade_estoque=10)
+        self.suco = Produto.objects.create(empresa=self.empresa, nome='Suco', preco=Decimal('5.00'), quantidade_estoque=10)
+        self.coxinha = Produto.objects.create(empresa=self.empresa, nome='Coxinha', preco=Decimal('6.00'), quantidade_estoque=10)
+        self.produto_combo = Produto.objects.create(
+            empresa=self.empresa, nome='Combo', preco=Decimal('12.00'), quantidade_estoque=10
+        )
+        self.slot = ComboSlot.objects.create(combo=Combo.objects.create(produto=self.produto_combo), nome='Bebida')
+
+        self.pedido = criar_pedido_completo(self.empresa, [
+            {'produto_id': self.pastel.id, 'quantidade': 2},
+            {'produto_id': self.suco.id, 'quantidade': 1},
+            {'produto_id': self.produto_combo.id, 'quantidade': 1, 'is_combo': True,
+             'escolhas': [{'slot_id': self.slot.id, 'produto_id': self.suco.id, 'quantidade_abate': 1}]}
+        ], cliente_nome='Ana')
+        self.itens = {item.produto_id: item for item in self.pedido.itens.all()}
+
+    def saldos(self):
+        return dict(Produto.objects.filter(empresa=self.empresa).values_list('nome', 'quantidade_estoque'))
+
+    def test_venda_abate_as_escolhas_do_combo(self):
+        self.assertEqual(self.saldos(), {'Pastel': 8, 'Suco': 8, 'Coxinha': 10, 'Combo': 10})
+
+    def test_edicao_grava_a_diferenca(self):
+        pastel = self.itens[self.pastel.id]
+        combo = self.itens[self.produto_combo.id]
+        editar_itens_pedido(self.pedido, [
+            {'id': pastel.id, 'produto_id': self.pastel.id, 'quantidade': 2},       # mantido
+            {'id': combo.id, 'produto_id': self.produto_combo.id, 'quantidade': 3},  # +2 combos
+            {'produto_id': self.coxinha.id, 'quantidade': 1, 'observacoes': 'sem sal'}  # novo
+            # o suco avulso foi removido
+        ])
+
+        # Dois combos a mais consomem 2 sucos; o suco avulso removido devolve 1
+        self.assertEqual(self.saldos(), {'Pastel': 8, 'Suco': 7, 'Coxinha': 9, 'Combo': 10})
+        itens = {item.produto_id: item for item in self.pedido.itens.prefetch_related('escolhas_combo')}
+        self.assertEqual(set(itens), {self.pastel.id, self.produto_combo.id, self.coxinha.id})
+        # Itens existentes continuam os mesmos, com as escolhas do combo
+        self.assertEqual(itens[self.pastel.id].id, pastel.id)
+        self.assertEqual(itens[self.produto_combo.id].id, combo.id)
+        self.assertEqual(itens[self.produto_combo.id].subtotal, Decimal('36.00'))
+        self.assertEqual([e.produto_escolhido_id for e in itens[self.produto_combo.id].escolhas_combo.all()], [self.suco.id])
+        self.assertEqual(itens[self.coxinha.id].observacoes, 'sem sal')
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.total, Decimal('58.00'))
+
+        movimentos = MovimentacaoEstoque.objects.filter(tipo='edicao').values_list('produto__nome', 'quantidade')
+        self.assertCountEqual(movimentos, [('Suco', -1), ('Coxinha', -1)])
+
+    def test_edicao_sem_mudancas_nao_movimenta_estoque(self):
+        editar_itens_pedido(self.pedido, [
+            {'id': item.id, 'produto_id': item.produto_id, 'quantidade': item.quantidade}
+            for item in self.itens.values()
+        ])
+        self.assertFalse(MovimentacaoEstoque.objects.filter(tipo='edicao').exists())
+        self.assertEqual(self.saldos(), {'Pastel': 8, 'Suco': 8, 'Coxinha': 10, 'Combo': 10})
+
+    def test_reduzir_combo_devolve_as_escolhas(self):
+        combo = self.itens[self.produto_combo.id]
+        editar_itens_pedido(self.pedido, [
+            {'id': item.id, 'produto_id': item.produto_id, 'quantidade': item.quantidade}
+            for item in self.itens.values() if item.id != combo.id
+        ])
+        self.assertEqual(self.saldos(), {'Pastel': 8, 'Suco': 9, 'Coxinha': 10, 'Combo': 10})
+
+    def test_item_existente_nao_troca_de_produto(self):
+        itens = [
+            {'id': item.id, 'produto_id': item.produto_id, 'quantidade': item.quantidade}
+            for item in self.itens.values()
+        ]
+        itens[0]['produto_id'] = self.coxinha.id
+        with self.assertRaisesMessage(PedidoInvalido, 'é de outro produto (Pastel)'):
+            editar_itens_pedido(self.pedido, itens)
+
+        self.assertEqual({item.produto_id for item in self.pedido.itens.all()}, set(self.itens))
+        self.assertEqual(self.saldos(), {'Pastel': 8, 'Suco': 8, 'Coxinha': 10, 'Combo': 10})
+
+    def test_combo_nao_pode_ser_incluido_na_edicao(self):
+        itens = [
+            {'id': item.id, 'produto_id': item.produto_id, 'quantidade': item.quantidade}
+            for item in self.itens.values()
+        ]
+        with self.assertRaisesMessage(PedidoInvalido, 'Combos não podem ser incluídos na edição do pedido (Combo)'):
+            editar_itens_pedido(self.pedido, itens + [{'produto_id': self.produto_combo.id, 'quantidade': 1}])
+
+        self.assertEqual(self.pedido.itens.count(), 3)
+        self.assertEqual(self.saldos(), {'Pastel': 8, 'Suco': 8, 'Coxinha': 10, 'Combo': 10})
+
+
+class ConsolidacaoVendasTest(TestCase):
+    """Cada gravação aplica só a sua diferença aos resumos, que batem com a reconstrução do dia."""
+
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome='Cantina', cnpj='00000000000107', endereco='Rua', telefone='0')
+        self.pastel = Produto.objects.create(empresa=self.empresa, nome='Pastel', preco=Decimal('8.00'), quantidade_estoque=100)
+        self.suco = Produto.objects.create(empresa=self.empresa, nome='Suco', preco=Decimal('5.00'), quantidade_estoque=100)
+
+    def gravar(self, alterar):
+        with self.captureOnCommitCallbacks(execute=True):
+            return alterar()
+
+    def resumos(self):
+        vendas = VendaDiaria.objects.filter(empresa=self.empresa).exclude(total_pedidos=0, total_itens=0)
+        produtos = VendaDiariaProduto.objects.filter(empresa=self.empresa).exclude(quantidade=0)
+        return (
+            sorted(vendas.values_list('data', 'forma_pagamento', 'tipo', 'total_pedidos', 'total_vendas', 'total_itens')),
+            sorted(produtos.values_list('data', 'forma_pagamento', 'tipo', 'produto_id', 'produto_nome', 'quantidade', 'total'))
+        )
+
+    def assertResumosReconstruidos(self):
+        incrementais = self.resumos()
+        consolidar_dia(self.empresa.id, timezone.localdate())
+        self.assertEqual(incrementais, self.resumos())
+        return incrementais
+
+    def criar(self, **dados):
+        return self.gravar(lambda: criar_pedido_completo(self.empresa, [
+            {'produto_id': self.pastel.id, 'quantidade': 2},
+            {'produto_id': self.suco.id, 'quantidade': 1}
+        ], **dados))
+
+    def test_criacao_edicao_e_cancelamento(self):
+        pedido = self.criar(forma_pagamento='pix')
+        vendas, produtos = self.assertResumosReconstruidos()
+        self.assertEqual(vendas, [(timezone.localdate(), 'pix', 'balcao', 1, Decimal('21.00'), 3)])
+        self.assertEqual(len(produtos), 2)
+
+        pedido = Pedido.objects.get(id=pedido.id)
+        pastel = pedido.itens.get(produto=self.pastel)
+        self.gravar(lambda: editar_itens_pedido(pedido, [
+            {'id': pastel.id, 'quantidade': 3},
+            {'produto_id': self.pastel.id, 'quantidade': 1}
+        ]))
+        self.assertEqual(self.assertResumosReconstruidos()[0][0][3:], (1, Decimal('32.00'), 4))
+
+        # Outra forma de pagamento: o pedido e os itens mudam de linha
+        pedido = Pedido.objects.get(id=pedido.id)
+        pedido.forma_pagamento = 'dinheiro'
+        self.gravar(pedido.save)
+        self.assertEqual([linha[1] for linha in self.assertResumosReconstruidos()[1]], ['dinheiro'])
+
+        self.gravar(lambda: alterar_status(pedido, 'cancelado'))
+        self.assertEqual(self.assertResumosReconstruidos(), ([], []))
+
+    def test_itens_e_pedido_pelo_orm(self):
+        pedido = self.criar(forma_pagamento='debito', tipo='delivery')
+        item = ItemPedido.objects.get(pedido=pedido, produto=self.suco)
+
+        item.quantidade = 4
+        self.gravar(item.save)
+        self.assertResumosReconstruidos()
+
+        self.gravar(item.delete)
+        self.assertResumosReconstruidos()
+
+        self.gravar(Pedido.objects.get(id=pedido.id).delete)
+        self.assertEqual(self.assertResumosReconstruidos(), ([], []))
+
+    def test_relatorio_por_forma_de_pagamento(self):
+        self.criar(forma_pagamento='pix')
+        self.criar(forma_pagamento='dinheiro', tipo='delivery')
+        hoje = timezone.localdate()
+
+        resumo = calcular_resumo(self.empresa, hoje, hoje, {'forma_pagamento': 'pix'})
+        self.assertEqual((resumo['total_pedidos'], resumo['total_vendas']), (1, 21.0))
+        top_itens = calcular_top_itens(self.empresa, hoje, hoje, {'tipo': 'delivery'})
+        self.assertEqual([(item['nome'], item['quantidade']) for item in top_itens], [('Pastel', 2), ('Suco', 1)])
+
+    def test_status_de_instancia_desatualizada(self):
+        pedido = self.criar()
+        # Outra tela trocou a forma de pagamento depois que o pedido foi carregado
+        desatualizado = Pedido.objects.get(id=pedido.id)
+        outra_tela = Pedido.objects.get(id=pedido.id)
+        outra_tela.forma_pagamento = 'pix'
+        self.gravar(outra_tela.save)
+
+        self.gravar(lambda: alterar_status(desatualizado, 'cancelado'))
+        desatualizado.refresh_from_db()
+        self.assertEqual((desatualizado.status, desatualizado.forma_pagamento), ('cancelado', 'pix'))
+        self.assertResumosReconstruidos()
+
+    def test_status_nao_altera_resumos(self):
+        pedido = self.criar()
+        with mock.patch.object(VariacaoVendas, 'aplicar') as aplicar:
+            self.gravar(lambda: alterar_status(pedido, 'preparando'))
+            pedido.observacoes = 'sem cebola'
+            self.gravar(pedido.save)
+        aplicar.assert_not_called()
+
+
+@override_settings(DEBUG=False)
+class DashboardCaixaTest(TestCase):
+    """A página do caixa é revalidada pelo ETag e só volta inteira quando muda."""
+
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome='Cantina', cnpj='00000000000108', endereco='Rua', telefone='0')
+        self.usuario = Usuario.objects.create_user('ana', password='senha', empresa=self.empresa, tipo='admin')
+        self.client.force_login(self.usuario)
+
+    def test_pagina_sem_mudancas_responde_304(self):
+        resposta = self.client.get('/caixa/novo-pedido/')
+        self.assertEqual(resposta.status_code, 200)
+        etag = resposta['ETag']
+
+        self.assertEqual(self.client.get('/caixa/novo-pedido/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Outra aba, outra página
+        self.assertEqual(self.client.get('/caixa/estoque/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_mudancas_exibidas_na_pagina_trocam_o_etag(self):
+        etag = self.client.get('/caixa/usuarios/')['ETag']
+
+        Usuario.objects.create_user('bia', password='senha', empresa=self.empresa, tipo='caixa')
+        resposta = self.client.get('/caixa/usuarios/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertContains(resposta, 'bia')
+
+        etag = resposta['ETag']
+        Empresa.objects.filter(id=self.empresa.id).update(nome='Cantina Nova')
+        self.assertEqual(self.client.get('/caixa/usuarios/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_acesso_redirecionado_sem_etag(self):
+        operador = Usuario.objects.create_user('caio', password='senha', empresa=self.empresa, tipo='caixa')
+        self.client.force_login(operador)
+        resposta = self.client.get('/caixa/usuarios/')
+        self.assertEqual(resposta.status_code, 302)
+        self.assertFalse(resposta.has_header('ETag'))
+
+
+class ValidarSelecoesComboTest(TestCase):
+    """Todas as seleções do carrinho conferidas em uma consulta, com os erros por slot."""
+
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome='Cantina', cnpj='00000000000109', endereco='Rua', telefone='0')
+        self.lanche = Produto.objects.create(empresa=self.empresa, nome='Pastel', preco=Decimal('8.00'), quantidade_estoque=10)
+        self.suco = Produto.objects.create(empresa=self.empresa, nome='Suco', preco=Decimal('5.00'), quantidade_estoque=3)
+        self.refri = Produto.objects.create(empresa=self.empresa, nome='Refri', preco=Decimal('5.00'), quantidade_estoque=10, ativo=False)
+        self.combo, self.slot_lanche, self.slot_bebida = self.criar_combo(self.empresa, 'Combo')
+        ComboSlotItem.objects.create(slot=self.slot_lanche, produto=self.lanche)
+        ComboSlotItem.objects.create(slot=self.slot_bebida, produto=self.suco)
+        ComboSlotItem.objects.create(slot=self.slot_bebida, produto=self.refri)
+
+    def criar_combo(self, empresa, nome):
+        produto = Produto.objects.create(empresa=empresa, nome=nome, preco=Decimal('12.00'))
+        combo = Combo.objects.create(produto=produto)
+        slot_lanche = ComboSlot.objects.create(combo=combo, nome='Lanche', ordem=1)
+        slot_bebida = ComboSlot.objects.create(combo=combo, nome='Bebida', ordem=2)
+        return combo, slot_lanche, slot_bebida
+
+    def selecao(self, bebida=None, quantidade=1, combo=None):
+        return {
+            'combo_id': (combo or self.combo).id,
+            'quantidade': quantidade,
+            'escolhas': [
+                {'slot_id': self.slot_lanche.id, 'produto_id': self.lanche.id},
+                {'slot_id': self.slot_bebida.id, 'produto_id': (bebida or self.suco).id}
+            ]
+        }
+
+    def erros(self, resultado):
+        return [(erro['slot_nome'], erro['erro']) for erro in resultado['erros_slots']]
+
+    def test_consultas_nao_crescem_com_as_selecoes(self):
+        outro, slot_lanche, slot_bebida = self.criar_combo(self.empresa, 'Combo 2')
+        ComboSlotItem.objects.create(slot=slot_lanche, produto=self.lanche)
+        ComboSlotItem.objects.create(slot=slot_bebida, produto=self.suco)
+
+        with self.assertNumQueries(1):
+            resultados = validar_selecoes_combo(self.empresa.id, [self.selecao()])
+        self.assertTrue(resultados[0]['valido'])
+        self.assertEqual(
+            [(e['slot_nome'], e['produto_nome']) for e in resultados[0]['combo']['escolhas']],
+            [('Lanche', 'Pastel'), ('Bebida', 'Suco')]
+        )
+
+        selecoes = [self.selecao(), self.selecao(), {
+            'combo_id': outro.id,
+            'escolhas': [
+                {'slot_id': slot_lanche.id, 'produto_id': self.lanche.id},
+                {'slot_id': slot_bebida.id, 'produto_id': self.suco.id}
+            ]
+        }]
+        with self.assertNumQueries(1):
+            resultados = validar_selecoes_combo(self.empresa.id, selecoes)
+        self.assertTrue(all(resultado['valido'] for resultado in resultados))
+
+    def test_escolhas_invalidas_sao_apontadas_por_slot(self):
+        outro, slot_outro, _ = self.criar_combo(self.empresa, 'Combo 2')
+        selecoes = [
+            # Produto inativo
+            self.selecao(bebida=self.refri),
+            # Produto que não está no slot
+            self.selecao(bebida=self.lanche),
+            # Slot de outro combo, slot repetido e slot faltando
+            {'combo_id': self.combo.id, 'escolhas': [
+                {'slot_id': slot_outro.id, 'produto_id': self.lanche.id},
+                {'slot_id': self.slot_lanche.id, 'produto_id': self.lanche.id},
+                {'slot_id': self.slot_lanche.id, 'produto_id': self.lanche.id}
+            ]},
+            {'combo_id': self.combo.id, 'quantidade': 0, 'escolhas': []},
+            {'combo_id': self.combo.id, 'escolhas': 'suco'}
+        ]
+        resultados = validar_selecoes_combo(self.empresa.id, selecoes)
+
+        self.assertFalse(any(resultado['valido'] or resultado['combo'] for resultado in resultados))
+        self.assertEqual(self.erros(resultados[0]), [('Bebida', 'Refri está inativo')])
+        self.assertEqual(self.erros(resultados[1]), [('Bebida', 'Produto não disponível neste slot')])
+        self.assertEqual(self.erros(resultados[2]), [
+            ('', 'Slot não pertence a este combo'),
+            ('Lanche', 'Mais de uma escolha para este slot'),
+            ('Bebida', 'Slot não preenchido')
+        ])
+        self.assertEqual(resultados[3]['erro'], 'Quantidade inválida')
+        self.assertEqual(resultados[4]['erro'], 'Escolhas inválidas')
+
+    def test_combo_de_outra_empresa_nao_e_encontrado(self):
+        outra = Empresa.objects.create(nome='Outra', cnpj='00000000000110', endereco='Rua', telefone='0')
+        combo_alheio, slot_lanche, slot_bebida = self.criar_combo(outra, 'Combo alheio')
+        ComboSlotItem.objects.create(slot=slot_lanche, produto=self.lanche)
+        ComboSlotItem.objects.create(slot=slot_bebida, produto=self.suco)
+
+        resultado, = validar_selecoes_combo(self.empresa.id, [{
+            'combo_id': combo_alheio.id,
+            'escolhas': [
+                {'slot_id': slot_lanche.id, 'produto_id': self.lanche.id},
+                {'slot_id': slot_bebida.id, 'produto_id': self.suco.id}
+            ]
+        }])
+        self.assertFalse(resultado['valido'])
+        self.assertEqual(resultado['erro'], 'Combo não encontrado')
+
+        # Slots de outra empresa também não valem no combo desta
+        resultado, = validar_selecoes_combo(self.empresa.id, [{
+            'combo_id': self.combo.id,
+            'escolhas': [
+                {'slot_id': slot_lanche.id, 'produto_id': self.lanche.id},
+                {'slot_id': self.slot_bebida.id, 'produto_id': self.suco.id}
+            ]
+        }])
+        self.assertIn(('', 'Slot não pertence a este combo'), self.erros(resultado))
+
+    def test_estoque_conferido_pelo_carrinho_inteiro(self):
+        # 3 sucos em estoque: 2 + 2 combos passam do saldo
+        resultados = validar_selecoes_combo(self.empresa.id, [self.selecao(quantidade=2), self.selecao(quantidade=2)])
+        for resultado in resultados:
+            self.assertEqual(self.erros(resultado), [('Bebida', 'Estoque insuficiente para Suco')])
+
+        resultado, = validar_selecoes_combo(self.empresa.id, [self.selecao(quantidade=3)])
+        self.assertTrue(resultado['valido'])
+
+
+class PrevisaoFilaTest(TestCase):
+    """A previsão em cache acompanha o relógio numa cozinha parada."""
+
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome='Cantina', cnpj='00000000000111', endereco='Rua', telefone='0')
+        produto = Produto.objects.create(empresa=self.empresa, nome='Pastel', preco=Decimal('8.00'), tempo_preparo=10)
+        self.pedido = Pedido.objects.create(empresa=self.empresa, total=Decimal('8.00'))
+        ItemPedido.objects.create(pedido=self.pedido, produto=produto, quantidade=1, preco_unitario=Decimal('8.00'))
+
+    def test_pendente_parado_nao_fica_no_passado(self):
+        # Meio do dia: o cache da base também é separado por dia
+        inicio = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        with mock.patch('django.utils.timezone.now', return_value=inicio):
+            pronto_em = obter_previsao(self.empresa.id)['pedidos'][self.pedido.id]['pronto_em']
+        self.assertEqual(pronto_em, inicio + timedelta(minutes=10))
+
+        # Meia hora sem mudanças: a base vem do cache e a fila começa agora
+        depois = inicio + timedelta(minutes=30)
+        with mock.patch('django.utils.timezone.now', return_value=depois), self.assertNumQueries(0):
+            previsao = obter_previsao(self.empresa.id)
+        self.assertEqual(previsao['pedidos'][self.pedido.id]['pronto_em'], depois + timedelta(minutes=10))
+        self.assertEqual(previsao['fila']['livre_em'], depois + timedelta(minutes=10))
@@ -26,6 +26,7 @@ urlpatterns = [
     path('combo/configurar/<int:produto_id>/', views.configurar_combo, name='configurar_combo_produto'),
     path('combo/<int:combo_id>/opcoes/', views.obter_opcoes_combo, name='obter_opcoes_combo'),
     path('combo/adicionar-pedido/', views.adicionar_combo_pedido, name='adicionar_combo_pedido'),
+    path('combo/validar/', views.validar_combos, name='validar_combos'),
     path('combo/produtos/', views.listar_produtos_para_combo, name='listar_produtos_para_combo'),
     
     # URLs para gerenciamento de categorias
@@ -42,8 +43,12 @@ urlpatterns = [
     path('produto/<int:produto_id>/excluir/', views.excluir_produto, name='excluir_produto'),
     
     # URL para API de pedidos ativos
+    path('api/abas/<str:aba>/', views.api_dados_aba, name='api_dados_aba'),
     path('api/pedidos-ativos/', views.api_pedidos_ativos, name='api_pedidos_ativos'),
+    path('api/pedidos-eventos/', views.api_eventos_pedidos, name='api_eventos_pedidos'),
+    path('tela-cliente/', views.publicar_tela_cliente, name='publicar_tela_cliente'),
     
     # URL para dados de relatórios
     path('relatorios/dados/', views.relatorios_dados, name='relatorios_dados'),
+    path('relatorios/exportar/', views.relatorios_exportar, name='relatorios_exportar'),
 ]
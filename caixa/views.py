@@ -1,118 +1,135 @@
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.template.loader import get_template
+from django.templatetags.static import static
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.views.decorators.http import condition
+from django.db import transaction
 from django.db.models import Sum
 from django.utils import timezone
-from .models import Pedido, ItemPedido, Produto, Categoria, Combo, ComboSlot, ComboSlotItem, PedidoComboEscolha
+from .models import Pedido, ItemPedido, Produto, Categoria, Combo, ComboSlot, ComboSlotItem, PedidoComboEscolha, TempoPreparoProduto
+from .eventos import obter_canal, stream_eventos_async
+from .pedidos import criar_pedido_completo, editar_itens_pedido, alterar_status, PedidoInvalido
+from .estoque import movimentar_estoque, ajustar_estoque, consumo_do_pedido, EstoqueInsuficiente
+from .relatorios import (
+    periodo_do_filtro, filtros_do_relatorio, pedidos_do_periodo, calcular_resumo, calcular_top_itens, pagina_historico,
+    exportar_csv, exportar_json, TAMANHO_PAGINA_HISTORICO, TAMANHO_MAXIMO_PAGINA
+)
+from .combos import validar_selecoes_combo
+from .catalogo import obter_catalogo, produtos_do_catalogo, obter_opcoes_do_combo, etag_catalogo
+from .tempos_preparo import resumo_tempo_medido
+from .telas_cliente import publicar_tela, publicar_pedido_na_tela, TelaInvalida
+from .pedidos_ativos import consultar_pedidos_ativos, serializar_pedido_ativo, obter_snapshot_pedidos, obter_estatisticas_pedidos
+from .sincronizacao import etag_pedidos, ultima_modificacao_pedidos, ler_cursor, gerar_cursor, filtrar_alterados
 from decimal import Decimal
 import json
 
+TEMPLATES_DASHBOARD = ('base.html', 'caixa/dashboard.html')
+
+# Abas que o operador de caixa não acessa
+ABAS_RESTRITAS = ['configuracoes', 'usuarios']
+
+
+@lru_cache(maxsize=None)
+def _versao_templates_dashboard():
+    """Resumo do código das templates do dashboard, lido uma vez por processo (muda a cada deploy)."""
+    conteudo = hashlib.sha1()
+    for nome in TEMPLATES_DASHBOARD:
+        conteudo.update(Path(get_template(nome).origin.name).read_bytes())
+    return conteudo.hexdigest()
+
+
+def _usuarios_da_empresa(request):
+    """Usuários da aba Usuários, lidos uma vez por requisição (ETag e página)."""
+    if not hasattr(request, '_usuarios_empresa'):
+        request._usuarios_empresa = list(request.user.empresa.usuarios.all())
+    return request._usuarios_empresa
+
+
+def etag_dashboard(request, aba='novo-pedido'):
+    """
+    ETag da página do caixa: templates, aba e o pouco que ela traz do
+    servidor (usuário, empresa e a lista de usuários da aba Usuários).
+    Em DEBUG as templates mudam sem reiniciar o processo, então não há ETag.
+    """
+    usuario = request.user
+    # Acessos redirecionados pela view não recebem ETag
+    if settings.DEBUG or usuario.tipo == 'cozinha' or (usuario.tipo == 'caixa' and aba in ABAS_RESTRITAS):
+        return None
+    empresa = usuario.empresa
+    dados = [
+        _versao_templates_dashboard(),
+        [static('js/caixa.js'), static('css/pedidos-ativos.css'), static('css/style.css'), static('js/main.js')],
+        aba, request.scheme, request.get_host(),
+        usuario.id, usuario.username, usuario.tipo,
+        empresa.id, empresa.nome, empresa.token_painel,
+        [(u.id, u.username, u.email, u.tipo, u.is_active) for u in _usuarios_da_empresa(request)]
+    ]
+    return hashlib.sha1(repr(dados).encode()).hexdigest()
+
+
 @login_required
+@condition(etag_func=etag_dashboard)
 def caixa_dashboard(request, aba='novo-pedido'):
     # Controle de acesso: usuário tipo "cozinha" não pode acessar
     if request.user.tipo == 'cozinha':
         return redirect('cozinha_dashboard')
     
     # Controle de acesso: operador de caixa não pode acessar abas restritas
-    if request.user.tipo == 'caixa' and aba in ['configuracoes', 'usuarios']:
+    if request.user.tipo == 'caixa' and aba in ABAS_RESTRITAS:
         return redirect('caixa_novo_pedido')
     
-    empresa = request.user.empresa
-    categorias = Categoria.objects.filter(empresa=empresa, ativo=True)
-    
-    # Mostrar todos os produtos na aba "Cardápio do Dia" para gerenciar disponibilidade
-    todos_produtos_raw = Produto.objects.filter(empresa=empresa).select_related('categoria')
-    todos_produtos = ordenar_produtos_customizado(todos_produtos_raw)
-    
-    # Apenas produtos ativos para venda na aba "Novo Pedido"
-    produtos_disponiveis_raw = Produto.objects.filter(empresa=empresa, ativo=True).select_related('categoria')
-    produtos_disponiveis = ordenar_produtos_customizado(produtos_disponiveis_raw)
-    
-    # PADRONIZADO: Mesma query da cozinha (pendente, preparando, pronto)
-    pedidos_abertos = Pedido.objects.filter(
-        empresa=empresa, 
-        status__in=['pendente', 'preparando', 'pronto']
-    ).order_by('criado_em').prefetch_related('itens__produto')
-    
-    # Calcular estatísticas iniciais
-    total_pendente = pedidos_abertos.filter(status='pendente').count()
-    total_preparando = pedidos_abertos.filter(status='preparando').count()
-    total_pronto = pedidos_abertos.filter(status='pronto').count()
-    
-    # Calcular tempo médio dos pedidos entregues hoje
-    from datetime import timedelta
-    hoje = timezone.now().date()
-    pedidos_entregues_hoje = Pedido.objects.filter(
-        empresa=empresa,
-        status='entregue',
-        atualizado_em__date=hoje
-    )
-    
-    tempo_medio_segundos = 0
-    if pedidos_entregues_hoje.exists():
-        tempos = []
-        for pedido in pedidos_entregues_hoje:
-            tempo_decorrido = (pedido.atualizado_em - pedido.criado_em).total_seconds()
-            if tempo_decorrido <= 7200:  # Ignorar > 2h
-                tempos.append(tempo_decorrido)
-        
-        if tempos:
-            tempo_medio_segundos = int(sum(tempos) / len(tempos))
-    
-    context = {
-        'categorias': categorias,
-        'todos_produtos': todos_produtos,
-        'produtos': produtos_disponiveis,
-        'pedidos_abertos': pedidos_abertos,
+    # Apenas a estrutura da página: produtos, pedidos e estatísticas de cada
+    # aba chegam por JSON (api_dados_aba, api_pedidos_ativos) ao abrir a aba
+    response = render(request, 'caixa/dashboard.html', {
         'aba_ativa': aba,
-        'estatisticas': {
-            'total_pendente': total_pendente,
-            'total_preparando': total_preparando,
-            'total_pronto': total_pronto,
-            'tempo_medio_segundos': tempo_medio_segundos
-        }
-    }
-    
-    response = render(request, 'caixa/dashboard.html', context)
+        'usuarios': _usuarios_da_empresa(request)
+    })
     
-    # Desabilitar cache para forçar reload do template
-    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response['Pragma'] = 'no-cache'
-    response['Expires'] = '0'
+    # O navegador guarda a página e revalida a cada acesso (304 pelo ETag)
+    response['Cache-Control'] = 'private, no-cache'
     
     return response
 
 
-def ordenar_produtos_customizado(produtos_queryset):
+# Abas com produtos e se mostram apenas os ativos (as categorias dos filtros
+# vêm de listar_categorias)
+ABAS_COM_PRODUTOS = {
+    'novo-pedido': True,
+    'cardapio': False,
+    'estoque': False
+}
+
+
+@login_required
+@condition(etag_func=etag_catalogo)
+def api_dados_aba(request, aba):
     """
-    Ordena produtos: Combos primeiro, Bebidas penúltimo, Sobremesas último.
-    Dentro de cada grupo, ordena alfabeticamente por nome.
+    Dados de uma aba do dashboard do caixa, buscados pelo navegador na
+    primeira vez que a aba é aberta (a página em si não traz produtos).
+    Sem mudanças no catálogo responde 304 pelo ETag.
     """
-    produtos_combo = []
-    produtos_outros = []
-    produtos_bebidas = []
-    produtos_sobremesas = []
-    
-    for produto in produtos_queryset:
-        categoria_nome = produto.categoria.nome.lower() if produto.categoria else ''
-        
-        if produto.categoria and produto.categoria.is_sistema:  # Combo
-            produtos_combo.append(produto)
-        elif 'sobremesa' in categoria_nome:
-            produtos_sobremesas.append(produto)
-        elif 'bebida' in categoria_nome:
-            produtos_bebidas.append(produto)
-        else:
-            produtos_outros.append(produto)
+    if request.user.tipo == 'cozinha':
+        return JsonResponse({'success': False, 'error': 'Acesso negado'}, status=403)
+    if aba not in ABAS_COM_PRODUTOS:
+        return JsonResponse({'success': False, 'error': 'Aba sem dados'}, status=404)
     
-    # Ordenar cada grupo por nome
-    produtos_combo.sort(key=lambda p: p.nome)
-    produtos_outros.sort(key=lambda p: p.nome)
-    produtos_bebidas.sort(key=lambda p: p.nome)
-    produtos_sobremesas.sort(key=lambda p: p.nome)
+    catalogo = obter_catalogo(request.user.empresa_id)
     
-    # Concatenar na ordem desejada
-    return produtos_combo + produtos_outros + produtos_bebidas + produtos_sobremesas
+    response = JsonResponse({
+        'success': True,
+        'produtos': produtos_do_catalogo(catalogo, apenas_ativos=ABAS_COM_PRODUTOS[aba])
+    })
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 
 @login_required
 def criar_pedido(request):
@@ -151,68 +168,33 @@ def criar_pedido(request):
                     'error': 'A forma de pagamento é obrigatória'
                 })
             
-            pedido = Pedido.objects.create(
-                empresa=empresa,
-                tipo=data.get('tipo', 'balcao'),
-                cliente_nome=cliente_nome,
-                cliente_telefone=data.get('cliente_telefone', ''),
-                mesa=data.get('mesa', ''),
-                forma_pagamento=forma_pagamento,
-                observacoes=data.get('observacoes', ''),
-                operador=request.user
-            )
-            
-            total = Decimal('0.00')
-            for item in itens:
-                try:
-                    produto = Produto.objects.get(id=item['produto_id'])
-                except Produto.DoesNotExist:
-                    pedido.delete()  # Deletar pedido criado
-                    return JsonResponse({
-                        'success': False,
-                        'error': f'Produto com ID {item["produto_id"]} não encontrado. Por favor, atualize a página.'
-                    })
-                
-                item_pedido = ItemPedido.objects.create(
-                    pedido=pedido,
-                    produto=produto,
-                    quantidade=item['quantidade'],
-                    preco_unitario=produto.preco,
-                    observacoes=item.get('observacoes', '')
+            # Itens, escolhas de combo e estoque gravados em uma única transação
+            try:
+                pedido = criar_pedido_completo(
+                    empresa, itens,
+                    tipo=data.get('tipo', 'balcao'),
+                    cliente_nome=cliente_nome,
+                    cliente_telefone=data.get('cliente_telefone', ''),
+                    mesa=data.get('mesa', ''),
+                    forma_pagamento=forma_pagamento,
+                    observacoes=data.get('observacoes', ''),
+                    operador=request.user
                 )
-                total += item_pedido.subtotal
-                
-                # Se for combo, processar escolhas e abater estoque
-                if item.get('is_combo') and item.get('escolhas'):
-                    for escolha in item['escolhas']:
-                        try:
-                            # Criar registro de escolha
-                            slot = ComboSlot.objects.get(id=escolha['slot_id'])
-                            produto_escolhido = Produto.objects.get(id=escolha['produto_id'])
-                        except (ComboSlot.DoesNotExist, Produto.DoesNotExist):
-                            pedido.delete()  # Deletar pedido criado
-                            return JsonResponse({
-                                'success': False,
-                                'error': f'Item do combo não encontrado (Slot ID: {escolha.get("slot_id")}, Produto ID: {escolha.get("produto_id")}). Por favor, atualize a página.'
-                            })
-                        
-                        PedidoComboEscolha.objects.create(
-                            item_pedido=item_pedido,
-                            slot=slot,
-                            produto_escolhido=produto_escolhido,
-                            quantidade_abatida=escolha['quantidade_abate']
-                        )
-                        
-                        # Abater estoque do produto escolhido
-                        produto_escolhido.quantidade_estoque -= int(escolha['quantidade_abate']) * item['quantidade']
-                        produto_escolhido.save()
-                else:
-                    # Produto normal - abater estoque
-                    produto.quantidade_estoque -= item['quantidade']
-                    produto.save()
-            
-            pedido.total = total
-            pedido.save()
+            except PedidoInvalido as e:
+                return JsonResponse({
+                    'success': False,
+                    'error': str(e)
+                })
+            except EstoqueInsuficiente as e:
+                return JsonResponse({
+                    'success': False,
+                    'error': str(e),
+                    'itens_sem_estoque': e.itens
+                })
+            
+            # Tela do cliente pareada com este caixa mostra o pedido criado
+            if data.get('terminal'):
+                publicar_pedido_na_tela(empresa.id, data['terminal'], pedido)
             
             return JsonResponse({
                 'success': True,
@@ -299,24 +281,17 @@ def editar_pedido(request):
             pedido.forma_pagamento = forma_pagamento
             pedido.observacoes = data.get('observacoes', '')
             
-            # Deletar itens antigos
-            pedido.itens.all().delete()
-            
-            # Adicionar novos itens
-            total = Decimal('0.00')
-            for item in itens:
-                produto = Produto.objects.get(id=item['produto_id'])
-                item_pedido = ItemPedido.objects.create(
-                    pedido=pedido,
-                    produto=produto,
-                    quantidade=item['quantidade'],
-                    preco_unitario=produto.preco,
-                    observacoes=item.get('observacoes', '')
-                )
-                total += item_pedido.subtotal
-            
-            pedido.total = total
-            pedido.save()
+            # Só os itens alterados são gravados; o estoque recebe a diferença
+            try:
+                editar_itens_pedido(pedido, itens, usuario=request.user)
+            except PedidoInvalido as e:
+                return JsonResponse({'success': False, 'error': str(e)})
+            except EstoqueInsuficiente as e:
+                return JsonResponse({
+                    'success': False,
+                    'error': str(e),
+                    'itens_sem_estoque': e.itens
+                })
             
             return JsonResponse({
                 'success': True,
@@ -329,20 +304,22 @@ def editar_pedido(request):
     return JsonResponse({'success': False, 'error': 'Método não permitido'})
 
 @login_required
+@condition(etag_func=etag_catalogo)
 def listar_produtos(request):
-    empresa = request.user.empresa
     categoria_id = request.GET.get('categoria')
-    
-    produtos = Produto.objects.filter(empresa=empresa, ativo=True)
-    if categoria_id:
-        produtos = produtos.filter(categoria_id=categoria_id)
+    catalogo = obter_catalogo(request.user.empresa_id)
+    produtos = produtos_do_catalogo(
+        catalogo,
+        apenas_ativos=True,
+        categoria_id=int(categoria_id) if categoria_id and categoria_id.isdigit() else None
+    )
     
     data = [{
-        'id': p.id,
-        'nome': p.nome,
-        'descricao': p.descricao,
-        'preco': str(p.preco),
-        'categoria': p.categoria.nome if p.categoria else ''
+        'id': p['id'],
+        'nome': p['nome'],
+        'descricao': p['descricao'],
+        'preco': p['preco'],
+        'categoria': p['categoria']
     } for p in produtos]
     
     return JsonResponse({'produtos': data})
@@ -390,23 +367,20 @@ def alterar_status_pedido(request):
             pedido_id = data.get('pedido_id')
             novo_status = data.get('status')
             
-            # Validar status
-            status_validos = ['pendente', 'preparando', 'pronto', 'entregue', 'cancelado']
-            if novo_status not in status_validos:
-                return JsonResponse({
-                    'success': False,
-                    'error': 'Status inválido'
-                })
-            
-            # Buscar e atualizar pedido
+            # Buscar e atualizar pedido (a transição fica no histórico de status)
             pedido = get_object_or_404(Pedido, id=pedido_id, empresa=request.user.empresa)
-            pedido.status = novo_status
-            pedido.save()
+            # Os terminais são avisados pelo sinal do pedido (caixa/signals.py)
+            alterar_status(pedido, novo_status, request.user)
             
             return JsonResponse({
                 'success': True,
                 'message': 'Status atualizado com sucesso!'
             })
+        except PedidoInvalido as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            })
         except Exception as e:
             return JsonResponse({
                 'success': False,
@@ -426,7 +400,7 @@ def atualizar_disponibilidade_produto(request):
             # Buscar e atualizar produto
             produto = get_object_or_404(Produto, id=produto_id, empresa=request.user.empresa)
             produto.ativo = disponivel
-            produto.save()
+            produto.save(update_fields=['ativo'])
             
             return JsonResponse({
                 'success': True,
@@ -456,6 +430,7 @@ def buscar_produto(request, produto_id):
                 'categoria': produto.categoria.id if produto.categoria else '',
                 'categoria_nome': produto.categoria.nome if produto.categoria else '',
                 'tempo_preparo': produto.tempo_preparo,
+                'tempo_preparo_medido': resumo_tempo_medido(TempoPreparoProduto.objects.filter(produto=produto).first()),
                 'ativo': produto.ativo,
                 'imagem': produto.imagem.url if produto.imagem else None
             }
@@ -504,7 +479,6 @@ def criar_produto_item(request):
                 nome=nome,
                 descricao=request.POST.get('descricao', ''),
                 preco=preco_decimal,
-                quantidade_estoque=int(request.POST.get('quantidade_estoque', 0)),
                 categoria=categoria,
                 tempo_preparo=int(request.POST.get('tempo_preparo', 15)),
                 ativo=request.POST.get('ativo', 'false').lower() == 'true'
@@ -513,7 +487,10 @@ def criar_produto_item(request):
             # Adicionar imagem se foi enviada
             if 'imagem' in request.FILES:
                 produto.imagem = request.FILES['imagem']
-                produto.save()
+                produto.save(update_fields=['imagem'])
+            
+            # Estoque inicial entra como ajuste manual
+            ajustar_estoque(produto, int(request.POST.get('quantidade_estoque', 0)), usuario=request.user)
             
             return JsonResponse({
                 'success': True,
@@ -557,7 +534,7 @@ def editar_produto_item(request):
             produto.nome = nome
             produto.descricao = request.POST.get('descricao', '')
             produto.preco = preco_decimal
-            produto.quantidade_estoque = int(request.POST.get('quantidade_estoque', 0))
+            nova_quantidade = int(request.POST.get('quantidade_estoque', 0))
             produto.tempo_preparo = int(request.POST.get('tempo_preparo', 15))
             produto.ativo = request.POST.get('ativo', 'false').lower() == 'true'
             
@@ -572,7 +549,24 @@ def editar_produto_item(request):
             if 'imagem' in request.FILES:
                 produto.imagem = request.FILES['imagem']
             
-            produto.save()
+            # O saldo é gravado à parte e registrado como ajuste. Com o saldo
+            # exibido no formulário, aplica só a diferença digitada para não
+            # desfazer vendas feitas enquanto o formulário estava aberto
+            quantidade_anterior = request.POST.get('quantidade_estoque_anterior', '')
+            try:
+                with transaction.atomic():
+                    produto.save(update_fields=[
+                        'nome', 'descricao', 'preco', 'tempo_preparo', 'ativo', 'categoria', 'imagem'
+                    ])
+                    if quantidade_anterior != '':
+                        movimentar_estoque(
+                            produto.empresa, {produto.id: nova_quantidade - int(quantidade_anterior)},
+                            'ajuste', usuario=request.user
+                        )
+                    else:
+                        ajustar_estoque(produto, nova_quantidade, usuario=request.user)
+            except EstoqueInsuficiente as e:
+                return JsonResponse({'success': False, 'error': str(e)})
             
             return JsonResponse({
                 'success': True,
@@ -693,70 +687,28 @@ def obter_opcoes_combo(request, combo_id):
     """
     Retorna opções disponíveis para cada slot do combo.
     Usado para popular o modal de seleção no PDV.
+    
+    As opções (slots, itens, produtos ativos e estoque) ficam em cache até a
+    próxima alteração do catálogo ou do estoque (ver caixa/catalogo.py).
     """
     import logging
     logger = logging.getLogger(__name__)
     
     try:
-        logger.info(f"=== OBTER OPÇÕES DO COMBO {combo_id} ===")
-        combo = get_object_or_404(Combo, id=combo_id, produto__empresa=request.user.empresa)
-        logger.info(f"Combo encontrado: {combo.produto.nome}")
+        opcoes = obter_opcoes_do_combo(request.user.empresa_id, combo_id)
+        if opcoes is None:
+            return JsonResponse({'success': False, 'error': 'Combo não encontrado'}, status=404)
         
         # Validar integridade do combo
-        valido, mensagem = combo.validar_integridade()
-        if not valido:
-            logger.error(f"Combo inválido: {mensagem}")
-            return JsonResponse({'success': False, 'error': mensagem})
-        
-        slots_data = []
-        slots = combo.obter_slots_ordenados()
-        logger.info(f"Total de slots: {slots.count()}")
-        
-        for slot in slots:
-            logger.info(f"Processando slot: {slot.nome} (ID: {slot.id})")
-            itens_data = []
-            
-            # MUDANÇA: Buscar TODOS os itens, não apenas os ativos
-            itens = slot.itens.all()
-            logger.info(f"  Total de itens no slot: {itens.count()}")
-            
-            for item in itens:
-                # Verificar se o produto está ativo
-                produto_ativo = item.produto.ativo
-                
-                # Verificar estoque apenas se o produto estiver ativo
-                tem_estoque = item.validar_estoque_disponivel() if produto_ativo else False
-                
-                logger.info(f"    Item: {item.produto.nome} - Ativo: {produto_ativo} - Estoque: {item.produto.quantidade_estoque} - Tem estoque suficiente: {tem_estoque}")
-                
-                itens_data.append({
-                    'produto_id': item.produto.id,
-                    'nome': item.produto.nome,
-                    'quantidade_abate': float(item.quantidade_abate),
-                    'estoque_disponivel': item.produto.quantidade_estoque,
-                    'produto_ativo': produto_ativo,
-                    'tem_estoque_suficiente': tem_estoque
-                })
-            
-            if len(itens_data) == 0:
-                logger.warning(f"  ⚠️ Slot '{slot.nome}' não tem itens!")
-            
-            slots_data.append({
-                'id': slot.id,
-                'nome': slot.nome,
-                'emoji': slot.emoji,
-                'ordem': slot.ordem,
-                'itens': itens_data
-            })
-        
-        logger.info(f"Retornando {len(slots_data)} slots com total de itens")
+        if opcoes['erro']:
+            return JsonResponse({'success': False, 'error': opcoes['erro']})
         
         return JsonResponse({
             'success': True,
-            'combo_id': combo.id,
-            'nome': combo.produto.nome,
-            'preco': float(combo.produto.preco),
-            'slots': slots_data
+            'combo_id': opcoes['combo_id'],
+            'nome': opcoes['nome'],
+            'preco': opcoes['preco'],
+            'slots': opcoes['slots']
         })
     except Exception as e:
         logger.error(f"Erro ao obter opções do combo: {str(e)}", exc_info=True)
@@ -771,67 +723,48 @@ def adicionar_combo_pedido(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            combo_id = data.get('combo_id')
-            escolhas = data.get('escolhas', [])
-            
-            combo = get_object_or_404(Combo, id=combo_id, produto__empresa=request.user.empresa)
-            
-            # Validar que todos os slots foram preenchidos
-            slots_combo = combo.slots.all()
-            if len(escolhas) != slots_combo.count():
+            resultado = validar_selecoes_combo(request.user.empresa_id, [data])[0]
+            if not resultado['valido']:
                 return JsonResponse({
                     'success': False,
-                    'error': 'Todos os slots devem ser preenchidos'
+                    'error': resultado['erro'] or resultado['erros_slots'][0]['erro'],
+                    'erros_slots': resultado['erros_slots']
                 })
-            
-            # Validar estoque disponível
-            for escolha in escolhas:
-                slot = get_object_or_404(ComboSlot, id=escolha['slot_id'])
-                item = get_object_or_404(ComboSlotItem, slot=slot, produto_id=escolha['produto_id'])
-                
-                if not item.validar_estoque_disponivel():
-                    return JsonResponse({
-                        'success': False,
-                        'error': f'Estoque insuficiente para {item.produto.nome}'
-                    })
-            
+
             # Retornar dados para adicionar ao carrinho (o abate de estoque será feito ao finalizar o pedido)
-            escolhas_detalhes = []
-            for escolha in escolhas:
-                try:
-                    slot = ComboSlot.objects.get(id=escolha['slot_id'])
-                    produto = Produto.objects.get(id=escolha['produto_id'])
-                    item = ComboSlotItem.objects.get(slot=slot, produto=produto)
-                except (ComboSlot.DoesNotExist, Produto.DoesNotExist, ComboSlotItem.DoesNotExist) as e:
-                    return JsonResponse({
-                        'success': False,
-                        'error': f'Item do combo não encontrado. Por favor, atualize a página.'
-                    })
-                
-                escolhas_detalhes.append({
-                    'slot_id': slot.id,
-                    'slot_nome': slot.nome,
-                    'produto_id': produto.id,
-                    'produto_nome': produto.nome,
-                    'quantidade_abate': float(item.quantidade_abate)
-                })
-            
-            return JsonResponse({
-                'success': True,
-                'combo': {
-                    'produto_id': combo.produto.id,  # ID do produto, não do combo
-                    'combo_id': combo.id,  # ID do combo para referência
-                    'nome': combo.produto.nome,
-                    'preco': float(combo.produto.preco),
-                    'escolhas': escolhas_detalhes
-                }
-            })
+            return JsonResponse({'success': True, 'combo': resultado['combo']})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     
     return JsonResponse({'success': False, 'error': 'Método não permitido'})
 
 
+@login_required
+def validar_combos(request):
+    """
+    Valida as escolhas de vários combos de uma vez (ex.: o carrinho inteiro).
+    Recebe ``{'combos': [{'combo_id', 'quantidade', 'escolhas'}]}`` e devolve
+    o resultado de cada combo, com os erros por slot.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método não permitido'})
+
+    try:
+        data = json.loads(request.body)
+        selecoes = data.get('combos')
+        if not isinstance(selecoes, list) or not all(isinstance(selecao, dict) for selecao in selecoes):
+            return JsonResponse({'success': False, 'error': 'Informe a lista de combos'})
+
+        resultados = validar_selecoes_combo(request.user.empresa_id, selecoes)
+        return JsonResponse({
+            'success': True,
+            'valido': all(resultado['valido'] for resultado in resultados),
+            'combos': resultados
+        })
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+
 @login_required
 def listar_produtos_para_combo(request):
     """
@@ -853,6 +786,20 @@ def listar_produtos_para_combo(request):
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
+def _ler_ordem_exibicao(data):
+    """Retorna ``(ordem, erro)`` do campo ``ordem_exibicao`` (None se ausente ou vazio)."""
+    valor = data.get('ordem_exibicao')
+    if valor in (None, ''):
+        return None, None
+    try:
+        ordem = int(valor)
+    except (TypeError, ValueError):
+        return None, 'Ordem de exibição inválida'
+    if not 0 <= ordem <= 32767:
+        return None, 'Ordem de exibição deve estar entre 0 e 32767'
+    return ordem, None
+
+
 @login_required
 def listar_categorias(request):
     """
@@ -862,7 +809,7 @@ def listar_categorias(request):
         categorias = Categoria.objects.filter(
             empresa=request.user.empresa,
             ativo=True
-        ).values('id', 'nome', 'emoji', 'is_sistema').order_by('nome')
+        ).values('id', 'nome', 'emoji', 'is_sistema', 'ordem_exibicao').order_by('ordem_exibicao', 'nome')
         
         return JsonResponse({
             'success': True,
@@ -886,6 +833,11 @@ def criar_categoria(request):
             if not nome:
                 return JsonResponse({'success': False, 'error': 'Nome é obrigatório'})
             
+            # Sem ordem informada, a posição é definida pelo nome (ordem_exibicao_padrao)
+            ordem_exibicao, erro = _ler_ordem_exibicao(data)
+            if erro:
+                return JsonResponse({'success': False, 'error': erro})
+            
             # Verificar se já existe categoria com esse nome
             if Categoria.objects.filter(empresa=request.user.empresa, nome=nome).exists():
                 return JsonResponse({'success': False, 'error': 'Já existe uma categoria com este nome'})
@@ -895,7 +847,8 @@ def criar_categoria(request):
                 empresa=request.user.empresa,
                 nome=nome,
                 emoji=emoji,
-                ativo=True
+                ativo=True,
+                ordem_exibicao=ordem_exibicao
             )
             
             return JsonResponse({
@@ -903,7 +856,8 @@ def criar_categoria(request):
                 'categoria': {
                     'id': categoria.id,
                     'nome': categoria.nome,
-                    'emoji': categoria.emoji
+                    'emoji': categoria.emoji,
+                    'ordem_exibicao': categoria.ordem_exibicao
                 }
             })
         except Exception as e:
@@ -986,6 +940,12 @@ def editar_categoria(request, categoria_id):
             if 'emoji' in data:
                 categoria.emoji = data['emoji']
             
+            # Atualizar posição no cardápio se fornecida (null volta à posição pelo nome)
+            if 'ordem_exibicao' in data:
+                categoria.ordem_exibicao, erro = _ler_ordem_exibicao(data)
+                if erro:
+                    return JsonResponse({'success': False, 'error': erro})
+            
             categoria.save()
             
             return JsonResponse({
@@ -993,7 +953,8 @@ def editar_categoria(request, categoria_id):
                 'categoria': {
                     'id': categoria.id,
                     'nome': categoria.nome,
-                    'emoji': categoria.emoji
+                    'emoji': categoria.emoji,
+                    'ordem_exibicao': categoria.ordem_exibicao
                 }
             })
         except Exception as e:
@@ -1019,31 +980,18 @@ def excluir_pedido(request):
             
             # Guardar informações para a mensagem
             numero_pedido = pedido.numero_pedido
-            total_itens = 0
+            total_itens = sum(item.quantidade for item in pedido.itens.all())
             
-            # Devolver itens ao estoque
-            for item in pedido.itens.all():
-                produto = item.produto
-                quantidade_devolver = item.quantidade
-                
-                # Devolver ao estoque
-                produto.quantidade_estoque += quantidade_devolver
-                produto.save()
-                
-                total_itens += quantidade_devolver
-            
-            # Verificar se há escolhas de combo para devolver ao estoque
-            escolhas_combo = PedidoComboEscolha.objects.filter(item_pedido__pedido=pedido)
-            for escolha in escolhas_combo:
-                produto_escolhido = escolha.produto_escolhido
-                quantidade_devolver = escolha.quantidade_abatida
+            with transaction.atomic():
+                # Devolver ao estoque o que o pedido abateu (combos: produtos escolhidos)
+                movimentar_estoque(
+                    pedido.empresa, consumo_do_pedido(pedido), 'cancelamento',
+                    pedido=pedido, usuario=request.user
+                )
                 
-                # Devolver ao estoque
-                produto_escolhido.quantidade_estoque += quantidade_devolver
-                produto_escolhido.save()
-            
-            # Excluir o pedido (cascade vai excluir itens e escolhas automaticamente)
-            pedido.delete()
+                # Excluir o pedido (cascade vai excluir itens e escolhas automaticamente);
+                # o sinal de exclusão avisa os terminais
+                pedido.delete()
             
             return JsonResponse({
                 'success': True,
@@ -1067,7 +1015,7 @@ def toggle_ativo_produto(request, produto_id):
             
             # Toggle do status ativo
             produto.ativo = not produto.ativo
-            produto.save()
+            produto.save(update_fields=['ativo'])
             
             status = 'ativado' if produto.ativo else 'inativado'
             
@@ -1158,212 +1106,156 @@ def excluir_produto(request, produto_id):
 
 
 @login_required
+@condition(etag_func=etag_pedidos, last_modified_func=ultima_modificacao_pedidos)
 def api_pedidos_ativos(request):
     """
     API para retornar pedidos ativos em tempo real (JSON)
     Usada pelo frame de pedidos ativos no caixa
-    """
-    from datetime import timedelta
     
+    Com ``?since=<cursor>`` retorna apenas os pedidos alterados e os IDs
+    removidos desde a consulta que devolveu o cursor. Sem mudanças na
+    empresa, responde 304 pelo ETag antes de consultar os pedidos.
+    """
     empresa = request.user.empresa
     
-    pedidos_ativos = Pedido.objects.filter(
-        empresa=empresa,
-        status__in=['pendente', 'preparando', 'pronto']
-    ).order_by('criado_em').prefetch_related('itens__produto')
-    
-    # Calcular estatísticas
-    total_pendente = pedidos_ativos.filter(status='pendente').count()
-    total_preparando = pedidos_ativos.filter(status='preparando').count()
-    total_pronto = pedidos_ativos.filter(status='pronto').count()
-    
-    # Calcular tempo médio dos pedidos ENTREGUES HOJE
-    hoje = timezone.now().date()
-    pedidos_entregues_hoje = Pedido.objects.filter(
-        empresa=empresa,
-        status='entregue',
-        atualizado_em__date=hoje
-    )
-    
-    tempo_medio_segundos = 0
-    if pedidos_entregues_hoje.exists():
-        tempos = []
-        for pedido in pedidos_entregues_hoje:
-            tempo_decorrido = (pedido.atualizado_em - pedido.criado_em).total_seconds()
-            if tempo_decorrido <= 7200:  # Ignorar pedidos > 2h
-                tempos.append(tempo_decorrido)
-        
-        if tempos:
-            tempo_medio_segundos = sum(tempos) / len(tempos)
+    # Lidos antes da consulta: mudanças durante a montagem do snapshot
+    # são reenviadas e reaplicadas pelo cliente sem perda
+    ultimo_evento = obter_canal(empresa.id).ultimo_id
+    cursor = gerar_cursor(timezone.now())
+    desde = ler_cursor(request)
     
-    pedidos_data = []
-    for pedido in pedidos_ativos:
-        # Calcular tempo decorrido
-        tempo_decorrido = (timezone.now() - pedido.criado_em).total_seconds()
-        
-        # Buscar itens do pedido
-        itens_data = []
-        for item in pedido.itens.all():
-            item_dict = {
-                'quantidade': item.quantidade,
-                'produto_nome': item.produto.nome,
-                'preco_unitario': str(item.preco_unitario),
-                'subtotal': str(item.subtotal),
-                'is_combo': item.produto.is_combo()
-            }
-            
-            # Se for combo, adicionar escolhas
-            if item.produto.is_combo():
-                escolhas = []
-                for escolha in item.combo_escolhas.all():
-                    escolhas.append({
-                        'produto_nome': escolha.produto_escolhido.nome
-                    })
-                item_dict['escolhas'] = escolhas
-            
-            itens_data.append(item_dict)
-        
-        # Contar total de itens
-        total_itens = sum(item.quantidade for item in pedido.itens.all())
-        
-        pedidos_data.append({
-            'id': pedido.id,
-            'numero_pedido': pedido.numero_pedido,
-            'cliente_nome': pedido.cliente_nome or 'Cliente',
-            'tipo': pedido.tipo,
-            'tipo_display': pedido.get_tipo_display(),
-            'status': pedido.status,
-            'status_display': pedido.get_status_display(),
-            'forma_pagamento': pedido.get_forma_pagamento_display() if pedido.forma_pagamento else 'Não informado',
-            'total': str(pedido.total),
-            'total_itens': total_itens,
-            'tempo_decorrido': int(tempo_decorrido),
-            'criado_em': pedido.criado_em.isoformat(),
-            'itens': itens_data
-        })
+    removidos = []
+    if desde:
+        pedidos_ativos, removidos = filtrar_alterados(consultar_pedidos_ativos(empresa), empresa.id, desde)
+        pedidos_data = [serializar_pedido_ativo(pedido) for pedido in pedidos_ativos]
+        estatisticas = obter_estatisticas_pedidos(empresa.id)
+    else:
+        # Snapshot compartilhado entre os terminais da empresa (cache por versão)
+        snapshot = obter_snapshot_pedidos(empresa.id)
+        pedidos_data = snapshot['pedidos']
+        estatisticas = snapshot['estatisticas']
     
-    return JsonResponse({
+    response = JsonResponse({
         'success': True,
+        'incremental': desde is not None,
         'pedidos': pedidos_data,
+        'removidos': removidos,
         'total': len(pedidos_data),
-        'estatisticas': {
-            'total_pendente': total_pendente,
-            'total_preparando': total_preparando,
-            'total_pronto': total_pronto,
-            'tempo_medio_segundos': int(tempo_medio_segundos)
-        }
+        'estatisticas': estatisticas,
+        'cursor': cursor,
+        'ultimo_evento': ultimo_evento
     })
+    # Sempre revalidar (If-None-Match) em vez de usar cópia local
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @login_required
-def relatorios_dados(request):
-    """
-    API para retornar dados de relatórios (resumo, top itens, histórico)
+async def api_eventos_pedidos(request):
     """
-    from datetime import datetime, timedelta
-    from django.db.models import Sum, Count, F
-    import logging
-    
-    logger = logging.getLogger(__name__)
-    logger.info(f"=== RELATÓRIOS DADOS CHAMADO ===")
-    logger.info(f"User: {request.user.username}")
-    logger.info(f"GET params: {request.GET}")
+    Stream (server-sent events) com os deltas dos pedidos da empresa.
+    O cliente carrega o snapshot em api_pedidos_ativos e conecta aqui com
+    ``?desde=<ultimo_evento>``; reconexões usam o cabeçalho Last-Event-ID.
     
-    empresa = request.user.empresa
-    filtro = request.GET.get('filtro', 'hoje')
+    Só é servido pelo ASGI: sob WSGI cada conexão prenderia uma thread do
+    worker por minutos, então a resposta é 204 (o EventSource desiste e o
+    terminal segue consultando api_pedidos_ativos).
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
     
-    logger.info(f"Empresa: {empresa.nome}")
-    logger.info(f"Filtro: {filtro}")
+    usuario = await request.auser()
+    canal = obter_canal(usuario.empresa_id)
     
-    # Calcular datas baseado no filtro
-    hoje = datetime.now().date()
+    try:
+        ultimo_id = int(request.headers.get('Last-Event-ID') or request.GET.get('desde'))
+    except (TypeError, ValueError):
+        ultimo_id = await sync_to_async(lambda: canal.ultimo_id)()
     
-    if filtro == 'hoje':
-        data_inicio = hoje
-        data_fim = hoje
-    elif filtro == 'ontem':
-        data_inicio = hoje - timedelta(days=1)
-        data_fim = hoje - timedelta(days=1)
-    elif filtro == 'semana':
-        data_inicio = hoje - timedelta(days=hoje.weekday())
-        data_fim = hoje
-    elif filtro == 'mes':
-        data_inicio = hoje.replace(day=1)
-        data_fim = hoje
-    elif filtro == 'personalizado':
-        data_inicio = datetime.strptime(request.GET.get('data_inicio'), '%Y-%m-%d').date()
-        data_fim = datetime.strptime(request.GET.get('data_fim'), '%Y-%m-%d').date()
-    else:
-        data_inicio = hoje
-        data_fim = hoje
+    response = StreamingHttpResponse(stream_eventos_async(canal, ultimo_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+def publicar_tela_cliente(request):
+    """
+    Publica na tela do cliente pareada com o terminal o carrinho em
+    montagem ou o QR code (``{'terminal', 'tipo', 'dados'}``).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método não permitido'})
     
-    logger.info(f"Período: {data_inicio} até {data_fim}")
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'JSON inválido'})
     
-    # Buscar pedidos do período (todos exceto cancelados)
-    pedidos = Pedido.objects.filter(
-        empresa=empresa,
-        criado_em__date__gte=data_inicio,
-        criado_em__date__lte=data_fim
-    ).exclude(status='cancelado')
+    # O pedido criado é publicado pelo próprio criar_pedido
+    if data.get('tipo') == 'pedido':
+        return JsonResponse({'success': False, 'error': 'Tipo de evento inválido'})
     
-    logger.info(f"Pedidos encontrados: {pedidos.count()}")
+    try:
+        publicar_tela(request.user.empresa_id, data.get('terminal'), data.get('tipo'), data.get('dados'))
+    except TelaInvalida as e:
+        return JsonResponse({'success': False, 'error': str(e)})
     
-    # Calcular resumo
-    total_vendas = pedidos.aggregate(total=Sum('total'))['total'] or 0
-    total_pedidos = pedidos.count()
-    ticket_medio = total_vendas / total_pedidos if total_pedidos > 0 else 0
-    total_itens = ItemPedido.objects.filter(pedido__in=pedidos).aggregate(total=Sum('quantidade'))['total'] or 0
+    return JsonResponse({'success': True})
+
+
+@login_required
+def relatorios_dados(request):
+    """
+    API para retornar dados de relatórios (resumo, top itens, histórico)
     
-    resumo = {
-        'total_vendas': float(total_vendas),
-        'total_pedidos': total_pedidos,
-        'ticket_medio': float(ticket_medio),
-        'total_itens': int(total_itens)
-    }
+    O histórico vem paginado: ``proximo_cursor`` da resposta, passado em
+    ``?cursor=``, traz a página seguinte (só o histórico). Com
+    ``?historico=0`` a resposta traz apenas resumo e top itens.
+    ``?forma_pagamento=`` e ``?tipo=`` restringem os três ao recorte.
+    """
+    empresa = request.user.empresa
+    data_inicio, data_fim = periodo_do_filtro(request)
+    filtros = filtros_do_relatorio(request)
+    pedidos = pedidos_do_periodo(empresa, data_inicio, data_fim, filtros)
     
-    logger.info(f"Resumo: {resumo}")
+    cursor = request.GET.get('cursor')
+    try:
+        limite = min(int(request.GET.get('limite', TAMANHO_PAGINA_HISTORICO)), TAMANHO_MAXIMO_PAGINA)
+    except ValueError:
+        limite = TAMANHO_PAGINA_HISTORICO
     
-    # Top itens mais vendidos
-    top_itens = ItemPedido.objects.filter(
-        pedido__in=pedidos
-    ).values(
-        'produto__nome'
-    ).annotate(
-        quantidade=Sum('quantidade'),
-        total=Sum(F('quantidade') * F('preco_unitario'))
-    ).order_by('-quantidade')[:10]
+    dados = {'success': True}
     
-    top_itens_data = [
-        {
-            'nome': item['produto__nome'],
-            'quantidade': item['quantidade'],
-            'total': float(item['total'])
-        }
-        for item in top_itens
-    ]
+    if not cursor:
+        dados['resumo'] = calcular_resumo(empresa, data_inicio, data_fim, filtros)
+        dados['top_itens'] = calcular_top_itens(empresa, data_inicio, data_fim, filtros)
     
-    logger.info(f"Top itens: {len(top_itens_data)} itens")
+    if request.GET.get('historico') != '0':
+        dados['historico'], dados['proximo_cursor'] = pagina_historico(pedidos, cursor, max(limite, 1))
     
-    # Histórico de vendas (todos os pedidos do período)
-    historico = []
-    for pedido in pedidos.order_by('-criado_em'):  # Todos os pedidos do período
-        total_itens_pedido = pedido.itens.aggregate(total=Sum('quantidade'))['total'] or 0
-        historico.append({
-            'numero_pedido': pedido.numero_pedido,
-            'criado_em': pedido.criado_em.isoformat(),
-            'cliente_nome': pedido.cliente_nome or '',
-            'tipo_display': pedido.get_tipo_display(),
-            'forma_pagamento_display': pedido.get_forma_pagamento_display() if pedido.forma_pagamento else '',
-            'total_itens': total_itens_pedido,
-            'total': str(pedido.total)
-        })
+    return JsonResponse(dados)
+
+
+@login_required
+def relatorios_exportar(request):
+    """
+    Exporta o histórico completo do período (CSV ou JSON com ``?formato=json``)
+    em streaming.
+    """
+    empresa = request.user.empresa
+    data_inicio, data_fim = periodo_do_filtro(request)
+    pedidos = pedidos_do_periodo(empresa, data_inicio, data_fim, filtros_do_relatorio(request))
     
-    logger.info(f"Histórico: {len(historico)} pedidos")
-    logger.info("=== RETORNANDO DADOS ===")
+    if request.GET.get('formato') == 'json':
+        response = StreamingHttpResponse(
+            exportar_json(pedidos, (data_inicio, data_fim)),
+            content_type='application/json; charset=utf-8'
+        )
+        extensao = 'json'
+    else:
+        response = StreamingHttpResponse(exportar_csv(pedidos), content_type='text/csv; charset=utf-8')
+        extensao = 'csv'
     
-    return JsonResponse({
-        'success': True,
-        'resumo': resumo,
-        'top_itens': top_itens_data,
-        'historico': historico
-    })
+    response['Content-Disposition'] = f'attachment; filename="vendas_{data_inicio}_{data_fim}.{extensao}"'
+    return response
@@ -0,0 +1,13 @@
+from django.middleware.gzip import GZipMiddleware as DjangoGZipMiddleware
+
+
+class GZipMiddleware(DjangoGZipMiddleware):
+    """
+    GZip do Django sem os streams de eventos: o gzip acumula os eventos
+    no buffer do compressor e o terminal só os receberia bem depois.
+    """
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,13 @@
+"""
+Configurações do cantina_system.
+
+``CANTINA_AMBIENTE=prod`` carrega ``prod.py``; sem a variável vale ``dev.py``.
+Também é possível apontar ``DJANGO_SETTINGS_MODULE`` direto para
+``cantina_system.settings.prod``.
+"""
+import os
+
+if os.environ.get('CANTINA_AMBIENTE', 'dev') == 'prod':
+    from .prod import *  # noqa: F401,F403
+else:
+    from .dev import *  # noqa: F401,F403
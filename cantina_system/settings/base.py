@@ -0,0 +1,223 @@
+"""
+Configurações comuns a todos os ambientes.
+
+``dev.py`` (padrão) e ``prod.py`` partem daqui; o ambiente é escolhido por
+``CANTINA_AMBIENTE`` (ver ``cantina_system/settings/__init__.py``).
+
+For more information on this file, see
+https://docs.djangoproject.com/en/6.0/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/6.0/ref/settings/
+"""
+
+import os
+from pathlib import Path
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    # Apps do sistema
+    'authentication',
+    'caixa',
+    'cliente',
+    'cozinha',
+    'acompanhamento',
+    'autoatendimento',
+    'painel_status',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'cantina_system.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [BASE_DIR / 'templates'],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+                'django.template.context_processors.media',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'cantina_system.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/6.0/ref/settings/#databases
+
+# DB_ENGINE=postgresql para vários terminais gravando ao mesmo tempo; o padrão
+# (sqlite) é para uma cantina em uma única máquina
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+# Segundos que cada worker mantém a conexão aberta entre requisições
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
+if DB_ENGINE == 'postgresql':
+    # Pool de conexões (psycopg[pool]) ou conexões persistentes por worker;
+    # o Django não aceita os dois juntos
+    DB_POOL = os.environ.get('DB_POOL', '').lower() in ('1', 'true', 'sim')
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'cantina_db'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': not DB_POOL,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN', 2)),
+                    'max_size': int(os.environ.get('DB_POOL_MAX', 10)),
+                },
+            } if DB_POOL else {},
+        }
+    }
+else:
+    # WAL deixa leituras (cozinha, painel) seguirem durante uma gravação;
+    # transações IMMEDIATE pegam o lock de escrita no início e esperam até
+    # DB_SQLITE_TIMEOUT segundos em vez de falhar com "database is locked"
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'OPTIONS': {
+                'timeout': int(os.environ.get('DB_SQLITE_TIMEOUT', 20)),
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                ),
+            },
+        }
+    }
+
+
+# Cache
+# O alias 'pedidos' guarda, por empresa, a versão dos pedidos, o snapshot dos
+# pedidos ativos e as estatísticas. Memória local serve para um único processo;
+# com vários workers use 'arquivo' ou 'banco' (python manage.py createcachetable)
+CANTINA_CACHE_PEDIDOS = os.environ.get('CANTINA_CACHE_PEDIDOS', 'memoria')
+
+BACKENDS_CACHE_PEDIDOS = {
+    'memoria': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cantina-pedidos',
+    },
+    'arquivo': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CANTINA_CACHE_DIR', BASE_DIR / 'cache'),
+    },
+    'banco': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cantina_cache',
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'pedidos': BACKENDS_CACHE_PEDIDOS[CANTINA_CACHE_PEDIDOS],
+}
+
+
+# Numeração dos pedidos
+# Com numeração diária o primeiro pedido de cada dia volta a ser o #0001
+CANTINA_NUMERACAO_DIARIA = os.environ.get('CANTINA_NUMERACAO_DIARIA', '').lower() in ('1', 'true', 'sim')
+
+
+# Estoque
+# Por padrão uma venda sem estoque suficiente é recusada. Cantinas que não
+# controlam estoque podem permitir saldo negativo
+CANTINA_PERMITIR_ESTOQUE_NEGATIVO = os.environ.get('CANTINA_PERMITIR_ESTOQUE_NEGATIVO', '').lower() in ('1', 'true', 'sim')
+
+
+# Cozinha
+# Pedidos preparados ao mesmo tempo, usado na previsão de entrega enquanto
+# não há histórico recente; com movimento, a vazão medida prevalece se for maior
+CANTINA_ESTACOES_COZINHA = int(os.environ.get('CANTINA_ESTACOES_COZINHA', '2'))
+# Com isto ligado, o tempo de preparo aprendido pela cozinha substitui o
+# cadastrado em cada produto (ver caixa/tempos_preparo.py)
+CANTINA_APLICAR_TEMPO_PREPARO = os.environ.get('CANTINA_APLICAR_TEMPO_PREPARO', '').lower() in ('1', 'true', 'sim')
+
+
+# Password validation
+# https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/6.0/topics/i18n/
+
+LANGUAGE_CODE = 'pt-br'
+
+TIME_ZONE = 'America/Sao_Paulo'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/6.0/howto/static-files/
+
+STATIC_URL = 'static/'
+STATICFILES_DIRS = [BASE_DIR / 'static']
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Custom User Model
+AUTH_USER_MODEL = 'authentication.Usuario'
+
+# Login URLs
+LOGIN_URL = '/auth/login/'
+LOGIN_REDIRECT_URL = '/'
+LOGOUT_REDIRECT_URL = '/auth/login/'
@@ -0,0 +1,14 @@
+"""Desenvolvimento: DEBUG ligado e templates relidos a cada alteração."""
+from .base import *  # noqa: F401,F403
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = os.environ.get(
+    'SECRET_KEY',
+    'django-insecure-l%s!zy6suq$$o!+zb0zqmru1@)uos4^&jvy!2l-kevyp14#3pk'
+)
+
+DEBUG = True
+
+ALLOWED_HOSTS = []
+
+TEMPLATES[0]['OPTIONS']['debug'] = True  # Força reload de templates em desenvolvimento
@@ -0,0 +1,56 @@
+"""
+Produção: DEBUG desligado, templates compilados uma vez por processo,
+estáticos com hash no nome (``collectstatic``) e respostas comprimidas.
+
+Variáveis obrigatórias: ``SECRET_KEY`` e ``ALLOWED_HOSTS`` (separados por
+vírgula). ``CANTINA_HTTPS=1`` ativa redirecionamento e cookies seguros.
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa: F401,F403
+
+DEBUG = os.environ.get('DEBUG', '').lower() in ('1', 'true', 'sim')
+
+# Com DEBUG ligado cada consulta SQL fica guardada em memória e as páginas de
+# erro expõem as configurações: terminais abertos o dia todo vazam memória
+if DEBUG:
+    raise ImproperlyConfigured('DEBUG não pode estar ligado com CANTINA_AMBIENTE=prod.')
+
+SECRET_KEY = os.environ.get('SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('Defina SECRET_KEY no ambiente de produção.')
+
+ALLOWED_HOSTS = [host.strip() for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host.strip()]
+
+# Compressão antes de qualquer middleware que use o corpo da resposta; o
+# ConditionalGet vem depois para calcular o ETag sobre o conteúdo final
+MIDDLEWARE = [
+    MIDDLEWARE[0],
+    'cantina_system.middleware.GZipMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+    *MIDDLEWARE[1:],
+]
+
+# Templates lidos e compilados uma única vez por processo
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# Nomes com hash do conteúdo: o Nginx pode servir /static/ com cache longo
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage',
+    },
+}
+
+if os.environ.get('CANTINA_HTTPS', '').lower() in ('1', 'true', 'sim'):
+    SECURE_SSL_REDIRECT = True
+    SESSION_COOKIE_SECURE = True
+    CSRF_COOKIE_SECURE = True
@@ -1,3 +1,45 @@
+from unittest import mock
+
+from asgiref.sync import sync_to_async
 from django.test import TestCase
+from django.utils.asyncio import async_unsafe
+
+from authentication.models import Empresa
+from caixa.telas_cliente import publicar_tela
+
+TERMINAL = 'terminal-de-teste-0001'
+
+
+class TelaClienteEventosTest(TestCase):
+    """A view assíncrona da tela do cliente não lê o cache dentro do event loop."""
+
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome='Cantina', cnpj='00000000000140', endereco='Rua', telefone='0')
+        self.url = f'/cardapio/tela/{self.empresa.id}/{TERMINAL}/eventos/'
+
+    async def test_estado_lido_fora_do_event_loop(self):
+        # Com CANTINA_CACHE_PEDIDOS=banco a leitura do cache consulta o banco
+        leitura = mock.Mock(return_value=None)
+        with mock.patch('cliente.views.obter_estado_tela', async_unsafe(leitura)):
+            resposta = await self.async_client.get(self.url)
+        self.assertEqual(resposta.status_code, 404)
+        leitura.assert_called_once_with(self.empresa.id, TERMINAL)
+
+    async def test_terminal_invalido(self):
+        resposta = await self.async_client.get(f'/cardapio/tela/{self.empresa.id}/curto/eventos/')
+        self.assertEqual(resposta.status_code, 404)
+
+    def test_sem_asgi_responde_204(self):
+        publicar_tela(self.empresa.id, TERMINAL, 'carrinho', {'itens': []})
+        self.assertEqual(self.client.get(self.url).status_code, 204)
+
+    async def test_carrinho_publicado_chega_pelo_stream(self):
+        await sync_to_async(publicar_tela)(self.empresa.id, TERMINAL, 'carrinho', {'itens': []})
+        desde = (await self.async_client.get(f'/cardapio/tela/{self.empresa.id}/{TERMINAL}/')).json()['ultimo_evento']
 
-# Create your tests here.
+        with self.captureOnCommitCallbacks(execute=True):
+            await sync_to_async(publicar_tela)(self.empresa.id, TERMINAL, 'carrinho', {'itens': [{'nome': 'Pastel'}]})
+        resposta = await self.async_client.get(f'{self.url}?desde={desde}')
+        stream = aiter(resposta.streaming_content)
+        await anext(stream)
+        self.assertIn('event: carrinho\ndata: {"itens": [{"nome": "Pastel"}]}'.encode(), await anext(stream))
@@ -3,5 +3,8 @@ from . import views
 
 urlpatterns = [
     path('<int:empresa_id>/', views.cardapio_cliente, name='cardapio_cliente'),
+    path('<int:empresa_id>/catalogo/', views.catalogo_cliente, name='catalogo_cliente'),
     path('pedido-ativo/<int:empresa_id>/', views.pedido_ativo_cliente, name='pedido_ativo_cliente'),
+    path('tela/<int:empresa_id>/<str:terminal>/', views.tela_cliente_estado, name='tela_cliente_estado'),
+    path('tela/<int:empresa_id>/<str:terminal>/eventos/', views.tela_cliente_eventos, name='tela_cliente_eventos'),
 ]
@@ -1,49 +1,55 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
-from django.http import JsonResponse
-from caixa.models import Produto, Categoria, Pedido
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition
+from caixa.catalogo import obter_catalogo, produtos_do_catalogo, etag_catalogo, CACHE_CONTROL_VERSIONADO
+from caixa.eventos import obter_canal_terminal, stream_eventos_async
+from caixa.models import Pedido
+from caixa.telas_cliente import obter_estado_tela, serializar_pedido_tela, terminal_valido
 from authentication.models import Empresa
 
+@condition(etag_func=etag_catalogo)
 def cardapio_cliente(request, empresa_id):
     empresa = Empresa.objects.get(id=empresa_id)
-    categorias = Categoria.objects.filter(empresa=empresa, ativo=True)
-    produtos_raw = Produto.objects.filter(empresa=empresa, ativo=True).select_related('categoria')
-    
-    # Ordenação customizada: Combos primeiro, Bebidas penúltimo, Sobremesas último
-    produtos_combo = []
-    produtos_outros = []
-    produtos_bebidas = []
-    produtos_sobremesas = []
-    
-    for produto in produtos_raw:
-        categoria_nome = produto.categoria.nome.lower() if produto.categoria else ''
-        
-        if produto.categoria and produto.categoria.is_sistema:  # Combo
-            produtos_combo.append(produto)
-        elif 'sobremesa' in categoria_nome:
-            produtos_sobremesas.append(produto)
-        elif 'bebida' in categoria_nome:
-            produtos_bebidas.append(produto)
-        else:
-            produtos_outros.append(produto)
-    
-    # Ordenar cada grupo por nome
-    produtos_combo.sort(key=lambda p: p.nome)
-    produtos_outros.sort(key=lambda p: p.nome)
-    produtos_bebidas.sort(key=lambda p: p.nome)
-    produtos_sobremesas.sort(key=lambda p: p.nome)
-    
-    # Concatenar na ordem desejada
-    produtos = produtos_combo + produtos_outros + produtos_bebidas + produtos_sobremesas
+    catalogo = obter_catalogo(empresa_id)
     
     context = {
         'empresa': empresa,
-        'categorias': categorias,
-        'produtos': produtos,
+        'categorias': catalogo['categorias'],
+        'produtos': produtos_do_catalogo(catalogo, apenas_ativos=True),
     }
-    return render(request, 'cliente/cardapio.html', context)
+    response = render(request, 'cliente/cardapio.html', context)
+    # Celulares e telas guardam a página e revalidam pelo ETag (304 sem mudanças)
+    response['Cache-Control'] = 'public, no-cache'
+    return response
+
+@condition(etag_func=etag_catalogo)
+def catalogo_cliente(request, empresa_id):
+    """
+    Produtos ativos e categorias da empresa em JSON. Pedido com a versão
+    atual (``?v=``, devolvida em ``versao``) pode ficar em cache por tempo
+    indeterminado; sem ela a resposta é revalidada pelo ETag.
+    """
+    catalogo = obter_catalogo(empresa_id)
+    
+    response = JsonResponse({
+        'versao': catalogo['versao'],
+        'produtos': produtos_do_catalogo(catalogo, apenas_ativos=True),
+        'categorias': catalogo['categorias']
+    })
+    if request.GET.get('v') == catalogo['versao']:
+        response['Cache-Control'] = CACHE_CONTROL_VERSIONADO
+    else:
+        response['Cache-Control'] = 'public, no-cache'
+    return response
 
 def pedido_ativo_cliente(request, empresa_id):
-    """Retorna o pedido mais recente que está sendo montado (status pendente)"""
+    """
+    Retorna o pedido mais recente que está sendo montado (status pendente).
+    Usado só pela tela sem terminal pareado; com ``?terminal=`` a tela
+    recebe o pedido do seu caixa por tela_cliente_eventos.
+    """
     try:
         empresa = Empresa.objects.get(id=empresa_id)
         
@@ -54,35 +60,50 @@ def pedido_ativo_cliente(request, empresa_id):
         ).order_by('-criado_em').first()
         
         if pedido:
-            # Mapear tipo para display
-            tipo_map = {
-                'balcao': '⛪ Local',
-                'delivery': '🚗 Viagem',
-                'mesa': '🪑 Mesa',
-                'autoatendimento': '🖥️ Autoatendimento'
-            }
-            
-            itens = [{
-                'produto_nome': item.produto.nome,
-                'quantidade': item.quantidade,
-                'preco_unitario': str(item.preco_unitario),
-                'subtotal': str(item.subtotal)
-            } for item in pedido.itens.all()]
-            
-            return JsonResponse({
-                'pedido': {
-                    'id': pedido.id,
-                    'numero_pedido': pedido.numero_pedido,
-                    'cliente_nome': pedido.cliente_nome or 'Cliente',
-                    'tipo_display': tipo_map.get(pedido.tipo, pedido.tipo),
-                    'pagamento': 'Não informado',  # Pode adicionar campo no modelo depois
-                    'itens': itens,
-                    'total': str(pedido.total),
-                    'atualizado': pedido.atualizado_em.isoformat()
-                }
-            })
+            return JsonResponse({'pedido': serializar_pedido_tela(pedido)})
         else:
             return JsonResponse({'pedido': None})
             
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+def tela_cliente_estado(request, empresa_id, terminal):
+    """
+    Estado atual da tela pareada com o terminal (carrinho, pedido, QR code),
+    lido do cache, e o ID do último evento para conectar em tela_cliente_eventos.
+    """
+    if not terminal_valido(terminal):
+        raise Http404
+    
+    estado = obter_estado_tela(empresa_id, terminal)
+    response = JsonResponse({
+        # Terminal que ainda não publicou não tem canal (a tela tenta de novo)
+        'ultimo_evento': obter_canal_terminal(empresa_id, terminal).ultimo_id if estado is not None else 0,
+        'estado': estado or {}
+    })
+    response['Cache-Control'] = 'no-store'
+    return response
+
+async def tela_cliente_eventos(request, empresa_id, terminal):
+    """
+    Stream (server-sent events) das atualizações do terminal para a tela do
+    cliente. Como ``api_eventos_pedidos``, só é servido pelo ASGI; sob WSGI
+    responde 204.
+    """
+    # Só terminais que já publicaram têm canal; evita criar canais para IDs quaisquer
+    # (o cache pode ser o do banco: a leitura roda fora do event loop)
+    if not terminal_valido(terminal) or await sync_to_async(obter_estado_tela)(empresa_id, terminal) is None:
+        raise Http404
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    canal = obter_canal_terminal(empresa_id, terminal)
+    
+    try:
+        ultimo_id = int(request.headers.get('Last-Event-ID') or request.GET.get('desde'))
+    except (TypeError, ValueError):
+        ultimo_id = await sync_to_async(lambda: canal.ultimo_id)()
+    
+    response = StreamingHttpResponse(stream_eventos_async(canal, ultimo_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
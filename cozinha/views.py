@@ -1,7 +1,13 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
+from django.views.decorators.http import condition
 from caixa.models import Pedido
+from caixa.eventos import obter_canal
+from caixa.pedidos import alterar_status
+from caixa.previsao import obter_previsao, previsao_do_pedido, resumo_fila, etag_previsao, ultima_modificacao_previsao
+from caixa.pedidos_ativos import consultar_pedidos_ativos, serializar_pedido_ativo, obter_snapshot_pedidos, obter_estatisticas_pedidos
+from caixa.sincronizacao import ler_cursor, gerar_cursor, filtrar_alterados
 from django.utils import timezone
 
 @login_required
@@ -34,8 +40,7 @@ def atualizar_status_pedido(request, pedido_id):
         novo_status = request.POST.get('status')
         
         if novo_status in dict(Pedido.STATUS_CHOICES):
-            pedido.status = novo_status
-            pedido.save()
+            alterar_status(pedido, novo_status, request.user)
             return JsonResponse({'success': True, 'status': novo_status})
     
     return JsonResponse({'success': False})
@@ -68,90 +73,74 @@ def listar_pedidos_cozinha(request):
 
 
 @login_required
+@condition(etag_func=etag_previsao, last_modified_func=ultima_modificacao_previsao)
 def api_pedidos_cozinha(request):
     """
     API para retornar pedidos ativos em tempo real (JSON)
     Inclui estatísticas de status e tempo médio
+    Aceita ``?since=<cursor>`` para receber apenas as alterações
     """
-    from datetime import timedelta
-    from django.db.models import Avg, Count, Q
     import logging
     
     logger = logging.getLogger(__name__)
     empresa = request.user.empresa
-    
-    pedidos_ativos = Pedido.objects.filter(
-        empresa=empresa,
-        status__in=['pendente', 'preparando', 'pronto']
-    ).order_by('criado_em').prefetch_related('itens__produto')
-    
-    # Calcular estatísticas
-    total_pendente = pedidos_ativos.filter(status='pendente').count()
-    total_preparando = pedidos_ativos.filter(status='preparando').count()
-    total_pronto = pedidos_ativos.filter(status='pronto').count()
-    
-    logger.info(f"Pedidos ativos - Pendente: {total_pendente}, Preparando: {total_preparando}, Pronto: {total_pronto}")
-    
-    # Calcular tempo médio dos pedidos ENTREGUES HOJE
-    hoje = timezone.now().date()
-    
-    pedidos_entregues_hoje = Pedido.objects.filter(
-        empresa=empresa,
-        status='entregue',
-        atualizado_em__date=hoje
-    )
-    
-    tempo_medio_segundos = 0
-    if pedidos_entregues_hoje.exists():
-        tempos = []
-        for pedido in pedidos_entregues_hoje:
-            # Tempo desde criação até entrega (atualizado_em)
-            tempo_decorrido = (pedido.atualizado_em - pedido.criado_em).total_seconds()
-            
-            # Ignorar pedidos com tempo muito alto (mais de 2 horas = possível erro)
-            if tempo_decorrido <= 7200:  # 2 horas em segundos
-                tempos.append(tempo_decorrido)
-        
-        if tempos:
-            tempo_medio_segundos = sum(tempos) / len(tempos)
-            logger.info(f"Tempo médio de entrega (hoje): {tempo_medio_segundos}s ({tempo_medio_segundos/60:.1f}min)")
-        else:
-            logger.info("Nenhum pedido válido para calcular tempo médio (todos > 2h)")
+    ultimo_evento = obter_canal(empresa.id).ultimo_id
+    cursor = gerar_cursor(timezone.now())
+    desde = ler_cursor(request)
+    
+    removidos = []
+    if desde:
+        pedidos_ativos, removidos = filtrar_alterados(consultar_pedidos_ativos(empresa), empresa.id, desde)
+        pedidos_serializados = [serializar_pedido_ativo(pedido) for pedido in pedidos_ativos]
+        dados = obter_estatisticas_pedidos(empresa.id)
     else:
-        logger.info("Nenhum pedido entregue hoje para calcular tempo médio")
+        # Snapshot compartilhado com o caixa (cache por versão dos pedidos)
+        snapshot = obter_snapshot_pedidos(empresa.id)
+        pedidos_serializados = snapshot['pedidos']
+        dados = snapshot['estatisticas']
+    # Previsão de pronto de cada pedido da fila (em cache por versão dos pedidos)
+    previsao = obter_previsao(empresa.id)
     
     pedidos_data = []
-    for pedido in pedidos_ativos:
-        itens_data = []
-        for item in pedido.itens.all():
-            itens_data.append({
-                'quantidade': item.quantidade,
-                'produto_nome': item.produto.nome,
-                'observacoes': item.observacoes or ''
-            })
-        
+    for pedido in pedidos_serializados:
         pedidos_data.append({
-            'id': pedido.id,
-            'numero_pedido': pedido.numero_pedido,
-            'cliente_nome': pedido.cliente_nome or '',
-            'tipo': pedido.tipo,
-            'status': pedido.status,
-            'criado_em': pedido.criado_em.isoformat(),
-            'itens': itens_data
+            'id': pedido['id'],
+            'numero_pedido': pedido['numero_pedido'],
+            'cliente_nome': pedido['cliente_nome'],
+            'tipo': pedido['tipo'],
+            'status': pedido['status'],
+            'criado_em': pedido['criado_em'],
+            'itens': [{
+                'quantidade': item['quantidade'],
+                'produto_nome': item['produto_nome'],
+                'observacoes': item['observacoes']
+            } for item in pedido['itens']],
+            **previsao_do_pedido(previsao, pedido['id'])
         })
     
+    # Contagens e tempos médios de hoje (entrega e por etapa, em cache)
     estatisticas = {
-        'total_pendente': total_pendente,
-        'total_preparando': total_preparando,
-        'total_pronto': total_pronto,
-        'tempo_medio_segundos': int(tempo_medio_segundos),
-        'total_pedidos': len(pedidos_data)
+        'total_pendente': dados['total_pendente'],
+        'total_preparando': dados['total_preparando'],
+        'total_pronto': dados['total_pronto'],
+        'tempo_medio_segundos': dados['tempo_medio_segundos'],
+        'tempo_medio_espera_segundos': dados['tempo_medio_espera_segundos'],
+        'tempo_medio_preparo_segundos': dados['tempo_medio_preparo_segundos'],
+        'tempo_medio_retirada_segundos': dados['tempo_medio_retirada_segundos'],
+        'total_pedidos': dados['total_pendente'] + dados['total_preparando'] + dados['total_pronto']
     }
     
     logger.info(f"Retornando estatísticas: {estatisticas}")
     
-    return JsonResponse({
+    response = JsonResponse({
         'success': True,
+        'incremental': desde is not None,
         'pedidos': pedidos_data,
-        'estatisticas': estatisticas
+        'removidos': removidos,
+        'estatisticas': estatisticas,
+        'fila': resumo_fila(previsao),
+        'cursor': cursor,
+        'ultimo_evento': ultimo_evento
     })
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,100 @@
+"""
+Painel público de chamada (TVs e balcão de retirada), acessado sem login
+pelo ``token_painel`` da empresa.
+
+O quadro (prontos para retirada, em preparo e aguardando, com a previsão de
+cada um) é montado uma vez por versão dos pedidos da empresa e intervalo da
+previsão (``caixa/previsao.py``). A resposta já
+serializada fica ainda ``MICROCACHE_SEGUNDOS`` no cache: qualquer quantidade
+de telas atualizando sem parar custa, no máximo, uma leitura de cache por
+requisição, e quem já tem a versão atual recebe 304.
+"""
+import json
+import re
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from authentication.models import Empresa
+from caixa.models import Pedido
+from caixa.previsao import momento_previsao, obter_previsao
+from caixa.sincronizacao import STATUS_ATIVOS, cache_pedidos, gerar_cursor, obter_ou_construir, obter_versao_pedidos
+
+# Validade da resposta pronta; a versão dos pedidos continua valendo como ETag
+MICROCACHE_SEGUNDOS = 2
+
+# Tempo que um token revogado (novo token no admin) ainda abre o painel
+TIMEOUT_TOKEN = 60
+
+# Formato de ``gerar_token_painel`` (``secrets.token_urlsafe(24)``)
+FORMATO_TOKEN = re.compile(r'[A-Za-z0-9_-]{32}')
+
+# Pedidos prontos exibidos como "chamando" (os mais recentes)
+LIMITE_CHAMANDO = 12
+
+
+def empresa_do_token(token):
+    """
+    ``{'id', 'nome'}`` da empresa ativa dona do token, ou None.
+    Só tokens válidos vão para o cache: tentativas com tokens inventados não
+    ocupam o cache dos pedidos (os fora do formato nem chegam ao banco).
+    """
+    if not FORMATO_TOKEN.fullmatch(token):
+        return None
+    cache = cache_pedidos()
+    chave = f'painel:token:{token}'
+    empresa = cache.get(chave)
+    if empresa is None:
+        empresa = Empresa.objects.filter(token_painel=token, ativo=True).values('id', 'nome').first()
+        if empresa is not None:
+            cache.set(chave, empresa, TIMEOUT_TOKEN)
+    return empresa
+
+
+def montar_quadro(empresa_id):
+    """Pedidos ativos da empresa separados por situação, sem dados do cliente."""
+    previsao = obter_previsao(empresa_id)['pedidos']
+    pedidos = (
+        Pedido.objects.filter(empresa_id=empresa_id, status__in=STATUS_ATIVOS)
+        .order_by('criado_em')
+        .values('id', 'numero_pedido', 'status', 'tipo', 'mesa', 'atualizado_em')
+    )
+
+    tipos = dict(Pedido.TIPO_PEDIDO)
+
+    quadro = {'chamando': [], 'preparando': [], 'aguardando': []}
+    for pedido in pedidos:
+        dados = {
+            'numero_pedido': pedido['numero_pedido'],
+            'tipo': tipos.get(pedido['tipo'], pedido['tipo']),
+            'mesa': pedido['mesa']
+        }
+        if pedido['status'] == 'pronto':
+            quadro['chamando'].append({**dados, 'pronto_em': pedido['atualizado_em']})
+            continue
+        estimativa = previsao.get(pedido['id'])
+        dados['previsao_pronto'] = estimativa['pronto_em'] if estimativa else None
+        quadro['preparando' if pedido['status'] == 'preparando' else 'aguardando'].append(dados)
+
+    # O último a ficar pronto aparece primeiro
+    quadro['chamando'].sort(key=lambda pedido: pedido['pronto_em'], reverse=True)
+    quadro['chamando'] = quadro['chamando'][:LIMITE_CHAMANDO]
+    return quadro
+
+
+def obter_resposta_quadro(empresa_id):
+    """``{'etag', 'conteudo'}`` do quadro da empresa (JSON já serializado)."""
+    cache = cache_pedidos()
+    chave = f'painel:quadro:{empresa_id}'
+    resposta = cache.get(chave)
+    if resposta is None:
+        intervalo = gerar_cursor(momento_previsao())
+        versao = obter_versao_pedidos(empresa_id)['versao']
+        quadro = obter_ou_construir(empresa_id, f'quadro:{intervalo}', lambda: montar_quadro(empresa_id))
+        resposta = {
+            'etag': f'{versao}-{intervalo}',
+            # ``agora`` permite à tela corrigir a diferença do próprio relógio
+            'conteudo': json.dumps({**quadro, 'agora': timezone.now()}, cls=DjangoJSONEncoder)
+        }
+        cache.set(chave, resposta, MICROCACHE_SEGUNDOS)
+    return resposta
@@ -1,3 +1,37 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+from authentication.models import Empresa, gerar_token_painel
+from caixa.sincronizacao import cache_pedidos
+from .publico import empresa_do_token
+
+
+class TokenPainelTest(TestCase):
+    """O painel público abre pelo token da empresa e tokens inventados não ocupam o cache."""
+
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome='Cantina', cnpj='00000000000130', endereco='Rua', telefone='0')
+
+    def test_token_valido(self):
+        self.assertEqual(empresa_do_token(self.empresa.token_painel), {'id': self.empresa.id, 'nome': 'Cantina'})
+        # Depois da primeira consulta, a empresa vem do cache
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(f'/painel/publico/{self.empresa.token_painel}/api/').status_code, 200)
+        self.assertFalse([c for c in consultas.captured_queries if 'authentication_empresa' in c['sql']])
+
+    def test_token_fora_do_formato_nao_consulta_nada(self):
+        for token in ['curto', self.empresa.token_painel + 'a', '*' * 32]:
+            with self.assertNumQueries(0):
+                self.assertIsNone(empresa_do_token(token))
+        self.assertEqual(self.client.get('/painel/publico/curto/api/').status_code, 404)
+
+    def test_token_desconhecido_nao_vai_para_o_cache(self):
+        token = gerar_token_painel()
+        self.assertIsNone(empresa_do_token(token))
+        self.assertIsNone(cache_pedidos().get(f'painel:token:{token}'))
+        self.assertEqual(self.client.get(f'/painel/publico/{token}/').status_code, 404)
+
+    def test_empresa_inativa(self):
+        Empresa.objects.filter(id=self.empresa.id).update(ativo=False)
+        self.assertIsNone(empresa_do_token(self.empresa.token_painel))
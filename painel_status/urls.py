@@ -4,4 +4,6 @@ from . import views
 urlpatterns = [
     path('', views.painel_status, name='painel_status'),
     path('api/', views.painel_status_api, name='painel_status_api'),
+    path('publico/<str:token>/', views.painel_publico, name='painel_publico'),
+    path('publico/<str:token>/api/', views.painel_publico_api, name='painel_publico_api'),
 ]
@@ -1,36 +1,36 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.db.models import Count
+from django.http import Http404, HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.http import condition
 from caixa.models import Pedido
-from django.db.models import Count, Sum
+from caixa.previsao import obter_previsao, previsao_do_pedido, resumo_fila, etag_previsao, ultima_modificacao_previsao
+from caixa.pedidos_ativos import consultar_pedidos_ativos, serializar_pedido_ativo, obter_snapshot_pedidos, obter_estatisticas_pedidos
+from caixa.sincronizacao import ler_cursor, gerar_cursor, filtrar_alterados
 from django.utils import timezone
-from datetime import timedelta
+from .publico import MICROCACHE_SEGUNDOS, empresa_do_token, obter_resposta_quadro
 
 @login_required
 def painel_status(request):
     empresa = request.user.empresa
     
-    # Estatísticas do dia
-    hoje = timezone.now().date()
-    pedidos_hoje = Pedido.objects.filter(
-        empresa=empresa,
-        criado_em__date=hoje
-    )
-    
+    # Estatísticas do dia (uma única consulta agregada)
+    dados = obter_estatisticas_pedidos(empresa.id)
     stats = {
-        'total_pedidos': pedidos_hoje.count(),
-        'total_vendas': pedidos_hoje.aggregate(Sum('total'))['total__sum'] or 0,
-        'pedidos_pendentes': pedidos_hoje.filter(status='pendente').count(),
-        'pedidos_preparando': pedidos_hoje.filter(status='preparando').count(),
-        'pedidos_prontos': pedidos_hoje.filter(status='pronto').count(),
-        'pedidos_entregues': pedidos_hoje.filter(status='entregue').count(),
+        'total_pedidos': dados['pedidos_hoje'],
+        'total_vendas': dados['vendas_hoje'],
+        'pedidos_pendentes': dados['pendentes_hoje'],
+        'pedidos_preparando': dados['preparando_hoje'],
+        'pedidos_prontos': dados['prontos_hoje'],
+        'pedidos_entregues': dados['entregues_hoje'],
     }
     
     # Pedidos ativos
     pedidos_ativos = Pedido.objects.filter(
         empresa=empresa,
         status__in=['pendente', 'preparando', 'pronto']
-    ).order_by('criado_em')
+    ).annotate(itens_count=Count('itens')).order_by('criado_em')
     
     context = {
         'stats': stats,
@@ -39,24 +39,64 @@ def painel_status(request):
     return render(request, 'painel_status/painel.html', context)
 
 @login_required
+@condition(etag_func=etag_previsao, last_modified_func=ultima_modificacao_previsao)
 def painel_status_api(request):
     empresa = request.user.empresa
+    cursor = gerar_cursor(timezone.now())
+    desde = ler_cursor(request)
     
-    pedidos = Pedido.objects.filter(
-        empresa=empresa,
-        status__in=['pendente', 'preparando', 'pronto']
-    ).order_by('criado_em')
+    removidos = []
+    if desde:
+        pedidos, removidos = filtrar_alterados(consultar_pedidos_ativos(empresa), empresa.id, desde)
+        pedidos_serializados = [serializar_pedido_ativo(p) for p in pedidos]
+    else:
+        pedidos_serializados = obter_snapshot_pedidos(empresa.id)['pedidos']
+    previsao = obter_previsao(empresa.id)
     
     data = [{
-        'id': p.id,
-        'numero_pedido': p.numero_pedido,
-        'tipo': p.get_tipo_display(),
-        'mesa': p.mesa,
-        'status': p.status,
-        'status_display': p.get_status_display(),
-        'total': str(p.total),
-        'tempo_decorrido': str(timezone.now() - p.criado_em).split('.')[0],
-        'itens_count': p.itens.count()
-    } for p in pedidos]
+        'id': p['id'],
+        'numero_pedido': p['numero_pedido'],
+        'tipo': p['tipo_display'],
+        'mesa': p['mesa'],
+        'status': p['status'],
+        'status_display': p['status_display'],
+        'total': p['total'],
+        'criado_em': p['criado_em'],
+        'itens_count': len(p['itens']),
+        **previsao_do_pedido(previsao, p['id'])
+    } for p in pedidos_serializados]
+    
+    response = JsonResponse({
+        'incremental': desde is not None,
+        'pedidos': data,
+        'removidos': removidos,
+        'fila': resumo_fila(previsao),
+        'cursor': cursor
+    })
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+def painel_publico(request, token):
+    """Painel de chamada para TVs e balcão, sem login (token da empresa)."""
+    empresa = empresa_do_token(token)
+    if empresa is None:
+        raise Http404
+    return render(request, 'painel_status/publico.html', {'empresa': empresa, 'token': token})
+
+def painel_publico_api(request, token):
+    """Quadro do painel público, servido do cache (ver ``painel_status/publico.py``)."""
+    empresa = empresa_do_token(token)
+    if empresa is None:
+        raise Http404
+    resposta = obter_resposta_quadro(empresa['id'])
+    etag = quote_etag(resposta['etag'])
     
-    return JsonResponse({'pedidos': data})
+    conhecidas = {e.removeprefix('W/') for e in parse_etags(request.headers.get('If-None-Match', ''))}
+    if etag in conhecidas:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(resposta['conteudo'], content_type='application/json')
+    response['ETag'] = etag
+    # Proxies e navegadores também podem reaproveitar a resposta pelo mesmo período
+    response['Cache-Control'] = f'public, max-age={MICROCACHE_SEGUNDOS}'
+    return response
@@ -54,6 +54,7 @@ function atualizarListaItens() {
         
         // Limpar localStorage
         localStorage.removeItem('caixa_carrinho_temp');
+        publicarTelaCliente('carrinho', null);
         return;
     }
     
@@ -104,11 +105,40 @@ function salvarCarrinhoTemporario() {
         };
         
         localStorage.setItem('caixa_carrinho_temp', JSON.stringify(carrinho));
+        publicarTelaCliente('carrinho', carrinho);
     } catch (error) {
         console.error('Erro ao salvar carrinho temporário:', error);
     }
 }
 
+// Identificador deste caixa, para parear a tela do cliente (?terminal= no cardápio)
+function obterTerminalCaixa() {
+    let terminal = localStorage.getItem('caixa_terminal_id');
+    if (!terminal) {
+        const bytes = crypto.getRandomValues(new Uint8Array(16));
+        terminal = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+        localStorage.setItem('caixa_terminal_id', terminal);
+    }
+    return terminal;
+}
+
+// Envia à tela do cliente pareada; mudanças em sequência (digitação) viram um envio só
+const temporizadoresTelaCliente = {};
+
+function publicarTelaCliente(tipo, dados) {
+    clearTimeout(temporizadoresTelaCliente[tipo]);
+    temporizadoresTelaCliente[tipo] = setTimeout(() => {
+        fetch('/caixa/tela-cliente/', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken')
+            },
+            body: JSON.stringify({ terminal: obterTerminalCaixa(), tipo: tipo, dados: dados })
+        }).catch(error => console.error('Erro ao atualizar tela do cliente:', error));
+    }, tipo === 'carrinho' ? 150 : 0);
+}
+
 // Busca de produtos no cardápio
 document.addEventListener('DOMContentLoaded', function() {
     const buscaInput = document.getElementById('busca-item');
@@ -144,6 +174,20 @@ document.addEventListener('DOMContentLoaded', function() {
     if (formaPagamentoSelect) {
         formaPagamentoSelect.addEventListener('change', salvarCarrinhoTemporario);
     }
+    
+    // Links da tela do cliente já pareados com este caixa
+    const terminal = obterTerminalCaixa();
+    document.querySelectorAll('a[data-tela-cliente]').forEach(link => {
+        link.href += `?terminal=${terminal}`;
+    });
+    document.querySelectorAll('input[data-tela-cliente]').forEach(input => {
+        input.value += `?terminal=${terminal}`;
+    });
+    
+    // Registrar o terminal (carrinho atual) para a tela pareada poder conectar
+    if (itensPedido.length === 0) {
+        publicarTelaCliente('carrinho', null);
+    }
 });
 
 async function finalizarPedido() {
@@ -174,7 +218,8 @@ async function finalizarPedido() {
         cliente_nome: clienteNome,
         forma_pagamento: formaPagamento,
         observacoes: document.getElementById('observacoes').value,
-        itens: itensPedido
+        itens: itensPedido,
+        terminal: obterTerminalCaixa()
     };
     
     console.log('Enviando pedido:', dados);